@@ -1,115 +1,42 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 import pydeck as pdk
-#from utils.db_connection import get_db_connection 
+from utils.db_connection import current_snapshot, get_engine, read_query, show_cache_stats
+from utils.summaries import (AGE_SUMMARY, EVENT_SUMMARY, GENDER_SUMMARY, HEADLINE, HOME_AGE_COLUMNS, HOME_EVENT_COLUMNS,
+                             HOME_GENDER_COLUMNS, HOME_HEADLINE_COLUMNS, home_metrics_query, split_home_metrics)
 import ast
 import altair as alt
-import re
-from sqlalchemy import create_engine
 import os
 
-def get_db_connection():
-    """
-    Establish and return a connection to the PostgreSQL database.
-    """
-    # Define the connection details
-    hostname=st.secrets["DB_HOST"]
-    port=st.secrets["DB_PORT"]
-    database=st.secrets["DB_NAME"]
-    username=st.secrets["DB_USER"]
-    password=st.secrets["DB_PASSWORD"]
-      
-    try:
-        # Create the connection string
-        engine = create_engine(f"postgresql://{username}:{password}@{hostname}:{port}/{database}")
-        connection = engine.connect()
-        print("Database connection successful.")
-        return connection
-    except Exception as e:
-        print(f"Error connecting to the database: {e}")
-        return None
-
 st.set_page_config(
     page_title="Parkrunner",
     #page_icon="🏃",
     layout="wide"
 )
 
-connection = get_db_connection()
-
-if connection:
-    participant_count_query = """
-    SELECT COUNT(*) AS total_participants
-    FROM student.rw_parkrun_2;
-    """
-    try:
-        participant_count_df = pd.read_sql(participant_count_query, connection)
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-    
-    gender_query = """
-    SELECT "Gender" ,count("Gender")
-    FROM student.rw_parkrun_2
-    GROUP BY "Gender" 
-    """
+# The ETL's memory-mapped snapshot (utils/snapshot.py) when there is one, otherwise the database
+snapshot = current_snapshot()
+engine = None if snapshot else get_engine()
+
+if snapshot:
+    headline_df = snapshot[HEADLINE].select(HOME_HEADLINE_COLUMNS).to_pandas()
+    gender_df = snapshot[GENDER_SUMMARY].select(HOME_GENDER_COLUMNS).to_pandas()
+    age_df = snapshot[AGE_SUMMARY].select(HOME_AGE_COLUMNS).to_pandas()
+    df = snapshot[EVENT_SUMMARY].select(HOME_EVENT_COLUMNS).to_pandas()
+elif engine:
+    # Headline numbers, breakdowns and map points are pre-aggregated by the ETL
+    # and read in one round trip (utils/summaries.py)
     try:
-        gender_df = pd.read_sql(gender_query, connection)
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-        
-    age_query = """
-    SELECT 
-	"Age Group", 
-	COUNT("Age Group"),
-	AVG("Time") AS avg_finish_time
-    FROM student.rw_parkrun_2
-    GROUP BY "Age Group"
-    """
-    try:
-        age_df = pd.read_sql(age_query, connection)
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-    
-    event_count_query = """
-    SELECT COUNT(*) AS total_events
-    FROM(
-	SELECT COUNT(*)
-	FROM student.rw_parkrun_2
-	GROUP BY "EventLongName")
-    """
-    try:
-        event_count_df = pd.read_sql(event_count_query, connection)
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-        
-    pb_count_query = """
-    SELECT COUNT(*) AS total_pbs
-    FROM student.rw_parkrun_2
-    WHERE "Achievement" = 'New PB!'
-    """
-    try:
-        pb_count_df = pd.read_sql(pb_count_query, connection)
-        #st.dataframe(pb_count_df)
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-    
-    query = """
-    SELECT 
-    "EventLongName", 
-    COUNT("Position") AS participant_count,
-    "coordinates"
-    FROM student.rw_parkrun_2
-    GROUP BY "EventLongName", "coordinates";
-    """
-    try:
-        df = pd.read_sql(query, connection)
-        #st.dataframe(df.sort_values(by="participant_count", ascending=False).head(10))
+        headline_df, gender_df, age_df, df = split_home_metrics(read_query(home_metrics_query()))
     except Exception as e:
         st.error(f"Error fetching data: {e}")
 else:
     st.error("Could not connect to the database.")
 
+participant_count_df = headline_df[["total_participants"]]
+event_count_df = headline_df[["total_events"]]
+pb_count_df = headline_df[["total_pbs"]]
+
 def format_number_with_commas(number):
     return f"{number:,}"
 
@@ -180,48 +107,55 @@ with col3:
     st.altair_chart(age_chart, theme=None, use_container_width=True,)
 ## Map Setup
 
-## Creates a "Fill_colour" column for the df for a colour scheme
-min_count = df["participant_count"].min()
-max_count = df["participant_count"].max()
-df["normalised_count"] = (df["participant_count"] - min_count) / (max_count - min_count)
-# Map the normalised values to RGB colours
-def calculate_colour(value):
-    r = int(255)
-    g = int(255 * (1 - value))
-    b = int(0)
-    return [r, g, b]
-
-df["fill_colour"] = df["normalised_count"].apply(calculate_colour)
-# Drop the normalised_count column
-df = df.drop(columns=["normalised_count"])
-
-df["coordinates"] = df["coordinates"].apply(
-    lambda x: list(map(float, re.findall(r"[-+]?\d*\.\d+|\d+", x))) if isinstance(x, str) else x
-)
+class SerialisedDeck(pdk.Deck):
+    """
+    A Deck that is serialised once: st.pydeck_chart calls to_json() on every rerun.
+    """
+    def to_json(self):
+        if getattr(self, "_spec", None) is None:
+            self._spec = super().to_json()
+        return self._spec
 
-point_layer = pdk.Layer(
-    "ScatterplotLayer",
-    data=df,
-    id="EventNameLong",
-    get_position="coordinates",
-    get_color="fill_colour",
-    pickable=True,
-    auto_highlight=True,
-    get_radius="participant_count",
-    radius_scale=6,
-    opacity=0.5,
-)
 
-view_state = pdk.ViewState(
-    latitude=53.56, longitude=-3.78, zoom=5, pitch=0, bearing=0,
-)
+@st.cache_resource(max_entries=4, show_spinner=False)
+def map_chart(events_df):
+    """
+    Build the events map once per set of event summaries, shared by every rerun and session.
+    """
+    # Colour ramp from yellow (fewest finishers) to red (most), as one array operation
+    counts = events_df["participant_count"].to_numpy(dtype="float64")
+    spread = counts.max() - counts.min() if len(counts) else 0
+    normalised = (counts - counts.min()) / spread if spread else np.zeros(len(counts))
+    layer_df = events_df[["EventLongName", "participant_count", "Longitude", "Latitude"]].copy()
+    layer_df["green"] = (255 * (1 - normalised)).astype(np.uint8)
+    # Events without a position cannot be drawn
+    layer_df = layer_df.dropna(subset=["Longitude", "Latitude"])
+
+    point_layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=layer_df,
+        id="EventNameLong",
+        get_position="[Longitude, Latitude]",
+        get_color="[255, green, 0]",
+        pickable=True,
+        auto_highlight=True,
+        get_radius="participant_count",
+        radius_scale=6,
+        opacity=0.5,
+    )
 
-chart = pdk.Deck(
-    point_layer,
-    initial_view_state=view_state,
-    tooltip={"text": "{EventLongName}\nFinishers: {participant_count}"},
-    width='100',
-)
+    view_state = pdk.ViewState(
+        latitude=53.56, longitude=-3.78, zoom=5, pitch=0, bearing=0,
+    )
+
+    return SerialisedDeck(
+        point_layer,
+        initial_view_state=view_state,
+        tooltip={"text": "{EventLongName}\nFinishers: {participant_count}"},
+        width='100',
+    )
+
+chart = map_chart(df)
 
 with col2:
     event = st.pydeck_chart(chart, on_select="rerun", selection_mode="multi-object")
@@ -232,3 +166,7 @@ with st.expander(label="About:"):
         Parkrunner is an app designed to deliver insights from Parkrun events across the UK. Data was obtained from https://www.parkrun.org.uk/
     """
     )
+
+
+# Cache hit rate and query latency, shown last so they include this run
+show_cache_stats()
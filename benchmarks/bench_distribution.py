@@ -0,0 +1,88 @@
+"""
+Time to draw the Event Insights pace chart: seaborn's kdeplot over every
+national finish time (as the page used to), against plotting the stored
+national curve and smoothing the event's own binned times. Also reports how
+far the stored national curve is from seaborn's.
+
+    python -m benchmarks.bench_distribution --rows 300000
+"""
+import argparse
+import io
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+
+from benchmarks.fixtures import make_results_frame
+from utils.distribution import (BIN_SECONDS, LOCAL_BW_ADJUST, NATIONAL_BW_ADJUST, bin_counts, bin_minutes,
+                                smooth_density)
+
+
+def render():
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format="png")
+    plt.close()
+
+
+def kde_chart(national_minutes, local_minutes):
+    plt.figure(figsize=(6, 3))
+    sns.kdeplot(national_minutes, color="orange", bw_adjust=NATIONAL_BW_ADJUST, fill=True, label="National Average")
+    sns.kdeplot(local_minutes, color="red", bw_adjust=LOCAL_BW_ADJUST, fill=True, label="Local")
+    plt.xlim(0, 80)
+    render()
+
+
+def stored_chart(national_density, local_seconds):
+    centres = bin_minutes() + BIN_SECONDS / 120
+    local_density = smooth_density(bin_counts(local_seconds), LOCAL_BW_ADJUST)
+    plt.figure(figsize=(6, 3))
+    plt.plot(centres, national_density, color="orange", label="National Average")
+    plt.fill_between(centres, national_density, color="orange", alpha=0.25)
+    plt.plot(centres, local_density, color="red", label="Local")
+    plt.fill_between(centres, local_density, color="red", alpha=0.25)
+    plt.xlim(0, 80)
+    render()
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_results_frame(args.rows)
+    seconds = df["Time"].dt.total_seconds().to_numpy()
+    local_seconds = seconds[df["Event ID"].to_numpy() == 0]
+
+    start = time.perf_counter()
+    national_density = smooth_density(bin_counts(seconds))
+    print(f"Binning and smoothing {len(seconds):,} times: {(time.perf_counter() - start) * 1000:.1f} ms (once per load)")
+
+    # Compare the stored curve with seaborn's on seaborn's own grid
+    plt.figure()
+    seaborn_x, seaborn_y = sns.kdeplot(seconds / 60, bw_adjust=NATIONAL_BW_ADJUST).lines[0].get_data()
+    plt.close()
+    stored_y = np.interp(seaborn_x, bin_minutes() + BIN_SECONDS / 120, national_density)
+    print(f"Largest difference from seaborn's curve: {np.abs(stored_y - seaborn_y).max() / seaborn_y.max():.1%} of its peak")
+
+    kde = best_of(args.repeat, kde_chart, seconds / 60, local_seconds / 60)
+    stored = best_of(args.repeat, stored_chart, national_density, local_seconds)
+    print(f"{'kdeplot':>12}: {kde * 1000:8.1f} ms per chart")
+    print(f"{'stored curve':>12}: {stored * 1000:8.1f} ms per chart ({kde / stored:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
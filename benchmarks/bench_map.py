@@ -0,0 +1,81 @@
+"""
+Time to prepare and serialise the Home page's events map as the number of
+events grows: the original per-row regex parsing and colour lists, against
+numeric longitude/latitude columns and a NumPy colour ramp.
+
+    python -m benchmarks.bench_map --events 800 3200 12800
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+
+def make_event_summary(events, seed=0):
+    rng = np.random.default_rng(seed)
+    longitude = np.round(rng.uniform(-8, 2, events), 6)
+    latitude = np.round(rng.uniform(50, 59, events), 6)
+    return pd.DataFrame({
+        "EventLongName": [f"Event {i} parkrun" for i in range(events)],
+        "participant_count": rng.integers(20, 1200, events),
+        "coordinates": [f"[{x}, {y}]" for x, y in zip(longitude, latitude)],
+        "Longitude": longitude,
+        "Latitude": latitude,
+    })
+
+
+def deck(layer_df, get_position, get_color):
+    layer = pdk.Layer("ScatterplotLayer", data=layer_df, get_position=get_position, get_color=get_color,
+                      get_radius="participant_count", radius_scale=6, opacity=0.5)
+    return pdk.Deck(layer, initial_view_state=pdk.ViewState(latitude=53.56, longitude=-3.78, zoom=5)).to_json()
+
+
+def legacy_map(events_df):
+    # Home.py's map setup before the numeric columns
+    df = events_df[["EventLongName", "participant_count", "coordinates"]].copy()
+    min_count = df["participant_count"].min()
+    max_count = df["participant_count"].max()
+    df["normalised_count"] = (df["participant_count"] - min_count) / (max_count - min_count)
+    df["fill_colour"] = df["normalised_count"].apply(lambda value: [int(255), int(255 * (1 - value)), int(0)])
+    df = df.drop(columns=["normalised_count"])
+    df["coordinates"] = df["coordinates"].apply(
+        lambda x: list(map(float, re.findall(r"[-+]?\d*\.\d+|\d+", x))) if isinstance(x, str) else x
+    )
+    return deck(df, "coordinates", "fill_colour")
+
+
+def vectorised_map(events_df):
+    counts = events_df["participant_count"].to_numpy(dtype="float64")
+    normalised = (counts - counts.min()) / (counts.max() - counts.min())
+    df = events_df[["EventLongName", "participant_count", "Longitude", "Latitude"]].copy()
+    df["green"] = (255 * (1 - normalised)).astype(np.uint8)
+    return deck(df, "[Longitude, Latitude]", "[255, green, 0]")
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, nargs="+", default=[800, 3200, 12800])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for events in args.events:
+        events_df = make_event_summary(events)
+        legacy = best_of(args.repeat, legacy_map, events_df)
+        vectorised = best_of(args.repeat, vectorised_map, events_df)
+        print(f"{events:>6} events: {legacy * 1000:7.1f} ms per-row, {vectorised * 1000:7.1f} ms vectorised")
+
+
+if __name__ == "__main__":
+    main()
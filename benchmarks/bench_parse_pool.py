@@ -0,0 +1,67 @@
+"""
+Parsing a whole UK week of results pages (the generated corpus in
+benchmarks/data/corpus, repeated to --copies times its size): in this
+process, on a pool of threads as the fetch workers do, and in the parse
+stage's worker processes at each of --processes.
+
+Every run is checked against the serial parse. Processes can only help with
+more than one core to run on; the number available is printed first.
+
+    python -m benchmarks.bench_parse_pool --copies 70 --processes 1 2 4 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixtures import corpus_site
+from etl.parse import parse_event_page, parse_pages
+from utils.records import finisher_count
+from utils.scraper import MAX_WORKERS
+
+
+def rows(event_pages):
+    return sum(finisher_count(event_page["Results"]) for event_page in event_pages)
+
+
+def serial(pages):
+    return [parse_event_page(content) for content in pages]
+
+
+def threaded(pages, threads):
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(parse_event_page, pages))
+
+
+def in_processes(pages, processes):
+    return [event_page for _, _, event_page, _, _ in parse_pages(enumerate(pages), processes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=70, help="Times to repeat the corpus events (70 is about the UK)")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=MAX_WORKERS, help="Threads for the fetch-thread comparison")
+    args = parser.parse_args()
+
+    pages = [content for path, content in sorted(corpus_site(args.copies).items()) if path != "/events.json"]
+    print(f"{len(pages)} pages ({sum(map(len, pages)) / 1_000_000:.1f} MB), {os.cpu_count()} CPUs available")
+
+    start = time.perf_counter()
+    expected = serial(pages)
+    baseline = time.perf_counter() - start
+    total_rows = rows(expected)
+    print(f"{'serial':>14}: {baseline:6.2f}s, {total_rows / baseline:>9,.0f} rows/s")
+
+    runs = [(f"{args.threads} threads", threaded, args.threads)]
+    runs += [(f"{processes} processes", in_processes, processes) for processes in args.processes]
+    for label, parse, workers in runs:
+        start = time.perf_counter()
+        parsed = parse(pages, workers)
+        elapsed = time.perf_counter() - start
+        assert parsed == expected, f"{label} parsed differently"
+        print(f"{label:>14}: {elapsed:6.2f}s, {total_rows / elapsed:>9,.0f} rows/s, {baseline / elapsed:4.2f}x serial")
+
+
+if __name__ == "__main__":
+    main()
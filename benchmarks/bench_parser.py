@@ -0,0 +1,52 @@
+"""
+Rows/second of each results parser backend. Every backend is first checked
+against the original BeautifulSoup functions on the saved fixture pages.
+
+    python -m benchmarks.bench_parser --pages 20 --finishers 500
+"""
+import argparse
+import time
+
+from benchmarks.fixtures import make_results_page, saved_pages
+from utils.parser import PARSER_BACKENDS, extract_data_from_table_body, extract_table_body, parse_results
+
+
+class SavedResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+def reference_parse(content):
+    return extract_data_from_table_body(extract_table_body(SavedResponse(content)))
+
+
+def check_backends(pages):
+    for name, content in pages.items():
+        expected = reference_parse(content)
+        for backend in PARSER_BACKENDS:
+            if parse_results(content, backend) != expected:
+                raise AssertionError(f"{backend} parser output differs from the original on {name}")
+    print(f"All backends match the original parser on {len(pages)} saved pages")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--finishers", type=int, default=500)
+    args = parser.parse_args()
+
+    check_backends(saved_pages())
+    corpus = [make_results_page(f"event{i}", args.finishers, seed=i) for i in range(args.pages)]
+
+    timings = {}
+    for label, parse in [("original", reference_parse)] + [
+        (backend, lambda content, backend=backend: parse_results(content, backend)) for backend in PARSER_BACKENDS
+    ]:
+        start = time.perf_counter()
+        rows = sum(len(parse(content)) for content in corpus)
+        timings[label] = time.perf_counter() - start
+        print(f"{label:>8}: {rows / timings[label]:>10,.0f} rows/s ({timings[label]:.2f}s for {rows:,} rows)")
+
+
+if __name__ == "__main__":
+    main()
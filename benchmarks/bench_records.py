@@ -0,0 +1,94 @@
+"""
+Memory held by a parsed week of results (the generated corpus in
+benchmarks/data/corpus, repeated --copies times) in each form the parser can
+give: a dict per finisher, a list of strings per column, and FinisherRecords.
+For each: parse time, bytes held per finisher, pickled size (what a parse
+process sends back), and the time to transform it. Column lists are built
+from the row dicts, so their parse time counts both. The three transformed
+DataFrames are checked to be identical.
+
+    python -m benchmarks.bench_records --copies 10
+"""
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.fixtures import corpus_site
+from utils.parser import RESULT_FIELDS, parse_results, parse_results_records, parse_run_header
+from utils.records import finisher_count
+from utils.transform import transform_results
+
+
+def parse_results_columns(content):
+    # The form pages were parsed into before FinisherRecords: one list of strings per field
+    rows = parse_results(content)
+    return {field: [row[field] for row in rows] for field in RESULT_FIELDS}
+
+
+FORMS = {
+    "row dicts": parse_results,
+    "column lists": parse_results_columns,
+    "records": parse_results_records,
+}
+
+
+def parse_week(pages, parse):
+    events = []
+    for event_id, content in enumerate(pages, start=1):
+        run_date, run_number = parse_run_header(content)
+        events.append({"Event ID": event_id, "Event Name": f"event{event_id}", "Run Date": run_date,
+                       "Run Number": run_number, "Results": parse(content)})
+    return events
+
+
+def held_bytes(pages, parse):
+    # Traced in its own pass: tracemalloc slows allocation-heavy code several times over
+    gc.collect()
+    tracemalloc.start()
+    events = parse_week(pages, parse)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10, help="Times to repeat the corpus events")
+    args = parser.parse_args()
+
+    pages = [content for path, content in sorted(corpus_site(args.copies).items()) if path != "/events.json"]
+    event_info = [{"EventLongName": f"Event {number} parkrun", "coordinates": [0.0, 51.5], "Country": "UK"}
+                  for number in range(1, len(pages) + 1)]
+
+    expected = None
+    for label, parse in FORMS.items():
+        gc.collect()
+        start = time.perf_counter()
+        events = parse_week(pages, parse)
+        parse_seconds = time.perf_counter() - start
+        rows = sum(finisher_count(event["Results"]) for event in events)
+        pickled = sum(len(pickle.dumps(event["Results"])) for event in events)
+
+        start = time.perf_counter()
+        df = transform_results(events, event_info)
+        transform_seconds = time.perf_counter() - start
+        del events
+        held = held_bytes(pages, parse)
+
+        print(f"{label:>13}: parse {parse_seconds:6.2f}s, held {held / 1_000_000:6.1f} MB "
+              f"({held / rows:5.0f} bytes/finisher), pickled {pickled / 1_000_000:5.1f} MB, "
+              f"transform {transform_seconds:5.2f}s, {rows:,} finishers")
+        if expected is None:
+            expected = df
+        else:
+            pd.testing.assert_frame_equal(expected, df)
+    print("Transformed outputs match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+A results website that goes down part way through the run: ScraperEngine with
+the original in-place retries (a blocking sleep doubling from 4s, 503 and 202
+only, no timeout, giving up after 5 attempts) against the retry scheduler
+(Retry-After, jittered per-host backoff, failed events re-queued behind the
+rest, and the circuit breaker).
+
+Reports how long each run took, how many events came back without results
+and how many requests were sent while the site was down. Delays are scaled
+down by --delay-scale as in bench_scraper.
+
+    python -m benchmarks.bench_retry --events 60 --outage 1 3
+"""
+import argparse
+import time
+
+import requests
+
+from benchmarks.fixtures import make_results_page
+from benchmarks.http_standin import StandinServer
+from utils.parser import parse_results_records
+from utils.scraper import HEADERS, REQUESTS_PER_SECOND, CircuitBreaker, ScraperEngine
+
+
+def legacy_request(link, headers, max_retries=5, wait_time=4, limiter=None, session=None):
+    # make_a_request before the retry scheduler
+    http = session or requests
+    try:
+        for attempt in range(max_retries):
+            if limiter:
+                limiter.acquire()
+            response = http.get(link, headers=headers)
+            if response.status_code == 200:
+                return response
+            elif response.status_code in (503, 202):
+                time.sleep(wait_time)
+                wait_time *= 2
+            else:
+                return None
+        return None
+    except requests.exceptions.RequestException:
+        return None
+
+
+class LegacyEngine(ScraperEngine):
+    """
+    ScraperEngine with the original blocking retries and no circuit breaker.
+    """
+
+    def fetch(self, url, attempt=0):
+        slots, limiter = self._host(url)
+        with slots:
+            return legacy_request(url, headers=self.headers, wait_time=self.retry_wait, limiter=limiter,
+                                  session=self.session)
+
+
+def run(engine_class, urls, rate, retry_wait, workers):
+    breaker = CircuitBreaker(window=10)
+    engine = engine_class(rate=rate, max_workers=workers, retry_wait=retry_wait, headers=HEADERS, breaker=breaker)
+    empty = 0
+    for _, records in engine.run(list(enumerate(urls)), lambda key, response: parse_results_records(
+            response.content if response is not None else b"")):
+        empty += not len(records)
+    return empty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=60)
+    parser.add_argument("--finishers", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in response latency (s)")
+    parser.add_argument("--delay-scale", type=float, default=0.01, help="Multiplier for the 5-10s politeness delay")
+    parser.add_argument("--outage", type=float, nargs=2, default=[1.0, 3.0], metavar=("START", "DURATION"),
+                        help="Seconds after the first request when the site goes down, and for how long")
+    parser.add_argument("--retry-after", type=float, default=None,
+                        help="Retry-After the site sends while down (seconds, scaled like the delays)")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    paths = [f"/event{i}/results/latestresults/" for i in range(args.events)]
+    pages = {path: make_results_page(path.split("/")[1], args.finishers) for path in paths}
+    rate = REQUESTS_PER_SECOND / args.delay_scale
+    retry_wait = 4 * args.delay_scale
+    retry_after = args.retry_after * args.delay_scale if args.retry_after is not None else None
+
+    for label, engine_class in [("blocking retries", LegacyEngine), ("retry scheduler", ScraperEngine)]:
+        with StandinServer(pages, latency=args.latency, outage=args.outage, retry_after=retry_after) as server:
+            urls = [server.url + path.lstrip("/") for path in paths]
+            start = time.perf_counter()
+            empty = run(engine_class, urls, rate, retry_wait, args.workers)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>16}: {elapsed:6.2f}s, {empty} of {args.events} events without results, "
+                  f"{server.requests_served} requests")
+
+
+if __name__ == "__main__":
+    main()
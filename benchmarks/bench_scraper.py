@@ -0,0 +1,83 @@
+"""
+Wall-time benchmark: the original serial extract loop against ScraperEngine,
+both fetching from a local stand-in server.
+
+Delays are scaled down by --delay-scale so a run takes seconds, not hours.
+Both sides keep the same average request rate, so the difference is the time
+the serial loop spends blocked on latency, parsing and retry waits.
+
+With --domains N the events are spread over N stand-in servers, like the
+results websites of N countries; the engine paces each one separately.
+
+    python -m benchmarks.bench_scraper --events 40 --latency 0.3
+    python -m benchmarks.bench_scraper --events 80 --domains 4
+"""
+import argparse
+import random
+import time
+from contextlib import ExitStack
+
+from benchmarks.fixtures import make_results_page
+from benchmarks.http_standin import StandinServer
+from utils.parser import extract_data_from_table_body, extract_table_body
+from utils.scraper import DELAY_MAX, DELAY_MIN, HEADERS, REQUESTS_PER_SECOND, ScraperEngine, make_a_request, wait_function
+
+
+def parse(response):
+    return extract_data_from_table_body(extract_table_body(response))
+
+
+def serial_loop(urls, scale, retry_wait):
+    rows = 0
+    for url in urls:
+        response = make_a_request(url, headers=HEADERS, wait_time=retry_wait)
+        rows += len(parse(response))
+        wait_function(DELAY_MIN * scale, DELAY_MAX * scale)
+    return rows
+
+
+def engine_run(urls, scale, retry_wait, workers, per_host):
+    engine = ScraperEngine(rate=REQUESTS_PER_SECOND / scale, max_workers=workers,
+                           max_per_host=per_host, retry_wait=retry_wait)
+    jobs = list(enumerate(urls))
+    return sum(len(rows) for _, rows in engine.run(jobs, lambda key, response: parse(response)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=40)
+    parser.add_argument("--finishers", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.3, help="Stand-in response latency (s)")
+    parser.add_argument("--delay-scale", type=float, default=0.02, help="Multiplier for the 5-10s politeness delay")
+    parser.add_argument("--flaky", type=float, default=0.1, help="Fraction of pages answering 503 once")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--per-host", type=int, default=2)
+    parser.add_argument("--domains", type=int, default=1, help="Stand-in servers (countries) to spread the events over")
+    args = parser.parse_args()
+
+    paths = [f"/event{i}/results/latestresults/" for i in range(args.events)]
+    pages = {path: make_results_page(path.split("/")[1], args.finishers) for path in paths}
+    flaky = random.Random(0).sample(paths, int(len(paths) * args.flaky))
+    retry_wait = 4 * args.delay_scale
+
+    timings = {}
+    for label, runner in [
+        ("serial loop", lambda urls: serial_loop(urls, args.delay_scale, retry_wait)),
+        ("engine", lambda urls: engine_run(urls, args.delay_scale, retry_wait, args.workers * args.domains, args.per_host)),
+    ]:
+        with ExitStack() as stack:
+            servers = [stack.enter_context(StandinServer(pages, latency=args.latency, flaky=flaky))
+                       for _ in range(args.domains)]
+            # Event i lives on server i % domains, so the job list alternates between them
+            urls = [servers[i % args.domains].url + path.lstrip("/") for i, path in enumerate(paths)]
+            start = time.perf_counter()
+            rows = runner(urls)
+            timings[label] = time.perf_counter() - start
+            requests_served = sum(server.requests_served for server in servers)
+            print(f"{label}: {timings[label]:.2f}s, {rows} rows, {requests_served} requests")
+
+    print(f"Speed-up: {timings['serial loop'] / timings['engine']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
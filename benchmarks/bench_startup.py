@@ -0,0 +1,68 @@
+"""
+Time to first render of the Home page on a cold start, reading the database
+against reading the Arrow snapshot. Each run is a fresh process, so nothing is
+cached; library imports, the same either way, are not counted. Uses the
+database the app is configured for (DB_* variables or .env), which must hold
+a load from runETL.py; the database is only read.
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+HOME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Home.py")
+
+
+def first_render(snapshot_dir):
+    os.environ["PARKRUN_SNAPSHOT_DIR"] = snapshot_dir
+    # Both ways import the same libraries (about a second); import them first so
+    # only the page's own data access and drawing are timed, with every cache cold
+    import altair, pydeck, pyarrow  # noqa: F401
+    import utils.db_connection  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(HOME, default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    elapsed = time.perf_counter() - start
+    if app.exception or app.error:
+        raise RuntimeError(f"Home page failed: {[e.value for e in app.exception] or [e.value for e in app.error]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from utils.snapshot import write_snapshot
+
+    load_dotenv()
+    engine = create_engine(
+        f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:"
+        f"{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+    )
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as snapshot_dir, tempfile.TemporaryDirectory() as empty_dir:
+        start = time.perf_counter()
+        write_snapshot(engine, directory=snapshot_dir)
+        print(f"Writing the snapshot: {time.perf_counter() - start:.2f}s (once per load)")
+        engine.dispose()
+        for label, directory in [("database", empty_dir), ("snapshot", snapshot_dir)]:
+            timings = []
+            for _ in range(args.repeat):
+                with context.Pool(1) as pool:
+                    timings.append(pool.apply(first_render, (directory,)))
+            timings.sort()
+            print(f"{label:>8}: first render {timings[len(timings) // 2] * 1000:7.0f} ms median, "
+                  f"{timings[0] * 1000:7.0f} ms best")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+The whole ETL, offline, on the generated corpus week saved in benchmarks/data/corpus:
+events.json and every latestresults page are served by the local stand-in,
+then each stage is timed on its own:
+
+- fetch: events.json and every page through ScraperEngine and the caching session
+- parse_bs4: the original extract_table_body/extract_data_from_table_body, for reference
+- parse: parse_event_page, as the ETL's extract uses it
+- transform: transform_batches
+- load: BatchLoader into a temporary Postgres (see benchmarks/postgres.py)
+
+Every run is appended to benchmarks/results/history.jsonl with the commit it
+ran on, and compared with the latest run of another commit, so regressions
+show up between commits. --copies repeats the corpus events for a bigger week.
+
+    python -m benchmarks.bench_suite --copies 20
+    python -m benchmarks.bench_suite --no-load --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.fixtures import corpus_site
+from benchmarks.http_standin import StandinServer
+from etl.parse import parse_event_page
+from utils.events import select_events
+from utils.http_session import CachingSession
+from utils.loader import BatchLoader
+from utils.page_store import PageStore
+from utils.parser import extract_data_from_table_body, extract_table_body
+from utils.records import finisher_count
+from utils.scraper import HEADERS, ScraperEngine
+from utils.transform import BATCH_ROWS, transform_batches
+
+RESULTS_FILE = os.path.join(os.path.dirname(__file__), "results", "history.jsonl")
+REGRESSION_THRESHOLD = 0.10  # A stage this much slower than the previous commit is flagged
+
+
+class SavedResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+def git_commit():
+    """
+    Return (commit hash, whether the working tree has uncommitted changes), or (None, None) outside git.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def fetch_week(server, cache_dir):
+    # The list of events, then every page, as the extract fetches them (without the politeness rate)
+    session = CachingSession(headers=HEADERS, validators_file=os.path.join(cache_dir, "validators.json"),
+                             page_store=PageStore(os.path.join(cache_dir, "pages")))
+    parkruns = select_events(session.get(server.url + "events.json").json())
+    engine = ScraperEngine(rate=1000, burst=8, max_workers=8, max_per_host=8, session=session)
+    jobs = ((parkrun_id, f"{server.url}{event['eventname']}/results/latestresults/")
+            for parkrun_id, event in enumerate(parkruns))
+    pages = dict(engine.run(jobs, lambda key, response: response.content if response is not None else b""))
+    session.close()
+    return parkruns, [pages[parkrun_id] for parkrun_id in range(len(parkruns))]
+
+
+def parsed_events(parkruns, contents):
+    # The (event, event info) pairs the extract hands to the transform
+    for parkrun_id, (event, content) in enumerate(zip(parkruns, contents)):
+        event_page = parse_event_page(content)
+        yield {"Event ID": event.get("id", parkrun_id), "Event Name": event["eventname"], **event_page}, event
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run_stages(args):
+    stages = {}
+    with StandinServer(corpus_site(args.copies), latency=args.latency) as server:
+        seconds = []
+        for _ in range(args.repeat):
+            # A fresh cache each time, so no page comes back as a 304
+            with tempfile.TemporaryDirectory() as cache_dir:
+                start = time.perf_counter()
+                parkruns, contents = fetch_week(server, cache_dir)
+                seconds.append(time.perf_counter() - start)
+    total_bytes = sum(len(content) for content in contents)
+    stages["fetch"] = {"seconds": min(seconds), "pages": len(contents), "mb": total_bytes / 1_000_000}
+
+    # The bs4 reference is slow enough that one pass over one copy of the corpus gives its rate
+    reference = contents[:len(contents) // args.copies]
+    seconds, rows = best_of(1, lambda: sum(
+        len(extract_data_from_table_body(extract_table_body(SavedResponse(content)))) for content in reference))
+    stages["parse_bs4"] = {"seconds": seconds, "rows": rows}
+    seconds, events = best_of(args.repeat, lambda: list(parsed_events(parkruns, contents)))
+    stages["parse"] = {"seconds": seconds, "rows": sum(finisher_count(event["Results"]) for event, _ in events)}
+    seconds, batches = best_of(args.repeat, lambda: list(transform_batches(iter(events), batch_rows=args.batch_rows)))
+    stages["transform"] = {"seconds": seconds, "rows": sum(len(df) for df in batches)}
+
+    if not args.no_load:
+        from benchmarks.postgres import BENCH_SCHEMA, benchmark_engine, reset_schema
+
+        with benchmark_engine() as engine:
+            seconds = []
+            for _ in range(args.repeat):
+                reset_schema(engine)
+                start = time.perf_counter()
+                loader = BatchLoader(engine, schema=BENCH_SCHEMA, mode="incremental")
+                for df in batches:
+                    loader.load(df)
+                loader.finish()
+                seconds.append(time.perf_counter() - start)
+        stages["load"] = {"seconds": min(seconds), "rows": loader.rows_loaded}
+
+    # One throughput figure per stage: pages/s for the fetch, rows/s for the rest
+    for name, stage in stages.items():
+        count = stage["pages"] if name == "fetch" else stage["rows"]
+        stage["per_second"] = round(count / stage["seconds"], 1) if stage["seconds"] else None
+        stage["seconds"] = round(stage["seconds"], 4)
+    return stages
+
+
+def previous_run(history, commit):
+    # The latest run from another commit; failing that, the latest run at all
+    others = [run for run in history if run.get("commit") != commit]
+    return (others or history or [None])[-1]
+
+
+def compare(stages, previous, threshold):
+    """
+    Print each stage's throughput against the previous run. Returns the stages that got slower than threshold.
+    """
+    regressions = []
+    label = f"{previous['commit']}{'+' if previous.get('dirty') else ''}" if previous else None
+    print(f"{'stage':<10} {'rate':>14}" + (f" {'vs ' + label:>16} {'change':>8}" if previous else ""))
+    for name, stage in stages.items():
+        unit = "pages/s" if name == "fetch" else "rows/s"
+        line = f"{name:<10} {stage['per_second']:>10,.0f} {unit:<7}"
+        before = (previous or {}).get("stages", {}).get(name, {}).get("per_second")
+        if before:
+            change = stage["per_second"] / before - 1
+            line += f" {before:>12,.0f} {unit:<7} {change:>+7.1%}"
+            if change < -threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10, help="Times to repeat the corpus events")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each stage; the best is kept")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stand-in response latency (s)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--no-load", action="store_true", help="Skip the load stage (no Postgres needed)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown against the previous commit reported as a regression (default 0.10)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    parser.add_argument("--no-save", action="store_true", help="Do not add this run to the history")
+    args = parser.parse_args()
+
+    stages = run_stages(args)
+    commit, dirty = git_commit()
+    run = {
+        "commit": commit,
+        "dirty": dirty,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "copies": args.copies,
+        "stages": stages,
+    }
+
+    history = []
+    if os.path.exists(RESULTS_FILE):
+        with open(RESULTS_FILE) as f:
+            history = [json.loads(line) for line in f if line.strip()]
+    # Only runs of the same corpus size on the same machine are comparable
+    history = [past for past in history if past.get("copies") == args.copies and past.get("host") == run["host"]]
+    regressions = compare(stages, previous_run(history, commit), args.threshold)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"Results added to {RESULTS_FILE} (commit {commit}{' with uncommitted changes' if dirty else ''})")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
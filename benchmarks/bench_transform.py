@@ -0,0 +1,102 @@
+"""
+Runtime and peak memory of the transform stage: the original per-row
+apply/explode/json_normalize code against utils.transform.transform_results,
+on a synthetic week. Both outputs are compared before timing.
+
+    python -m benchmarks.bench_transform --rows 1000000
+"""
+import argparse
+import ast
+import gc
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.fixtures import make_parsed_events
+from utils.parser import RESULT_FIELDS
+from utils.transform import transform_results
+
+
+def legacy_transform(events_results, uk_parkruns):
+    # The TRANSFORM block of runETL.py before it was vectorised, fed the original list of dicts per event
+    df = pd.DataFrame(events_results)
+    df_info = pd.DataFrame(uk_parkruns)
+    df_info = df_info.drop(columns='eventname')
+    df = pd.concat([df_info, df], axis=1)
+    new_column_order = ['Event ID', 'Event Name', 'EventLongName', 'coordinates', 'Run Date', 'Run Number', 'Results']
+    df = df[new_column_order]
+    df['Results'] = df['Results'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+    df['Results'] = df['Results'].apply(lambda x: x if isinstance(x, list) else [])
+    df_exploded = df.explode('Results', ignore_index=True)
+    df_flattened = pd.json_normalize(df_exploded['Results'])
+    df = pd.concat([df_exploded.drop('Results', axis=1), df_flattened], axis=1)
+    df['Achievement'] = df['Achievement'].fillna('None')
+    df['Achievement'] = df['Achievement'].replace('N/A', 'No Achievement')
+    df = df.dropna(subset=['Age Group'])
+    df = df[df['Age Group'] != 'N/A']
+    df['Event Name'] = df['Event Name'].astype(str)
+    df['Position'] = df['Position'].fillna(0).astype(int)
+    df['Runs'] = df['Runs'].fillna(0).astype(int)
+    df['Run Number'] = pd.to_numeric(df['Run Number'], errors='coerce').astype('Int64')
+    df = df.dropna(subset=['Time'])
+    df['Time'] = df['Time'].astype(str)
+    df['Time'] = df['Time'].apply(lambda x: f"00:{x}" if len(x.split(':')) == 2 else x)
+    df['Time'] = pd.to_timedelta(df['Time'], errors='coerce')
+    return df
+
+
+def as_rows(events_results):
+    return [
+        dict(event, Results=[dict(zip(RESULT_FIELDS, values)) for values in zip(*(event["Results"][f] for f in RESULT_FIELDS))])
+        for event in events_results
+    ]
+
+
+def measure(label, transform, *inputs):
+    # Timed and traced in separate passes: tracemalloc slows allocation-heavy code several times over
+    gc.collect()
+    start = time.perf_counter()
+    df = transform(*inputs)
+    elapsed = time.perf_counter() - start
+    del df
+    gc.collect()
+    tracemalloc.start()
+    df = transform(*inputs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>12}: {elapsed:6.2f}s, peak {peak / 1_000_000:7.1f} MB, "
+          f"result {df.memory_usage(deep=True).sum() / 1_000_000:7.1f} MB, {len(df):,} rows")
+    return df
+
+
+def check_same(before, after):
+    before = before.reset_index(drop=True)
+    for column in before.columns:
+        expected, actual = before[column], after[column]
+        if column in ("Position", "Runs", "Run Number", "Event ID"):
+            same = (expected.astype("Int64") == actual.astype("Int64")).all()
+        elif column == "Time":
+            same = expected.equals(actual)
+        else:
+            same = (expected.astype(object).astype(str) == actual.astype(object).astype(str)).all()
+        if not same:
+            raise AssertionError(f"Column {column} differs between the original and vectorised transforms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    events_results, event_info = make_parsed_events(args.rows)
+    row_events = as_rows(events_results)
+    before = measure("original", legacy_transform, row_events, event_info)
+    del row_events
+    after = measure("vectorised", transform_results, events_results, event_info)
+    check_same(before, after)
+    print("Outputs match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Synthetic parkrun pages for benchmarks. The markup mirrors the live
+latestresults pages closely enough for the ETL parser to treat them the same.
+"""
+import gzip
+import json
+import os
+import random
+from html import escape
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+CORPUS_DIR = os.path.join(DATA_DIR, "corpus")  # A generated week, saved to disk: events.json and every event's latestresults page
+# Finishers per corpus event, from a small event to the largest UK ones; 0 is a cancelled run with no results
+CORPUS_FINISHERS = [40, 85, 120, 180, 240, 300, 350, 420, 520, 1100, 1500, 0]
+
+FIRST_NAMES = ["Alex", "Sam", "Chris", "Jo", "Charlie", "Niamh", "Siân", "Zoë", "Rhys", "Aoife", "Priya", "Tom"]
+LAST_NAMES = ["SMITH", "JONES", "O'BRIEN", "WILLIAMS", "TAYLOR", "DAVIES", "EVANS", "MÜLLER", "PATEL", "BROWN"]
+AGE_GROUPS = ["JM10", "JW11-14", "SM20-24", "SW25-29", "VM35-39", "VW40-44", "VM45-49", "VW50-54", "VM60-64", "VW70-74", "VM80-84"]
+ACHIEVEMENTS = ["", "", "", "", "New PB!", "First Timer!"]
+
+
+def _format_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def _finisher_row(position, rng):
+    # Roughly one in twenty finishers is an unregistered "Unknown" runner
+    if rng.random() < 0.05:
+        return (
+            f'<tr class="Results-table-row" data-name="Unknown" data-agegroup="" data-club="" '
+            f'data-gender="" data-position="{position}" data-runs="0" data-vols="0" data-agegrade="0" data-achievement="">'
+            f'<td class="Results-table-td Results-table-td--position">{position}</td>'
+            f'<td class="Results-table-td Results-table-td--name"><div class="compact">Unknown</div></td>'
+            f'<td class="Results-table-td Results-table-td--time"></td></tr>'
+        )
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    age_group = rng.choice(AGE_GROUPS)
+    gender = "Female" if "W" in age_group[:2] else "Male"
+    achievement = rng.choice(ACHIEVEMENTS)
+    runs = rng.randint(1, 500) if achievement != "First Timer!" else 1
+    seconds = 900 + position * 3 + rng.randint(0, 60)
+    time_class = "Results-table-td Results-table-td--time"
+    if achievement == "New PB!":
+        time_class += " Results-table-td--pb"
+    elif achievement == "First Timer!":
+        time_class += " Results-table-td--ft"
+    return (
+        f'<tr class="Results-table-row" data-name="{escape(name)}" data-agegroup="{age_group}" data-club="" '
+        f'data-gender="{gender}" data-position="{position}" data-runs="{runs}" data-vols="{rng.randint(0, 20)}" '
+        f'data-agegrade="{rng.uniform(40, 90):.2f}" data-achievement="{achievement}">'
+        f'<td class="Results-table-td Results-table-td--position">{position}</td>'
+        f'<td class="Results-table-td Results-table-td--name"><div class="compact"><a href="/parkrunner/{position}">{escape(name)}</a></div>'
+        f'<div class="detailed">{runs} parkruns</div></td>'
+        f'<td class="Results-table-td Results-table-td--gender"><div class="compact">{gender}</div></td>'
+        f'<td class="Results-table-td Results-table-td--agegroup"><div class="compact"><a href="#">{age_group}</a></div></td>'
+        f'<td class="{time_class}"><div class="compact">{_format_time(seconds)}</div>'
+        f'<div class="detailed">{escape(achievement)}</div></td></tr>'
+    )
+
+
+def make_results_page(eventname, finishers, seed=0, run_date="19/10/2024", run_number=500):
+    """
+    Return the bytes of a latestresults page with `finishers` rows.
+    """
+    rng = random.Random(f"{eventname}-{seed}")
+    rows = "\n".join(_finisher_row(position, rng) for position in range(1, finishers + 1))
+    html = f"""<!DOCTYPE html>
+<html lang="en-GB"><head><meta charset="utf-8"><title>{eventname} parkrun results</title></head>
+<body><div class="Results">
+<div class="Results-header"><h1>{eventname} parkrun</h1>
+<h3><span class="format-date">{run_date}</span><span class="spacer">|</span><span>#{run_number}</span></h3></div>
+<table class="Results-table Results-table--compact js-ResultsTable">
+<thead><tr><th>Position</th><th>parkrunner</th><th>Gender</th><th>Age Group</th><th>Time</th></tr></thead>
+<tbody class="js-ResultsTbody">
+{rows}
+</tbody></table></div></body></html>"""
+    return html.encode("utf-8")
+
+
+EDGE_CASE_ROWS = """
+<tr class="Results-table-row" data-name="Seán O&#39;BRIEN" data-agegroup="VM50-54" data-gender="Male" data-position="1" data-runs="12" data-achievement=""><td class="Results-table-td Results-table-td--time"><div class="compact">18:01</div></td></tr>
+<tr class="Results-table-row Results-table-row--highlight" data-name="Ann LEE" data-agegroup="SW30-34" data-gender="Female" data-position="2" data-runs="3" data-achievement="New PB!"><td class="Results-table-td  Results-table-td--time	Results-table-td--pb"><div class="compact"><span>1:02:03</span> </div></td></tr>
+<tr class="Results-table-row" data-name="Two CELLS" data-agegroup="VW35-39" data-gender="Female" data-position="3" data-runs="1" data-achievement="First Timer!"><td class="Results-table-td Results-table-td--time Results-table-td--ft"><div class="compact">20:00</div></td><td class="Results-table-td Results-table-td--time"><div class="compact">20:01</div></td></tr>
+<tr class="Results-table-row" data-name="Age GRADE" data-agegroup="VM70-74" data-gender="Male" data-position="4" data-runs="99" data-achievement><td class="Results-table-td Results-table-td--time Results-table-td--agsb"><div class="compact">21:00</div></td></tr>
+<tr class="Results-table-row" data-name="No COMPACT" data-agegroup="JM11-14" data-gender="Male" data-position="5" data-runs="7" data-achievement=""><td class="Results-table-td Results-table-td--time"><div class="detailed">22:00</div></td></tr>
+<tr class="Results-table-advert"><td>Sponsored</td></tr>
+<tr class="Results-table-row" data-name="Empty TIME" data-agegroup="SM25-29" data-gender="Male" data-position="6" data-achievement=""><td class="Results-table-td Results-table-td--time"><div class="compact">  </div><div class="compact">23:00</div></td></tr>
+<tr class="Results-table-row" data-name="Unknown" data-agegroup="" data-gender="" data-position="7" data-runs="0" data-achievement=""><td class="Results-table-td Results-table-td--time"></td></tr>
+"""
+
+
+def make_edge_case_page():
+    """
+    Return a small page covering the markup quirks the parsers have to agree on.
+    """
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"></head><body>
+<table><tbody>{EDGE_CASE_ROWS}</tbody></table>
+<table><tbody><tr class="Results-table-row" data-name="Second TABLE" data-position="1"><td></td></tr></tbody></table>
+</body></html>"""
+    return html.encode("utf-8")
+
+
+def make_cancelled_page():
+    """
+    Return a page for an event with no results table (e.g. a cancelled run).
+    """
+    return b"<!DOCTYPE html><html><body><div class='Results'><p>There are no results for this event.</p></div></body></html>"
+
+
+def make_events_json(count, countrycode=97, seriesid=1):
+    """
+    Return the bytes of an events.json listing `count` synthetic events.
+    """
+    features = [
+        {
+            "id": event_id,
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(-3 + event_id * 0.01, 6), round(52 + event_id * 0.01, 6)]},
+            "properties": {
+                "eventname": f"event{event_id}",
+                "EventLongName": f"Event {event_id} parkrun",
+                "EventShortName": f"Event {event_id}",
+                "countrycode": countrycode,
+                "seriesid": seriesid,
+            },
+        }
+        for event_id in range(1, count + 1)
+    ]
+    data = {
+        "countries": {str(countrycode): {"url": "www.parkrun.org.uk", "bounds": [-8.6, 49.9, 1.8, 60.9]}},
+        "events": {"type": "FeatureCollection", "features": features},
+    }
+    return json.dumps(data).encode("utf-8")
+
+
+def saved_pages():
+    """
+    Return {file name: bytes} for the pages saved under benchmarks/data.
+    """
+    return {
+        name: open(os.path.join(DATA_DIR, name), "rb").read()
+        for name in sorted(os.listdir(DATA_DIR))
+        if name.endswith(".html")
+    }
+
+
+def save_pages():
+    """
+    Write the fixture pages to benchmarks/data. Run with `python -m benchmarks.fixtures`.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    pages = {
+        "edge_cases.html": make_edge_case_page(),
+        "cancelled.html": make_cancelled_page(),
+        "small_event.html": make_results_page("smallevent", 40, run_number=57),
+        "typical_event.html": make_results_page("typicalevent", 300, run_number=412),
+    }
+    for name, content in pages.items():
+        with open(os.path.join(DATA_DIR, name), "wb") as f:
+            f.write(content)
+        print(f"Saved {name} ({len(content):,} bytes)")
+
+
+def save_corpus():
+    """
+    Write the corpus week to benchmarks/data/corpus: events.json and one
+    gzipped latestresults page per event. The pages are generated by
+    make_results_page, not fetched, so the benchmarks never touch parkrun's
+    website; CORPUS_FINISHERS gives them the spread of sizes of a real week.
+    """
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    with open(os.path.join(CORPUS_DIR, "events.json"), "wb") as f:
+        f.write(make_events_json(len(CORPUS_FINISHERS)))
+    for event_id, finishers in enumerate(CORPUS_FINISHERS, start=1):
+        eventname = f"event{event_id}"
+        content = make_results_page(eventname, finishers, seed=event_id) if finishers else make_cancelled_page()
+        # mtime=0 keeps the files byte-identical when they are regenerated
+        with gzip.GzipFile(os.path.join(CORPUS_DIR, f"{eventname}.html.gz"), "wb", mtime=0) as f:
+            f.write(content)
+    print(f"Saved a corpus of {len(CORPUS_FINISHERS)} events ({sum(CORPUS_FINISHERS):,} finishers) to {CORPUS_DIR}")
+
+
+def corpus_site(copies=1):
+    """
+    Return {path: bytes} serving the corpus week as the parkrun website does:
+    /events.json and /<eventname>/results/latestresults/. With copies > 1 the
+    corpus events are repeated under new names for a bigger week.
+    """
+    pages = {}
+    with open(os.path.join(CORPUS_DIR, "events.json"), "rb") as f:
+        saved = json.load(f)
+    count = len(saved["events"]["features"])
+    for event_id in range(1, count * copies + 1):
+        with gzip.open(os.path.join(CORPUS_DIR, f"event{(event_id - 1) % count + 1}.html.gz"), "rb") as f:
+            pages[f"/event{event_id}/results/latestresults/"] = f.read()
+    pages["/events.json"] = make_events_json(count * copies) if copies > 1 else json.dumps(saved).encode("utf-8")
+    return pages
+
+
+if __name__ == "__main__":
+    save_pages()
+    save_corpus()
+
+
+def make_results_frame(rows, events=800, seed=0):
+    """
+    Return a DataFrame shaped like the output of the ETL transform, with
+    `rows` finishers spread over `events` events.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    event_ids = np.sort(rng.integers(0, events, rows))
+    age_groups = np.array(AGE_GROUPS)[rng.integers(0, len(AGE_GROUPS), rows)]
+    return pd.DataFrame({
+        "Event ID": event_ids,
+        "Event Name": pd.Series(event_ids).map(lambda i: f"event{i}"),
+        "EventLongName": pd.Series(event_ids).map(lambda i: f"Event {i} parkrun"),
+        "Country": "parkrun.org.uk",
+        "coordinates": pd.Series(event_ids).map(lambda i: [round(-3 + i * 0.01, 6), round(52 + i * 0.01, 6)]),
+        "Run Date": "2024-10-19",
+        "Run Number": (event_ids % 700 + 1).astype("int64"),
+        "Name": np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), rows)],
+        "Age Group": age_groups,
+        "Gender": np.where(np.char.find(age_groups.astype(str), "W") == 1, "Female", "Male"),
+        "Position": pd.Series(event_ids).groupby(event_ids).cumcount().to_numpy() + 1,
+        "Runs": rng.integers(1, 500, rows),
+        "Achievement": np.array(["No Achievement", "No Achievement", "New PB!", "First Timer!"])[rng.integers(0, 4, rows)],
+        "Time": pd.to_timedelta(rng.integers(900, 3600, rows), unit="s"),
+    })
+
+
+def iter_parsed_events(rows, events=800, seed=0):
+    """
+    Yield (event, event info) pairs as the extract stage hands them to the
+    transform: per-event results as parser strings, in {column: list} form.
+    Includes unknown runners and "N/A" times like the live pages.
+    """
+    rng = random.Random(seed)
+    per_event = [rows // events + (1 if i < rows % events else 0) for i in range(events)]
+    for event_id, finishers in enumerate(per_event):
+        columns = {field: [] for field in ["Name", "Age Group", "Gender", "Position", "Runs", "Achievement", "Time"]}
+        for position in range(1, finishers + 1):
+            unknown = rng.random() < 0.05
+            age_group = "N/A" if unknown else rng.choice(AGE_GROUPS)
+            columns["Name"].append("Unknown" if unknown else f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}")
+            columns["Age Group"].append(age_group)
+            columns["Gender"].append("N/A" if unknown else ("Female" if "W" in age_group[:2] else "Male"))
+            columns["Position"].append(str(position))
+            columns["Runs"].append("0" if unknown else str(rng.randint(1, 500)))
+            columns["Achievement"].append(rng.choice(["N/A", "N/A", "New PB!", "First Timer!"]))
+            columns["Time"].append("N/A" if unknown else _format_time(900 + position * 2 + rng.randint(0, 60)))
+        yield {
+            "Event ID": event_id,
+            "Event Name": f"event{event_id}",
+            "Run Date": "2024-10-19",
+            "Run Number": 100 + event_id,
+            "Results": columns,
+        }, {
+            "eventname": f"event{event_id}",
+            "EventLongName": f"Event {event_id} parkrun",
+            "coordinates": [round(-3 + event_id * 0.01, 6), round(52 + event_id * 0.01, 6)],
+        }
+
+
+def make_parsed_events(rows, events=800, seed=0):
+    """
+    Return (events_results, event_info) lists of the events from iter_parsed_events.
+    """
+    pairs = list(iter_parsed_events(rows, events, seed))
+    return [event for event, _ in pairs], [info for _, info in pairs]
@@ -0,0 +1,91 @@
+"""
+Local stand-in for the parkrun website, used to benchmark the scraper without
+touching the real servers.
+"""
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandinServer:
+    """
+    Serve a dict of {path: bytes} on localhost with an artificial response
+    latency. Paths listed in `flaky` answer 503 on their first request.
+    With outage=(start, duration) every request from `start` to start +
+    duration seconds after the first one answers 503, with a Retry-After of
+    `retry_after` seconds if given. Pages carry an ETag and answer
+    If-None-Match with a 304.
+
+    Use as a context manager; `url` is the base URL ending in "/".
+    """
+
+    def __init__(self, pages, latency=0.2, flaky=(), outage=None, retry_after=None):
+        self.pages = pages
+        self.latency = latency
+        self.flaky = set(flaky)
+        self.outage = outage
+        self.retry_after = retry_after
+        self.started = None
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                with server._lock:
+                    server.requests_served += 1
+                    failing = self.path in server.flaky
+                    server.flaky.discard(self.path)
+                    server.started = server.started or time.monotonic()
+                    if server.outage:
+                        elapsed = time.monotonic() - server.started
+                        failing = failing or server.outage[0] <= elapsed < server.outage[0] + server.outage[1]
+                body = server.pages.get(self.path)
+                if failing:
+                    self._send(503, b"", retry_after=server.retry_after)
+                elif body is None:
+                    self._send(404, b"")
+                else:
+                    etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self._send(304, b"", etag)
+                    else:
+                        self._send(200, body, etag)
+
+            def _send(self, status, body, etag=None, retry_after=None):
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,72 @@
+"""
+A Postgres database for benchmarks: BENCH_DATABASE_URL if set, otherwise a
+throwaway server started with pytest-postgresql (needs pg_ctl on PATH or in PG_CTL).
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, text
+
+from utils.loader import LATEST_VIEW, BatchLoader
+
+BENCH_SCHEMA = "parkrun_bench"  # Dropped and recreated by the benchmarks
+
+
+def reset_schema(engine):
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+
+
+def load_incremental(df, engine, schema=BENCH_SCHEMA, fallback_run_date=None):
+    """
+    Add a week's results to the history table in one go, as the ETL's batches do.
+    """
+    loader = BatchLoader(engine, schema, "incremental", fallback_run_date=fallback_run_date)
+    loader.load(df)
+    loader.finish()
+
+
+def load_replace(df, engine, schema=BENCH_SCHEMA, table_name=LATEST_VIEW):
+    """
+    Replace the dashboard table with df, as the original load did.
+    """
+    loader = BatchLoader(engine, schema, "replace", table_name=table_name)
+    loader.load(df)
+    loader.finish()
+
+
+@contextmanager
+def benchmark_engine():
+    url = os.getenv("BENCH_DATABASE_URL")
+    if url:
+        engine = create_engine(url)
+        reset_schema(engine)
+        yield engine
+        engine.dispose()
+        return
+
+    from port_for import get_port
+    from pytest_postgresql.executor import PostgreSQLExecutor
+    from pytest_postgresql.janitor import DatabaseJanitor
+
+    pg_ctl = os.getenv("PG_CTL") or shutil.which("pg_ctl")
+    if not pg_ctl:
+        raise SystemExit("Set BENCH_DATABASE_URL, or put pg_ctl on PATH (or in PG_CTL) for a temporary server")
+    with tempfile.TemporaryDirectory() as tmp:
+        executor = PostgreSQLExecutor(
+            executable=pg_ctl, host="127.0.0.1", port=get_port(None), datadir=os.path.join(tmp, "data"),
+            unixsocketdir=tmp, logfile=os.path.join(tmp, "postgres.log"), startparams="-w", dbname="bench",
+        )
+        with executor:
+            executor.wait_for_postgres()
+            with DatabaseJanitor(user=executor.user, host=executor.host, port=executor.port,
+                                 dbname=executor.dbname, version=executor.version, password=executor.password):
+                engine = create_engine(
+                    f"postgresql://{executor.user}:{executor.password}@{executor.host}:{executor.port}/{executor.dbname}"
+                )
+                reset_schema(engine)
+                yield engine
+                engine.dispose()
@@ -0,0 +1,5 @@
+"""
+The parkrun ETL as a package: etl.extract fetches and parses the results
+pages, etl.transform turns them into typed DataFrames and etl.load writes
+those to Postgres. etl.cli runs the stages together or one at a time.
+"""
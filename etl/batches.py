@@ -0,0 +1,115 @@
+"""
+What the ETL stages hand each other between commands. Extract batches are
+lists of (event data, event info) pairs, saved as gzipped JSON; transform
+batches are DataFrames, saved as Parquet. A manifest beside them carries what
+the load needs from the extract besides the results.
+"""
+import glob
+import gzip
+import json
+import os
+
+import pandas as pd
+
+from utils.page_store import CACHE_DIR
+from utils.records import json_default, json_object_hook
+
+BATCHES_DIR = os.path.join(CACHE_DIR, "batches")  # One directory of batches per run key
+MANIFEST_FILE = "manifest.json"
+EXTRACT_PREFIX = "extract"
+TRANSFORM_PREFIX = "transform"
+
+
+def in_cache(cache_dir, path):
+    """
+    Return where path, one of the default cache locations (e.g. CHECKPOINT_FILE), is under cache_dir.
+    """
+    return os.path.join(cache_dir, os.path.relpath(path, CACHE_DIR))
+
+
+def batch_dir(cache_dir, run_key):
+    return os.path.join(in_cache(cache_dir, BATCHES_DIR), run_key)
+
+
+class Manifest:
+    """
+    The extract's account of a run, filled in as the events are extracted:
+    the events fetched, the fingerprint of every page seen, and the run the
+    dashboard keeps for each event that was skipped or is still without
+    results. The load reads it once every batch is in.
+    """
+
+    def __init__(self, run_key, load_mode="incremental", backfill=False, events=None, kept_runs=None,
+                 fingerprints=None):
+        self.run_key = run_key
+        self.load_mode = load_mode
+        self.backfill = backfill
+        self.events = events or []
+        self.kept_runs = kept_runs or {}  # eventname -> "YYYY-MM-DD"
+        self.fingerprints = fingerprints or {}  # eventname -> (run date, run number, digest)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+            json.dump(vars(self), f)
+
+
+def read_manifest(directory):
+    """
+    Return the Manifest saved in directory, or None if there is none.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return Manifest(**json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def _batch_files(directory, prefix):
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}-*")))
+
+
+def _clear(directory, prefix):
+    os.makedirs(directory, exist_ok=True)
+    for path in _batch_files(directory, prefix):
+        os.remove(path)
+
+
+def write_event_batches(directory, batches):
+    """
+    Save each extract batch as it arrives, replacing any saved before. Returns the number saved.
+    """
+    _clear(directory, EXTRACT_PREFIX)
+    count = 0
+    for count, batch in enumerate(batches, start=1):
+        with gzip.open(os.path.join(directory, f"{EXTRACT_PREFIX}-{count:05d}.json.gz"), "wt", encoding="utf-8") as f:
+            json.dump(batch, f, default=json_default)
+    return count
+
+
+def read_event_batches(directory):
+    """
+    Yield the saved extract batches in order, one at a time.
+    """
+    for path in _batch_files(directory, EXTRACT_PREFIX):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            yield json.load(f, object_hook=json_object_hook)
+
+
+def write_frames(directory, frames):
+    """
+    Save each transformed DataFrame as it arrives, replacing any saved before. Returns the number saved.
+    """
+    _clear(directory, TRANSFORM_PREFIX)
+    count = 0
+    for count, df in enumerate(frames, start=1):
+        df.to_parquet(os.path.join(directory, f"{TRANSFORM_PREFIX}-{count:05d}.parquet"), index=False)
+    return count
+
+
+def read_frames(directory):
+    """
+    Yield the saved transform batches in order, one at a time.
+    """
+    for path in _batch_files(directory, TRANSFORM_PREFIX):
+        yield pd.read_parquet(path)
@@ -0,0 +1,199 @@
+"""
+Command line for the ETL: python -m etl <command> [options]
+
+  extract    fetch and parse this week's results into batches in the cache
+  transform  transform the extracted batches
+  load       load the transformed batches into Postgres
+  run        all three at once, streaming each batch from stage to stage
+
+runETL.py is `run`. Each command writes its own run metrics.
+"""
+import argparse
+
+from etl.batches import (batch_dir, in_cache, read_event_batches, read_frames, read_manifest, write_event_batches,
+                         write_frames)
+from etl.extract import Extractor
+from etl.load import database_engine, dry_run, load
+from etl.transform import transform
+from utils.backfill import BACKFILL_RUN_KEY
+from utils.checkpoint import current_run_key
+from utils.events import SERIES_5K, UK_COUNTRY_CODE
+from utils.fingerprints import DEFER_RETRIES, DEFER_WAIT
+from utils.metrics import METRICS_DIR, Profiler, RunMetrics, default_metrics_path
+from utils.page_store import CACHE_DIR
+from utils.scraper import MAX_WORKERS
+from utils.transform import BATCH_ROWS, event_batches
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--run-key", default=None,
+                        help="Week to work on (defaults to the date of the most recent Saturday, or 'backfill' for a backfill)")
+    common.add_argument("--cache-dir", default=CACHE_DIR,
+                        help=f"Where pages, checkpoints, fingerprints, batches and metrics are kept (default: {CACHE_DIR})")
+    common.add_argument("--metrics-file", default=None,
+                        help="Where to write the run's timings as JSON lines (default: <cache dir>/metrics/<run key>-<time>.jsonl)")
+    common.add_argument("--profile", nargs="?", const="runETL.prof", default=None, metavar="PATH",
+                        help="Profile the run with cProfile, worker threads included, and save the statistics to PATH")
+    common.add_argument("--tracemalloc", action="store_true",
+                        help="Trace memory allocations: peak per stage and the largest allocation sites")
+
+    extract_options = argparse.ArgumentParser(add_help=False)
+    extract_options.add_argument("--replay", action="store_true",
+                                 help="Re-parse this week's cached pages instead of fetching anything")
+    extract_options.add_argument("--fresh", action="store_true",
+                                 help="Ignore this week's checkpoint and fetch every event again")
+    extract_options.add_argument("--load-mode", choices=["incremental", "replace"], default="incremental",
+                                 help="Add this week to the results history (default), or replace the table with this week only")
+    extract_options.add_argument("--countries", nargs="+", default=[str(UK_COUNTRY_CODE)],
+                                 help="countrycodes from events.json to fetch, or 'all' (default: 97, the UK)")
+    extract_options.add_argument("--series", nargs="+", type=int, default=[SERIES_5K],
+                                 help="seriesids to fetch: 1 for 5k events (default), 2 for junior events")
+    extract_options.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                                 help="Finishers transformed and loaded together; memory use grows with this, not with the number of events")
+    extract_options.add_argument("--backfill", type=int, default=None, metavar="RUNS",
+                                 help="Instead of the latest results, fetch up to RUNS earlier runs of each event already in the history")
+    extract_options.add_argument("--defer-retries", type=int, default=DEFER_RETRIES,
+                                 help="Extra passes over events whose results are not up yet")
+    extract_options.add_argument("--defer-wait", type=float, default=DEFER_WAIT,
+                                 help="Seconds to wait before each pass over the deferred events")
+    extract_options.add_argument("--workers", type=int, default=MAX_WORKERS,
+                                 help=f"Fetch threads per results website (default: {MAX_WORKERS})")
+    extract_options.add_argument("--parse-processes", type=int, default=0,
+                                 help="Worker processes parsing the fetched pages (default: 0, parse on the fetch threads)")
+
+    transform_options = argparse.ArgumentParser(add_help=False)
+    transform_options.add_argument("--processes", type=int, default=1,
+                                   help="Worker processes transforming batches side by side (default: 1, in this process)")
+
+    load_options = argparse.ArgumentParser(add_help=False)
+    load_options.add_argument("--no-snapshot", action="store_true",
+                              help="Do not write the Arrow snapshot the dashboard reads at startup")
+    load_options.add_argument("--dry-run", action="store_true",
+                              help="Go through every stage but write nothing to the database")
+
+    parser = argparse.ArgumentParser(prog="etl", description="Extract, transform and load parkrun results (UK 5k events by default).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("extract", parents=[common, extract_options],
+                        help="Fetch and parse results pages into batches in the cache directory")
+    commands.add_parser("transform", parents=[common, transform_options], help="Transform the extracted batches")
+    commands.add_parser("load", parents=[common, load_options], help="Load the transformed batches into Postgres")
+    commands.add_parser("run", parents=[common, extract_options, transform_options, load_options],
+                        help="Extract, transform and load in one pipeline")
+    return parser
+
+
+def _run_key(args):
+    if args.run_key:
+        return args.run_key
+    return BACKFILL_RUN_KEY if getattr(args, "backfill", None) is not None else current_run_key()
+
+
+def _instruments(args, run_key):
+    # Timings of every request, event and stage go to a JSON lines file, summarised at the end of the command
+    label = run_key if args.command == "run" else f"{run_key}-{args.command}"
+    path = args.metrics_file or default_metrics_path(label, in_cache(args.cache_dir, METRICS_DIR))
+    metrics = RunMetrics(path, run_key=run_key, trace_memory=args.tracemalloc)
+    profiler = Profiler(args.profile) if args.profile else None
+    if profiler:
+        profiler.start()
+    return metrics, profiler
+
+
+def _finish(metrics, profiler):
+    metrics.close()
+    if profiler:
+        profiler.stop()
+
+
+def _needs_database(args):
+    # A backfill reads which runs are stored, and change detection (incremental and not a replay) which runs
+    # the dashboard shows. Anything else extracts without a database, so a replay or dry run can be offline.
+    return args.backfill is not None or (args.load_mode == "incremental" and not args.replay)
+
+
+def _extractor(args, run_key, metrics, profiler):
+    engine = database_engine() if _needs_database(args) else None
+    return Extractor(engine, metrics, run_key=run_key, cache_dir=args.cache_dir, load_mode=args.load_mode,
+                     countries=None if "all" in args.countries else [int(code) for code in args.countries],
+                     series=args.series, workers=args.workers, replay=args.replay, fresh=args.fresh,
+                     backfill=args.backfill, defer_retries=args.defer_retries, defer_wait=args.defer_wait,
+                     parse_processes=args.parse_processes, profiler=profiler), engine
+
+
+def _saved_manifest(directory):
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise SystemExit(f"Nothing extracted in {directory}: run python -m etl extract first")
+    return manifest
+
+
+def extract_command(args):
+    run_key = _run_key(args)
+    metrics, profiler = _instruments(args, run_key)
+    extractor, _ = _extractor(args, run_key, metrics, profiler)
+    directory = batch_dir(args.cache_dir, extractor.run_key)
+    saved = write_event_batches(directory, event_batches(extractor.events(), batch_rows=args.batch_rows))
+    extractor.manifest.save(directory)
+    print(f"{saved} batches of events saved to {directory}.")
+    extractor.close()
+    _finish(metrics, profiler)
+
+
+def transform_command(args):
+    run_key = _run_key(args)
+    directory = batch_dir(args.cache_dir, run_key)
+    _saved_manifest(directory)
+    metrics, profiler = _instruments(args, run_key)
+    batches = metrics.timed("transform", transform(metrics.timed("read", read_event_batches(directory)),
+                                                   processes=args.processes))
+    saved = write_frames(directory, batches)
+    print(f"{saved} transformed batches saved to {directory}.")
+    _finish(metrics, profiler)
+
+
+def load_command(args):
+    run_key = _run_key(args)
+    directory = batch_dir(args.cache_dir, run_key)
+    manifest = _saved_manifest(directory)
+    metrics, profiler = _instruments(args, run_key)
+    frames = metrics.timed("read", read_frames(directory))
+    if args.dry_run:
+        dry_run(frames, metrics)
+    else:
+        load(frames, database_engine(), manifest, metrics, snapshot=not args.no_snapshot, cache_dir=args.cache_dir)
+    _finish(metrics, profiler)
+
+
+def run_command(args):
+    run_key = _run_key(args)
+    metrics, profiler = _instruments(args, run_key)
+    extractor, engine = _extractor(args, run_key, metrics, profiler)
+    # Extract, transform and load are chained generators: each event's page is
+    # parsed as it arrives, transformed in micro-batches and loaded straight away,
+    # so memory use does not grow with the number of events
+    batches = event_batches(extractor.events(), batch_rows=args.batch_rows)
+    frames = metrics.timed("transform", transform(batches, processes=args.processes))
+    if args.dry_run:
+        dry_run(frames, metrics)
+    else:
+        load(frames, engine or database_engine(), extractor.manifest, metrics, snapshot=not args.no_snapshot,
+             cache_dir=args.cache_dir)
+    extractor.close()
+    _finish(metrics, profiler)
+
+
+COMMANDS = {
+    "extract": extract_command,
+    "transform": transform_command,
+    "load": load_command,
+    "run": run_command,
+}
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "backfill", None) is not None and args.load_mode != "incremental":
+        parser.error("--backfill adds to the results history, so it needs --load-mode incremental")
+    COMMANDS[args.command](args)
@@ -0,0 +1,363 @@
+"""
+Extract: the list of events from events.json, then each event's latest (or,
+for a backfill, past) results page, fetched or replayed from the cache and
+parsed into the (event data, event info) pairs the transform takes.
+"""
+import os
+import time
+from functools import partial
+
+from etl.batches import Manifest, in_cache
+from etl.parse import ParseError, parse_pages, timed_parse
+from utils.backfill import BACKFILL_RUN_KEY, backfill_event_name, backfill_jobs, stored_runs
+from utils.checkpoint import CHECKPOINT_FILE, Checkpoint
+from utils.events import SERIES_5K, UK_COUNTRY_CODE, results_url, select_events
+from utils.fingerprints import (CHANGED, DEFER_RETRIES, DEFER_WAIT, DEFERRED, FINGERPRINTS_FILE, UNCHANGED,
+                                ChangeStats, FingerprintStore, change_status)
+from utils.http_session import VALIDATORS_FILE, CachingSession
+from utils.loader import SCHEMA_NAME, stored_latest_runs
+from utils.page_store import CACHE_DIR, PageStore
+from utils.parser import page_fingerprint
+from utils.records import finisher_count
+from utils.scraper import HEADERS, MAX_WORKERS, HandlerFailed, ScraperEngine, make_a_request, wait_function
+
+EVENT_DATA_URL = "https://images.parkrun.com/events.json"
+FAILED = "failed"  # Status of an event whose page could not be fingerprinted or parsed
+
+
+class Extractor:
+    """
+    One week's extraction, or a backfill of earlier weeks when backfill is a
+    number of runs.
+
+    Every fetched page and its parsed rows are checkpointed as they arrive, so
+    a restarted run carries on where it stopped; replay re-parses this week's
+    checkpointed pages without fetching anything. Pages are parsed on the
+    scraper worker that fetched them or, with parse_processes, handed as raw
+    bytes to that many worker processes.
+
+    Each event's last loaded page is fingerprinted (run date, run number and a
+    digest of the results table). For an incremental load a page that has not
+    changed since is neither parsed nor loaded, and the dashboard keeps its run.
+    What the load needs to know about that is in self.manifest. The database
+    engine is only read for change detection and backfills; it can be None
+    for anything else, such as a replay.
+
+    An event whose page cannot be handled is skipped, and the rest carry on:
+    the error goes to the metrics and the checkpoint, and the dashboard keeps
+    the event's last run.
+    """
+
+    def __init__(self, engine, metrics, run_key=None, schema=SCHEMA_NAME, cache_dir=CACHE_DIR, load_mode="incremental",
+                 countries=(UK_COUNTRY_CODE,), series=(SERIES_5K,), workers=MAX_WORKERS, replay=False, fresh=False,
+                 backfill=None, defer_retries=DEFER_RETRIES, defer_wait=DEFER_WAIT, parse_processes=0, profiler=None):
+        self.engine = engine
+        self.metrics = metrics
+        self.schema = schema
+        self.countries = countries
+        self.series = series
+        self.workers = workers
+        self.replay = replay
+        self.backfill = backfill
+        self.defer_retries = defer_retries
+        self.defer_wait = defer_wait
+        self.parse_processes = parse_processes
+        self.profiled = profiler.wrap if profiler else (lambda handler: handler)
+        self.page_store = PageStore(os.path.join(cache_dir, "pages"))
+        self.validators_file = in_cache(cache_dir, VALIDATORS_FILE)
+        self.session = None
+
+        # A backfill has its own checkpoint, so it can be stopped and resumed across weeks
+        self.checkpoint = Checkpoint(in_cache(cache_dir, CHECKPOINT_FILE),
+                                     run_key=run_key or (BACKFILL_RUN_KEY if backfill is not None else None),
+                                     page_store=self.page_store)
+        if fresh:
+            self.checkpoint.clear()
+        self.manifest = Manifest(self.checkpoint.run_key, load_mode=load_mode, backfill=backfill is not None)
+
+        self.detect_changes = load_mode == "incremental" and backfill is None and not replay
+        self.fingerprints = FingerprintStore(in_cache(cache_dir, FINGERPRINTS_FILE))
+        self.previous_fingerprints = self.fingerprints.load() if self.detect_changes else {}
+        self.latest_runs = {}
+        if self.detect_changes:
+            try:
+                self.latest_runs = stored_latest_runs(engine, schema)
+            except Exception as e:
+                print(f"Could not read the latest runs loaded, so every event will be processed: {e}")
+        self.change_stats = ChangeStats()
+        self.failed = 0
+
+    @property
+    def run_key(self):
+        return self.checkpoint.run_key
+
+    @property
+    def parkruns(self):
+        return self.manifest.events
+
+    def _keep_latest(self, eventname):
+        # Not checkpointed, so the next run tries this event again. Until then the dashboard shows its last run.
+        if eventname in self.latest_runs:
+            self.manifest.kept_runs[eventname] = str(self.latest_runs[eventname])
+
+    def _record_parse(self, event_key, content, event_page, seconds):
+        # Record how long a page took to parse and how many rows it gave
+        self.metrics.record("event", event=event_key, status=CHANGED, parse_seconds=round(seconds, 5),
+                            rows=finisher_count(event_page["Results"]), bytes=len(content))
+        self.change_stats.record_parse(seconds)
+
+    def _failed(self, event_key, url, content, error):
+        # Checkpointed, so a resumed run skips the page rather than failing on it again; --fresh tries it again
+        print(f"Skipping {event_key}: its page could not be handled ({error})")
+        self.metrics.record("event", event=event_key, status=FAILED, error=str(error),
+                            bytes=len(content) if content else 0)
+        self.checkpoint.save_failure(event_key, url, content, error)
+        if self.backfill is None:
+            self._keep_latest(event_key)
+        self.failed += 1
+
+    def measured_parse(self, event_key, content):
+        event_page, seconds, error = timed_parse(content)
+        if error:
+            raise ParseError(error)
+        self._record_parse(event_key, content, event_page, seconds)
+        return event_page
+
+    def _parsed(self, pages):
+        """
+        Yield (event key, url, content, parsed page) for each (event key, url,
+        content, parsed page or None) from pages, parsing the pages not parsed
+        yet: in the parse processes if there are any, otherwise here.
+        """
+        if not self.parse_processes:
+            for event_key, url, content, event_page in pages:
+                if event_page is None:
+                    event_page, seconds, error = timed_parse(content)
+                    if error:
+                        self._failed(event_key, url, content, error)
+                        continue
+                    self._record_parse(event_key, content, event_page, seconds)
+                yield event_key, url, content, event_page
+            return
+        # Waiting for a parse process holds back the scraper, which stops fetching once max_pending pages wait
+        jobs = (((event_key, url), content) for event_key, url, content, _ in pages)
+        for (event_key, url), content, event_page, seconds, error in parse_pages(jobs, self.parse_processes):
+            if error:
+                self._failed(event_key, url, content, error)
+                continue
+            self._record_parse(event_key, content, event_page, seconds)
+            yield event_key, url, content, event_page
+
+    def parse_event_response(self, job, response):
+        # Runs on a scraper worker thread, so parsing overlaps with other fetches. job is (parkrun id, event key, url).
+        if response is None:
+            return None
+        if self.parse_processes:
+            return response.content, None
+        return response.content, self.measured_parse(job[1], response.content)
+
+    def list_events(self):
+        """
+        Retrieve the list of Parkruns for the chosen countries, falling back to
+        the list saved earlier this week.
+        """
+        if self.replay:
+            self.manifest.events = self.checkpoint.load_events() or []
+            return self.parkruns
+        print("Attempting to retrieve list of Parkruns...")
+        # One pooled session for the whole run; unchanged pages come back as 304s
+        self.session = CachingSession(headers=HEADERS, validators_file=self.validators_file, page_store=self.page_store)
+        # Get the event JSON data from the URL, retrying with backoff if the server is busy
+        with self.metrics.stage("events"):
+            response = make_a_request(EVENT_DATA_URL, headers=HEADERS, session=self.session)
+        if response is not None:
+            data = response.json()  # Parse JSON data
+            # Extract event names, EventLongName, coordinates and results domain for the chosen countries and series
+            self.manifest.events = select_events(data, countries=self.countries, series=self.series)
+            del data
+            self.checkpoint.save_events(self.parkruns)
+            with self.metrics.stage("sleep"):
+                wait_function()
+            domains = {event["domain"] for event in self.parkruns}
+            print(f"Found {len(self.parkruns)} Parkruns on {len(domains)} results websites "
+                  f"(series {', '.join(map(str, self.series))}):")
+        else:
+            print("Failed to fetch the list of events")
+            self.manifest.events = self.checkpoint.load_events() or []
+        return self.parkruns
+
+    def _scraper(self):
+        # Requests are paced by a token bucket per results website rather than a sleep after each one,
+        # and the websites are fetched side by side, each with its own workers
+        hosts = len({event.get("domain") for event in self.parkruns}) or 1
+        return ScraperEngine(session=self.session, max_workers=self.workers * hosts, metrics=self.metrics)
+
+    def check_event_response(self, parkrun_id, response, final=False):
+        # Runs on a scraper worker thread: fingerprint the page, and only parse it if it has changed
+        # (unless the parse processes do). On the final pass a page still showing an earlier week's run
+        # is taken as unchanged.
+        if response is None:
+            return None
+        content = response.content
+        fingerprint = page_fingerprint(content)
+        eventname = self.parkruns[parkrun_id]['eventname']
+        status = CHANGED
+        if self.detect_changes:
+            status = change_status(fingerprint, self.previous_fingerprints.get(eventname),
+                                   self.latest_runs.get(eventname), run_key=None if final else self.run_key)
+        elif fingerprint[2] is None:
+            status = DEFERRED
+        if status != CHANGED or self.parse_processes:
+            if status != CHANGED:
+                self.metrics.record("event", event=eventname, status=status, bytes=len(content))
+            return status, fingerprint, content, None
+        return status, fingerprint, content, self.measured_parse(eventname, content)
+
+    def fetch_event_pages(self):
+        """
+        Yield (eventname, parsed page) for every event that has changed,
+        fetching the ones not checkpointed yet. Events without this week's
+        results are fetched again after defer_wait seconds.
+        """
+        done = self.checkpoint.completed_keys()
+        if done:
+            print(f"Resuming: {len(done)} events already fetched this week")
+        failed = self.checkpoint.failed_keys()
+        if failed:
+            print(f"Skipping {len(failed)} events whose pages could not be handled earlier this week")
+            for eventname in failed:
+                self._keep_latest(eventname)
+        done |= failed
+        # Checkpointed events are loaded again; the load is an upsert, so this is safe
+        yield from self.checkpoint.completed_events()
+
+        for eventname, url, content, event_page in self._parsed(self._fetched_event_pages(done)):
+            self.checkpoint.save_event(eventname, url, content, event_page)
+            print(f"results added for {eventname} parkrun")
+            yield eventname, event_page
+
+    def _fetched_event_pages(self, done):
+        # (eventname, url, content, parsed page or None) for every changed page fetched
+        scraper = self._scraper()
+        pending = [parkrun_id for parkrun_id, event in enumerate(self.parkruns) if event['eventname'] not in done]
+        for attempt in range(self.defer_retries + 1):
+            if attempt:
+                print(f"Waiting {self.defer_wait:.0f}s before trying {len(pending)} deferred events again...")
+                with self.metrics.stage("sleep"):
+                    time.sleep(self.defer_wait)
+            urls = ((parkrun_id, results_url(self.parkruns[parkrun_id])) for parkrun_id in pending)
+            handler = self.profiled(partial(self.check_event_response, final=attempt == self.defer_retries))
+            deferred = []
+            for parkrun_id, fetched in scraper.run(urls, handler):
+                eventname = self.parkruns[parkrun_id]['eventname']
+                if fetched is None:
+                    print(f"No results for {eventname} parkrun")
+                    self._keep_latest(eventname)
+                    continue
+                if isinstance(fetched, HandlerFailed):
+                    self._failed(eventname, results_url(self.parkruns[parkrun_id]),
+                                 getattr(fetched.response, "content", None), fetched.error)
+                    continue
+                status, fingerprint, content, event_page = fetched
+                if status == DEFERRED:
+                    deferred.append(parkrun_id)
+                    continue
+                self.change_stats.record(status)
+                self.manifest.fingerprints[eventname] = fingerprint
+                if status == UNCHANGED:
+                    self.manifest.kept_runs[eventname] = fingerprint[0]
+                    continue
+                yield eventname, results_url(self.parkruns[parkrun_id]), content, event_page
+            if attempt == 0:
+                self.change_stats.deferred = len(deferred)
+            pending = deferred
+            if not pending:
+                break
+        for parkrun_id in pending:
+            eventname = self.parkruns[parkrun_id]['eventname']
+            print(f"No results yet for {eventname} parkrun")
+            self._keep_latest(eventname)
+        self.change_stats.waiting = len(pending)
+        scraper.report()
+
+    def fetch_past_pages(self):
+        """
+        Yield (eventname, parsed page) for earlier runs of the events in the
+        history, at the same polite rate as the weekly fetch.
+        """
+        done = self.checkpoint.completed_keys() | self.checkpoint.failed_keys()
+        if done:
+            print(f"Resuming: {len(done)} past results pages already fetched or skipped")
+        yield from ((backfill_event_name(key), page) for key, page in self.checkpoint.completed_events())
+
+        for key, url, content, event_page in self._parsed(self._fetched_past_pages(done)):
+            self.checkpoint.save_event(key, url, content, event_page)
+            print(f"results added for {backfill_event_name(key)} parkrun, run {event_page.get('Run Number')}")
+            yield backfill_event_name(key), event_page
+
+    def _fetched_past_pages(self, done):
+        # (backfill key, url, content, parsed page or None) for every past page fetched
+        scraper = self._scraper()
+        jobs = (((parkrun_id, key, url), url) for parkrun_id, key, url in
+                backfill_jobs(self.parkruns, stored_runs(self.engine, self.schema), self.backfill, done))
+        for (parkrun_id, key, url), fetched in scraper.run(jobs, self.profiled(self.parse_event_response)):
+            if fetched is None:
+                print(f"No results for {key}")
+                continue
+            if isinstance(fetched, HandlerFailed):
+                self._failed(key, url, getattr(fetched.response, "content", None), fetched.error)
+                continue
+            content, event_page = fetched
+            yield key, url, content, event_page
+        scraper.report()
+
+    def event_pages(self):
+        """
+        Yield (eventname, parsed page) for this run: replayed, backfilled or fetched.
+        """
+        if self.replay:
+            print(f"Replaying cached results for the week of {self.run_key}...")
+            pages = ((event_key, None, content, None) for event_key, content in self.checkpoint.stored_pages())
+            return ((event_key, event_page) for event_key, _, _, event_page in self._parsed(pages))
+        if self.backfill is not None:
+            return self.fetch_past_pages()
+        return self.fetch_event_pages()
+
+    def events(self):
+        """
+        Yield (event data, event info) for each event page, in the form the transform expects.
+        """
+        self.list_events()
+        event_ids = {event['eventname']: parkrun_id for parkrun_id, event in enumerate(self.parkruns)}
+        # Time spent waiting here for the next page is the extract stage (fetching, and parsing not yet overlapped)
+        for eventname, event_page in self.metrics.timed("extract", self.event_pages()):
+            if eventname not in event_ids:
+                continue
+            parkrun_id = event_ids[eventname]
+            # Store event and its results as a dictionary
+            event_data = {
+                # The events.json id, so an event keeps its id from week to week
+                "Event ID": self.parkruns[parkrun_id].get("id", parkrun_id),
+                "Event Name": eventname,
+                "Run Date": event_page.get("Run Date"),
+                "Run Number": event_page.get("Run Number"),
+                "Results": event_page.get("Results", {})
+            }
+            yield event_data, self.parkruns[parkrun_id]
+        print("Extraction Complete")
+
+    def close(self):
+        """
+        Report what change detection skipped and close the checkpoint and the session.
+        """
+        self.checkpoint.close()
+        if self.failed:
+            print(f"{self.failed} events skipped because their pages could not be handled; "
+                  "run again with --fresh to retry them.")
+        if self.detect_changes:
+            self.change_stats.report()
+            self.fingerprints.record_run(self.run_key, self.change_stats)
+        self.fingerprints.close()
+        if self.session:
+            self.session.report()
+            self.session.close()
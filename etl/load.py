@@ -0,0 +1,114 @@
+"""
+Load: the transformed batches into Postgres, then what the dashboard reads
+from them (weekly rollups, summary tables and the Arrow snapshot).
+"""
+import os
+from datetime import date
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+from etl.batches import in_cache
+from utils.fingerprints import FINGERPRINTS_FILE, FingerprintStore
+from utils.loader import EVENTS_TABLE, LATEST_VIEW, SCHEMA_NAME, BatchLoader, load_events
+from utils.page_store import CACHE_DIR
+from utils.snapshot import discard_snapshot, write_snapshot
+from utils.summaries import refresh_summaries, refresh_weekly_rollups
+
+
+def database_engine():
+    """
+    Return a SQLAlchemy engine for the database in the .env file (DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD).
+    """
+    # Load environment variables from .env file
+    load_dotenv()
+    print("Received credentials...")
+    return create_engine(f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:"
+                         f"{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}")
+
+
+def load(batches, engine, manifest, metrics, schema=SCHEMA_NAME, table_name=LATEST_VIEW, snapshot=True,
+         cache_dir=CACHE_DIR):
+    """
+    Load DataFrames from batches as manifest.load_mode says, then refresh the
+    rollups, summaries and snapshot. Pulling each batch drives the extract and
+    transform behind it, so the manifest is only read once every batch is in.
+    Errors are printed rather than raised; returns the number of rows loaded.
+    """
+    print("Loading data...")
+    backfilling = manifest.backfill
+    loader = None
+    try:
+        # incremental: upsert into the weekly-partitioned history; rw_parkrun_2 becomes a view of each event's latest run
+        # replace: rw_parkrun_2 is rebuilt with this week's results only
+        # A backfill only adds earlier weeks to the history; past pages always carry their run date
+        loader = BatchLoader(engine, schema=schema, mode=manifest.load_mode, table_name=table_name,
+                             fallback_run_date=None if backfilling else manifest.run_key,
+                             update_latest=not backfilling)
+        for df in batches:
+            with metrics.stage("load"):
+                loader.load(df)
+        print("Data transformation complete.")
+        # Events skipped as unchanged, or still without results, keep the run the dashboard already shows
+        for eventname, run_date in manifest.kept_runs.items():
+            loader.keep_latest(eventname, date.fromisoformat(run_date))
+        with metrics.stage("load"):
+            loader.finish()
+        # Only now are the fingerprinted pages in the database
+        fingerprints = FingerprintStore(in_cache(cache_dir, FINGERPRINTS_FILE))
+        fingerprints.save(manifest.fingerprints)
+        fingerprints.close()
+
+        print(f"{loader.rows_loaded} rows inserted into table {schema}.{table_name} successfully.")
+
+        # Event Insights looks events up by id in the events table
+        with metrics.stage("load"):
+            events_loaded = load_events(manifest.events, engine, schema=schema, weeks=loader.weeks)
+        print(f"{events_loaded} events in table {schema}.{EVENTS_TABLE}.")
+
+        # The trends page reads weekly rollups of the history; only the weeks just loaded are rebuilt
+        if manifest.load_mode == "incremental":
+            with metrics.stage("rollups"):
+                rolled_up = refresh_weekly_rollups(engine, schema=schema, weeks=loader.weeks)
+            print(f"Weekly rollups refreshed for {len(rolled_up)} weeks.")
+
+        # The dashboard reads these instead of grouping the raw results on every page load
+        if not backfilling:
+            with metrics.stage("summaries"):
+                refresh_summaries(engine, schema=schema, source=table_name)
+            print("Summary tables refreshed.")
+
+        # A compact copy of the load, which the dashboard memory-maps instead of querying Postgres
+        if not backfilling:
+            snapshot_path = None
+            if snapshot:
+                try:
+                    with metrics.stage("snapshot"):
+                        snapshot_path = write_snapshot(engine, schema=schema, source=table_name)
+                    print(f"Snapshot written to {snapshot_path}.")
+                except Exception as e:
+                    print(f"Error writing the snapshot: {e}")
+            # The summaries have moved on, so an older snapshot would show last week's
+            if snapshot_path is None and discard_snapshot():
+                print("Previous snapshot discarded; the dashboard will query the database.")
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+    print("Data loading complete.")
+    return loader.rows_loaded if loader else 0
+
+
+def dry_run(batches, metrics, table_name=LATEST_VIEW):
+    """
+    Pull every batch through without writing anything to the database, and
+    report what would have been loaded. Returns the number of rows.
+    """
+    rows, events = 0, set()
+    for df in batches:
+        with metrics.stage("load"):
+            rows += len(df)
+            events.update(df["Event Name"].unique())
+    print(f"Dry run: {rows} rows from {len(events)} events would have been loaded into {table_name}; "
+          "nothing was written to the database.")
+    return rows
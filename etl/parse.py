@@ -0,0 +1,50 @@
+"""
+Parse: results pages into FinisherRecords, either on the thread that
+fetched them or in a pool of worker processes, where parsing is not held to
+one core by the GIL and never holds up a fetch.
+"""
+import time
+
+from etl.pool import ordered_map, process_pool
+from utils.parser import parse_results_records, parse_run_header
+
+QUEUED_PER_PROCESS = 4  # Pages waiting for each parse process; beyond this the fetch is held back
+
+
+class ParseError(Exception):
+    """
+    A results page could not be parsed; the message is the original error.
+    """
+
+
+def parse_event_page(content):
+    run_date, run_number = parse_run_header(content)
+    return {"Run Date": run_date, "Run Number": run_number, "Results": parse_results_records(content)}
+
+
+def timed_parse(content):
+    """
+    Return (parsed page, seconds taken, error), measured where the parsing
+    happens. A page that cannot be parsed gives (None, seconds, the error as
+    text) rather than raising, so one bad page does not stop a pool.
+    """
+    start = time.perf_counter()
+    try:
+        return parse_event_page(content), time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, repr(e)
+
+
+def parse_pages(pages, processes, queued_per_process=QUEUED_PER_PROCESS):
+    """
+    Parse (key, content) pairs in `processes` worker processes, yielding
+    (key, content, parsed page, seconds, error) in the order the pages arrived. The
+    raw bytes go to the workers and come back as FinisherRecords, a few typed
+    arrays rather than a dict per finisher. Only processes * queued_per_process
+    pages wait at once; the rest are not read from pages until there is room.
+    """
+    with process_pool(processes) as pool:
+        jobs = (((key, content), content) for key, content in pages)
+        for (key, content), (event_page, seconds, error) in ordered_map(pool, timed_parse, jobs,
+                                                                        processes * queued_per_process):
+            yield key, content, event_page, seconds, error
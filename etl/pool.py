@@ -0,0 +1,29 @@
+"""
+Process pools for the CPU-bound stages (parse, transform).
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_pool(processes):
+    # Workers are spawned, not forked: the scraper's threads are running when a pool starts
+    return ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+def ordered_map(pool, function, jobs, max_queued):
+    """
+    Run function(argument) in pool for each (key, argument) job, yielding
+    (key, result) in job order. At most max_queued jobs are submitted and not
+    yet collected; until one is collected no more jobs are read, which holds
+    back whatever produces them.
+    """
+    pending = deque()
+    for key, argument in jobs:
+        pending.append((key, pool.submit(function, argument)))
+        if len(pending) >= max_queued:
+            key, future = pending.popleft()
+            yield key, future.result()
+    while pending:
+        key, future = pending.popleft()
+        yield key, future.result()
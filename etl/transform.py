@@ -0,0 +1,24 @@
+"""
+Transform: batches of (event data, event info) pairs into typed DataFrames,
+in this process or spread over a pool of worker processes.
+"""
+from etl.pool import ordered_map, process_pool
+from utils.transform import transform_batch
+
+QUEUED_PER_PROCESS = 2  # Batches waiting for each worker process; more would only hold more memory
+
+
+def transform(batches, processes=1):
+    """
+    Yield a DataFrame for each batch, in order. With processes > 1 the batches
+    are transformed in worker processes while the next ones are extracted,
+    with only a few queued per worker so memory use stays bounded.
+    """
+    if processes <= 1:
+        for batch in batches:
+            yield transform_batch(batch)
+        return
+    with process_pool(processes) as pool:
+        jobs = ((None, batch) for batch in batches)
+        for _, df in ordered_map(pool, transform_batch, jobs, processes * QUEUED_PER_PROCESS):
+            yield df
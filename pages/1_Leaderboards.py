@@ -2,95 +2,56 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import pydeck as pdk
-#from utils.db_connection import get_db_connection 
+from utils.db_connection import get_engine, read_query, show_cache_stats
 import datetime
 import matplotlib.pyplot as plt
-import seaborn as sns
 import re
-from sqlalchemy import create_engine
-
-def get_db_connection():
-    """
-    Establish and return a connection to the PostgreSQL database.
-    """
-    # Define the connection details
-    hostname=st.secrets["DB_HOST"]
-    port=st.secrets["DB_PORT"]
-    database=st.secrets["DB_NAME"]
-    username=st.secrets["DB_USER"]
-    password=st.secrets["DB_PASSWORD"]
-    
-    try:
-        # Create the connection string
-        engine = create_engine(f"postgresql://{username}:{password}@{hostname}:{port}/{database}")
-        connection = engine.connect()
-        print("Database connection successful.")
-        return connection
-    except Exception as e:
-        print(f"Error connecting to the database: {e}")
-        return None
 
 st.title("Leaderboards 🏆")
 tab1, tab2 = st.tabs(["Event Leaderboard", "Individual Leaderboard"])
 
 with st.spinner("Loading results..."):
     # Connect to the database
-    connection = get_db_connection()
+    engine = get_engine()
 
-    if connection:
+    if engine:
+        # Age groups for the filter come from the pre-aggregated breakdown, not the raw results
         query = """
-        SELECT 
-        "Time" AS finish_time,
-        "EventLongName",
-        "Age Group",
-        "Runs"
-        FROM student.rw_parkrun_2
-        ORDER BY finish_time ASC;
+        SELECT "Age Group"
+        FROM student.rw_parkrun_age_summary
+        WHERE "Age Group" IS NOT NULL;
         """
         try:
-            leaderboard_df = pd.read_sql(query, connection)
+            age_group_df = read_query(query)
         except Exception as e:
             st.error(f"Error fetching data: {e}")
+        # Per-event stats are pre-aggregated by the ETL (utils/summaries.py)
         query = """
         SELECT 
         "EventLongName", 
-        COUNT("Position") AS participant_count,
-        AVG("Time") AS avg_finish_time,
-        ROUND(AVG("Runs"),1) AS avg_num_of_runs,
-        COUNT(CASE WHEN "Achievement" = 'New PB!' THEN 1 END) AS pb_count,
-        ROUND((COUNT(CASE WHEN "Achievement" = 'New PB!' THEN 1 END) * 100.0 / COUNT("Position")),1) AS percent_pb,
-        COUNT(CASE WHEN "Achievement" = 'First Timer!' THEN 1 END) AS first_time_count,
-        ROUND((COUNT(CASE WHEN "Achievement" = 'First Timer!' THEN 1 END) * 100.0 / COUNT('First Timer!')),1) AS first_time_percent
-        FROM student.rw_parkrun_2
-        GROUP BY "EventLongName"
+        participant_count,
+        avg_finish_time,
+        avg_num_of_runs,
+        pb_count,
+        percent_pb,
+        first_time_count,
+        first_time_percent
+        FROM student.rw_parkrun_event_summary
         ORDER BY participant_count DESC;
         """
         try:
-            event_df = pd.read_sql(query, connection)
+            event_df = read_query(query)
         except Exception as e:
             st.error(f"Error fetching data: {e}")
     else:
         st.error("Could not connect to the database.")    
         
 
-    leaderboard_df["finish_time"] = pd.to_timedelta(leaderboard_df["finish_time"])
-    leaderboard_df["finish_time"] = leaderboard_df["finish_time"].apply(
-        lambda x: f"{int(x.total_seconds() // 3600):02}:{int((x.total_seconds() % 3600) // 60):02}:{int(x.total_seconds() % 60):02}"
-    )
     event_df["avg_finish_time"] = pd.to_timedelta(event_df["avg_finish_time"])
     event_df["avg_finish_time"] = event_df["avg_finish_time"].apply(
         lambda x: f"{int(x.total_seconds() // 3600):02}:{int((x.total_seconds() % 3600) // 60):02}:{int(x.total_seconds() % 60):02}"
     )
 
-    leaderboard_df.index += 1
-    leaderboard_df.index.name = "Overall Position"
-    leaderboard_df = leaderboard_df.reset_index()
-    leaderboard_df = leaderboard_df.rename(columns={
-        'EventLongName': 'Location',
-        'finish_time': 'Finish Time',
-        'runs':'Number of Runs'
-    })
-
     # Filter and rename columns
     filtered_event_df = event_df[['EventLongName', 'participant_count', 'avg_finish_time', 'percent_pb', 'first_time_percent','avg_num_of_runs']]
     filtered_event_df = filtered_event_df.rename(columns={
@@ -108,6 +69,54 @@ with st.spinner("Loading results..."):
             return (int(match.group(2)), match.group(1))  # First number as integer, then letter prefix
         return (float('inf'), "")  # In case of an invalid format, put it at the end
 
+    LEADERBOARD_PAGE_SIZE = 100
+
+    def leaderboard_query(age_group, after):
+        """
+        Query and parameters for one page of the individual leaderboard, fastest first.
+        after is the (seconds, event name, position) of the last row on the previous
+        page, so each page is an index range scan rather than an OFFSET.
+        """
+        conditions, params = ['"Time" IS NOT NULL'], []
+        if age_group:
+            conditions.append('"Age Group" = %s')
+            params.append(age_group)
+        if after:
+            conditions.append('("Time", "Event Name", "Position") > (%s * interval \'1 second\', %s, %s)')
+            params.extend(after)
+        query = f"""
+        SELECT 
+        to_char("Time", 'HH24:MI:SS') AS "Finish Time",
+        "EventLongName" AS "Location",
+        "Age Group",
+        "Runs",
+        EXTRACT(EPOCH FROM "Time") AS time_seconds,
+        "Event Name",
+        "Position"
+        FROM student.rw_parkrun_2
+        WHERE {" AND ".join(conditions)}
+        ORDER BY "Time", "Event Name", "Position"
+        LIMIT {LEADERBOARD_PAGE_SIZE};
+        """
+        return query, tuple(params)
+
+    def histogram_query(age_group):
+        """
+        Query and parameters for finishers per whole minute (0-80), summed from the
+        national distribution of the latest runs the ETL stores.
+        """
+        condition = "breakdown = 'age_group' AND category = %s" if age_group else "breakdown = 'all'"
+        query = f"""
+        SELECT 
+        floor(minute)::int AS bucket,
+        SUM(finishers) AS finishers
+        FROM student.rw_parkrun_latest_distribution
+        WHERE {condition}
+        GROUP BY bucket
+        ORDER BY bucket;
+        """
+        return query, (age_group,) if age_group else ()
+
     with tab1:
         st.header("Event Leaderboard")
         # Sorting popover
@@ -145,27 +154,45 @@ with st.spinner("Loading results..."):
     with tab2:
         
         # Add a dropdown to filter by Age Group
-        st.header("Individual Leaderboard (Top 100)")
+        st.header("Individual Leaderboard")
         age_group_filter = st.selectbox(
             "Filter By Age Group:",
-            options=["All"] + sorted(leaderboard_df["Age Group"].unique().tolist(), key=extract_first_number_and_letter),
+            options=["All"] + sorted(age_group_df["Age Group"].tolist(), key=extract_first_number_and_letter),
             index=0,
         )
-        # Filter the DataFrame based on the selected Age Group
-        if age_group_filter != "All":
-            filtered_df = leaderboard_df[leaderboard_df["Age Group"] == age_group_filter]
-        else:
-            filtered_df = leaderboard_df 
-        st.dataframe(filtered_df.head(100), use_container_width=True, hide_index=True)
+        age_group = None if age_group_filter == "All" else age_group_filter
+
+        # Keyset pagination: remember where each page viewed so far starts, back to the first
+        if st.session_state.get("leaderboard_filter") != age_group_filter:
+            st.session_state["leaderboard_filter"] = age_group_filter
+            st.session_state["leaderboard_pages"] = [None]
+        pages = st.session_state["leaderboard_pages"]
+        try:
+            page_df = read_query(*leaderboard_query(age_group, pages[-1]))
+        except Exception as e:
+            st.error(f"Error fetching data: {e}")
+            page_df = pd.DataFrame(columns=["Finish Time", "Location", "Age Group", "Runs", "time_seconds", "Event Name", "Position"])
+
+        position_label = "Overall Position" if age_group is None else "Age Group Position"
+        first_position = (len(pages) - 1) * LEADERBOARD_PAGE_SIZE + 1
+        page_df.insert(0, position_label, range(first_position, first_position + len(page_df)))
+        st.dataframe(page_df[[position_label, "Finish Time", "Location", "Age Group", "Runs"]],
+                     use_container_width=True, hide_index=True)
+
+        previous_col, next_col = st.columns(2)
+        if previous_col.button(f"Previous {LEADERBOARD_PAGE_SIZE}", disabled=len(pages) == 1):
+            pages.pop()
+            st.rerun()
+        if next_col.button(f"Next {LEADERBOARD_PAGE_SIZE}", disabled=len(page_df) < LEADERBOARD_PAGE_SIZE):
+            last = page_df.iloc[-1]
+            pages.append((float(last["time_seconds"]), last["Event Name"], int(last["Position"])))
+            st.rerun()
 
         with st.expander(label="Show Distribution Plot"):
-            # Convert the "finish_time" column to timedelta
-            filtered_df["Finish Time"] = pd.to_timedelta(filtered_df["Finish Time"])
-            # Now convert to seconds and then to minutes
-            filtered_df["finish_time_minutes"] = filtered_df["Finish Time"].dt.total_seconds() / 60
-            # Matplotlib Seaborn Plot
-            plt.figure(figsize=(3, 3))
-            sns.displot(filtered_df["finish_time_minutes"], color="orange", kind="hist", fill="true", height=2, aspect=2)
+            # Finishers per minute come from the precomputed distribution; only the bars are read
+            histogram_df = read_query(*histogram_query(age_group))
+            plt.figure(figsize=(4, 2))
+            plt.bar(histogram_df["bucket"], histogram_df["finishers"], width=1, align="edge", color="orange")
             # Customizing the plot
             plt.title("Distribution of Finish Times (in Minutes)", fontsize=16)
             plt.xlabel("Finish Time (Minutes)", fontsize=12)
@@ -174,3 +201,6 @@ with st.spinner("Loading results..."):
             plt.xlim(right=80)
             plt.xticks([0, 10, 20, 30,40,50,60,70,80])
             st.pyplot(plt, use_container_width=False)
+
+# Cache hit rate and query latency, shown last so they include this run
+show_cache_stats()
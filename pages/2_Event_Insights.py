@@ -2,50 +2,29 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import pydeck as pdk
-#from utils.db_connection import get_db_connection
+from utils.db_connection import current_snapshot, get_engine, read_query, show_cache_stats
+from utils.distribution import BIN_SECONDS, LOCAL_BW_ADJUST, bin_counts, bin_minutes, smooth_density
+from utils.snapshot import event_results
 import matplotlib.pyplot as plt
-import seaborn as sns
 import plotly.express as px
-from sqlalchemy import create_engine
-
-def get_db_connection():
-    """
-    Establish and return a connection to the PostgreSQL database.
-    """
-    # Define the connection details
-    hostname=st.secrets["DB_HOST"]
-    port=st.secrets["DB_PORT"]
-    database=st.secrets["DB_NAME"]
-    username=st.secrets["DB_USER"]
-    password=st.secrets["DB_PASSWORD"]
-    
-    
-    try:
-        # Create the connection string
-        engine = create_engine(f"postgresql://{username}:{password}@{hostname}:{port}/{database}")
-        connection = engine.connect()
-        print("Database connection successful.")
-        return connection
-    except Exception as e:
-        print(f"Error connecting to the database: {e}")
-        return None
 
 # Connect to the database
-connection = get_db_connection()
+engine = get_engine()
 
-if connection:
+if engine:
+    # Per-event stats are pre-aggregated by the ETL (utils/summaries.py)
     event_query = """
     SELECT 
+    "Event ID",
     "EventLongName", 
-    COUNT("Position") AS participant_count,
-    AVG("Time") AS avg_finish_time,
-    ROUND(AVG("Runs"),1) AS avg_num_of_runs
-    FROM student.rw_parkrun_2
-    GROUP BY "EventLongName"
+    participant_count,
+    avg_finish_time,
+    avg_num_of_runs
+    FROM student.rw_parkrun_event_summary
     ORDER BY "EventLongName" ASC;
     """
     try:
-        event_df = pd.read_sql(event_query, connection)
+        event_df = read_query(event_query)
     except Exception as e:
         st.error(f"Error fetching data: {e}")
 else:
@@ -79,24 +58,38 @@ def recategorize_age_group(age_group):
 
 st.title("Event Insights 📊")
 
-selected_location = st.selectbox("Select a :orange[Parkrun] from the list:", filtered_event_df["Location"].tolist(), index=None, placeholder="Select Parkrun",)
+# Events are picked by id, so the results are read with an exact, indexed match
+event_names = dict(zip(filtered_event_df["Event ID"].tolist(), filtered_event_df["Location"].tolist()))
+selected_event_id = st.selectbox("Select a :orange[Parkrun] from the list:", list(event_names), format_func=event_names.get, index=None, placeholder="Select Parkrun",)
+selected_location = event_names.get(selected_event_id)
 
 # Insights
 tab1, tab2 = st.tabs(["Pace Comparison", "Demographics"])
 # st.dataframe(filtered_event_df, use_container_width=True, hide_index=True)
 
 if selected_location:
-    if connection:
-        query = """
-        SELECT 
-        "Time" AS finish_time,
-        "EventLongName",
-        "Age Group"
-        FROM student.rw_parkrun_2
-        ORDER BY finish_time ASC;
+    if engine:
+        # National figures come from the summary tables, built once per load
+        headline_query = """
+        SELECT total_participants, avg_finish_time
+        FROM student.rw_parkrun_headline;
+        """
+        national_age_query = """
+        SELECT "Age Group", count, timed_count, avg_finish_time
+        FROM student.rw_parkrun_age_summary
+        WHERE "Age Group" IS NOT NULL;
+        """
+        # The national curve is binned and smoothed by the ETL; only its few hundred points are read
+        national_density_query = """
+        SELECT minute, density
+        FROM student.rw_parkrun_latest_distribution
+        WHERE breakdown = 'all'
+        ORDER BY minute;
         """
         try:
-            national_df = pd.read_sql(query, connection)
+            headline_df = read_query(headline_query)
+            national_age_df = read_query(national_age_query)
+            national_density_df = read_query(national_density_query)
         except Exception as e:
             st.error(f"Error fetching data: {e}")
         selected_parkrun_query = """
@@ -105,14 +98,18 @@ if selected_location:
         "Age Group",
         "EventLongName"
         FROM student.rw_parkrun_2
-        WHERE "EventLongName" LIKE %s
+        WHERE "Event ID" = %s
         ORDER BY finish_time ASC;
         """
         try:
-            # Ensure the selected_parkrun variable is defined
-            selection_sql = f"%{selected_location}%"
-            # Fetch the data with the parameterized query
-            selected_parkrun_df = pd.read_sql(selected_parkrun_query, connection, params=(selection_sql,))
+            snapshot = current_snapshot()
+            if snapshot:
+                # Filtered from the memory-mapped snapshot rather than queried
+                selected_parkrun_df = event_results(snapshot, int(selected_event_id))
+                selected_parkrun_df["finish_time"] = pd.to_timedelta(selected_parkrun_df["time_seconds"], unit="s")
+            else:
+                # Fetch the data with the parameterized query
+                selected_parkrun_df = read_query(selected_parkrun_query, params=(int(selected_event_id),))
         except Exception as e:
             st.error(f"Error fetching data: {e}")
     else:
@@ -121,12 +118,11 @@ if selected_location:
 
     with tab1:
         # Convert the "finish_time" column to timedelta
-        national_df["finish_time"] = pd.to_timedelta(national_df["finish_time"])
         selected_parkrun_df["finish_time"] = pd.to_timedelta(selected_parkrun_df["finish_time"])
         
         selected_parkrun = str(selected_location)
         avg_finish_time = selected_parkrun_df["finish_time"].mean()
-        national_avg = national_df["finish_time"].mean()
+        national_avg = pd.to_timedelta(headline_df["avg_finish_time"].iloc[0])
         diff = national_avg - avg_finish_time
         # Convert timedelta to total seconds
         avg_finish_time_seconds = avg_finish_time.total_seconds()
@@ -147,13 +143,16 @@ if selected_location:
         finishers_text = f"- There were :orange-background[{selected_completions}] finishers this week, :orange-background[{abs(diff_comps)}] {more_less} than the national parkrun average."
         st.markdown(finishers_text)
         
-        # Now convert to seconds and then to minutes
-        national_df["finish_time_minutes"] = national_df["finish_time"].dt.total_seconds() / 60
-        selected_parkrun_df["finish_time_minutes"] = selected_parkrun_df["finish_time"].dt.total_seconds() / 60
+        # The event's curve is smoothed from its own few hundred times, on the same bins as the national one
+        local_density = smooth_density(bin_counts(selected_parkrun_df["finish_time"].dt.total_seconds()), LOCAL_BW_ADJUST)
+        bin_centres = bin_minutes() + BIN_SECONDS / 120
+        national_centres = national_density_df["minute"] + BIN_SECONDS / 120
         
         plt.figure(figsize=(6, 3))  # Adjust the figure size for both datasets
-        sns.kdeplot(national_df["finish_time_minutes"], color="orange",bw_adjust=.2, fill=True, label="National Average")
-        sns.kdeplot(selected_parkrun_df["finish_time_minutes"], color="red",bw_adjust=.4, fill=True, label=selected_location)
+        plt.plot(national_centres, national_density_df["density"], color="orange", label="National Average")
+        plt.fill_between(national_centres, national_density_df["density"], color="orange", alpha=0.25)
+        plt.plot(bin_centres, local_density, color="red", label=selected_location)
+        plt.fill_between(bin_centres, local_density, color="red", alpha=0.25)
         # Customizing the plot
         plt.title("Distribution of Finish Times (in Minutes)", fontsize=16)
         plt.xlabel("Finish Time (Minutes)", fontsize=12)
@@ -168,18 +167,17 @@ if selected_location:
     with tab2:
         # Display demographic info
         # Get Age group data for selected parkrun
-        national_df["New Age Group"] = national_df['Age Group'].apply(recategorize_age_group)
-        total_count = len(national_df)
-        age_group_summary_uk = national_df["New Age Group"].value_counts().reset_index()
-        age_group_summary_uk.columns = ["New Age Group", 'Count UK']
-        age_group_summary_uk['National'] = (age_group_summary_uk['Count UK'] / total_count) 
-        
-        # Calculate average finish_time for each New Age Group
-        avg_finish_time_uk = national_df.groupby("New Age Group")["finish_time"].mean().reset_index()
-        avg_finish_time_uk.columns = ["New Age Group", "National Average"]
-
-        # Merge the average finish time into the summary dataframe
-        age_group_summary_uk = pd.merge(age_group_summary_uk, avg_finish_time_uk, on="New Age Group", how="left")
+        # National age groups are combined from the per-age-group summary, weighting averages by finishers
+        national_age_df["New Age Group"] = national_age_df['Age Group'].apply(recategorize_age_group)
+        national_age_df["total_seconds"] = pd.to_timedelta(national_age_df["avg_finish_time"]).dt.total_seconds() * national_age_df["timed_count"]
+        age_group_summary_uk = national_age_df.groupby("New Age Group")[["count", "timed_count", "total_seconds"]].sum().reset_index()
+        total_count = int(headline_df["total_participants"].iloc[0])
+        age_group_summary_uk['National'] = (age_group_summary_uk['count'] / total_count)
+        age_group_summary_uk["National Average"] = pd.to_timedelta(
+            age_group_summary_uk["total_seconds"] / age_group_summary_uk["timed_count"], unit="s"
+        )
+        age_group_summary_uk = age_group_summary_uk[["New Age Group", "count", "National", "National Average"]]
+        age_group_summary_uk.columns = ["New Age Group", 'Count UK', 'National', 'National Average']
         
         selected_parkrun_df["New Age Group"] = selected_parkrun_df['Age Group'].apply(recategorize_age_group)
         total_count = len(selected_parkrun_df)
@@ -265,4 +263,7 @@ if selected_location:
     #with tab1:
         #st.info("Please select a Parkrun above.", icon="ℹ️")
     #with tab2:
-        #st.info("Please select a Parkrun above.", icon="ℹ️")
\ No newline at end of file
+        #st.info("Please select a Parkrun above.", icon="ℹ️")
+
+# Cache hit rate and query latency, shown last so they include this run
+show_cache_stats()
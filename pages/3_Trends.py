@@ -0,0 +1,96 @@
+import streamlit as st
+import pandas as pd
+from utils.db_connection import get_engine, read_query, show_cache_stats
+import plotly.express as px
+
+ROLLING_WEEKS = [4, 8, 12]
+
+st.title("Trends 📈")
+
+# Connect to the database
+engine = get_engine()
+
+weekly_df = pd.DataFrame()
+events_df = pd.DataFrame()
+if engine:
+    # One row per week, rolled up by the ETL (utils/summaries.py), so this stays small however long the history gets
+    weekly_query = """
+    SELECT
+    week,
+    events,
+    finishers,
+    total_seconds / NULLIF(timed_finishers, 0) AS avg_seconds
+    FROM student.rw_parkrun_weekly
+    ORDER BY week;
+    """
+    events_query = """
+    SELECT "Event ID", "EventLongName"
+    FROM student.rw_parkrun_events
+    ORDER BY "EventLongName";
+    """
+    try:
+        weekly_df = read_query(weekly_query)
+        events_df = read_query(events_query)
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+else:
+    st.error("Could not connect to the database.")
+
+if weekly_df.empty:
+    st.info("No weekly history yet: trends appear once runETL.py has loaded results incrementally.")
+    st.stop()
+
+rolling_weeks = st.radio("Rolling average over", ROLLING_WEEKS, index=1, horizontal=True,
+                         format_func=lambda weeks: f"{weeks} weeks")
+
+st.markdown("### :orange[National] attendance")
+weekly_df["Rolling average"] = weekly_df["finishers"].rolling(rolling_weeks, min_periods=1).mean()
+fig = px.line(weekly_df, x="week", y=["finishers", "Rolling average"],
+              labels={"week": "Week", "value": "Finishers", "variable": ""})
+st.plotly_chart(fig)
+col1, col2 = st.columns(2)
+col1.metric("Events last week", f"{weekly_df['events'].iloc[-1]:,}")
+col2.metric("Weeks of history", f"{len(weekly_df):,}")
+
+st.markdown("### Attendance at a :orange[Parkrun]")
+event_names = dict(zip(events_df["Event ID"], events_df["EventLongName"]))
+selected_event_id = st.selectbox("Select a :orange[Parkrun] from the list:", list(event_names),
+                                 format_func=event_names.get, index=None, placeholder="Select Parkrun")
+
+if selected_event_id is not None:
+    # Served by the rollup's (Event ID, week) index: one row per run of the event
+    event_query = """
+    SELECT
+    "Run Date",
+    "Run Number",
+    finishers,
+    total_seconds / NULLIF(timed_finishers, 0) AS avg_seconds,
+    pb_count,
+    first_timer_count
+    FROM student.rw_parkrun_event_weekly
+    WHERE "Event ID" = %s
+    ORDER BY week;
+    """
+    try:
+        event_weekly_df = read_query(event_query, (int(selected_event_id),))
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+        event_weekly_df = pd.DataFrame()
+
+    if event_weekly_df.empty:
+        st.info("No runs of this event in the history yet.")
+    else:
+        event_weekly_df["Rolling average"] = event_weekly_df["finishers"].rolling(rolling_weeks, min_periods=1).mean()
+        fig = px.line(event_weekly_df, x="Run Date", y=["finishers", "Rolling average"],
+                      labels={"value": "Finishers", "variable": ""}, hover_data=["Run Number"])
+        st.plotly_chart(fig)
+
+        event_weekly_df["Average time (min)"] = event_weekly_df["avg_seconds"] / 60
+        event_weekly_df["Rolling average time (min)"] = (
+            event_weekly_df["Average time (min)"].rolling(rolling_weeks, min_periods=1).mean()
+        )
+        fig = px.line(event_weekly_df, x="Run Date", y=["Average time (min)", "Rolling average time (min)"],
+                      labels={"value": "Minutes", "variable": ""})
+        st.plotly_chart(fig)
+
+show_cache_stats()
@@ -14,7 +14,7 @@ st.divider()
 st.markdown('''
             ## Project Scope
 
-- Each week, obtain only the ***most recent*** parkrun results for each location.
+- Each week, obtain the ***most recent*** parkrun results for each location, kept in a weekly history for trends.
 - Only obtain data for Parkrun events within the ***U.K***. 
 
 ''')
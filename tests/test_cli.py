@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from benchmarks.fixtures import make_events_json, make_results_page
+from etl import cli
+from etl.batches import batch_dir, read_manifest
+from etl.parse import parse_event_page
+from utils.checkpoint import CHECKPOINT_FILE, Checkpoint
+from utils.events import results_url, select_events
+from utils.page_store import PageStore
+
+RUN_KEY = "2024-10-19"
+
+
+@pytest.fixture
+def offline_cache(tmp_path, monkeypatch):
+    """
+    A cache directory holding a checkpointed week of three events, with no
+    database credentials anywhere.
+    """
+    for name in ["DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD"]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.chdir(tmp_path)  # No .env file to find
+
+    def no_database():
+        raise AssertionError("The database was asked for")
+
+    monkeypatch.setattr(cli, "database_engine", no_database)
+
+    cache_dir = str(tmp_path / "cache")
+    events = select_events(json.loads(make_events_json(3)))
+    checkpoint = Checkpoint(os.path.join(cache_dir, os.path.basename(CHECKPOINT_FILE)), run_key=RUN_KEY,
+                            page_store=PageStore(os.path.join(cache_dir, "pages")))
+    checkpoint.save_events(events)
+    for number, event in enumerate(events, start=1):
+        content = make_results_page(event["eventname"], 10 * number, seed=number)
+        checkpoint.save_event(event["eventname"], results_url(event), content, parse_event_page(content))
+    checkpoint.close()
+    return cache_dir
+
+
+def test_replayed_dry_run_needs_no_database(offline_cache, capsys):
+    cli.main(["run", "--replay", "--dry-run", "--run-key", RUN_KEY, "--cache-dir", offline_cache])
+
+    assert "from 3 events would have been loaded" in capsys.readouterr().out
+
+
+def test_replayed_extract_needs_no_database(offline_cache, capsys):
+    for command in [["extract", "--replay"], ["transform"], ["load", "--dry-run"]]:
+        cli.main(command + ["--run-key", RUN_KEY, "--cache-dir", offline_cache])
+
+    manifest = read_manifest(batch_dir(offline_cache, RUN_KEY))
+    assert [event["eventname"] for event in manifest.events] == ["event1", "event2", "event3"]
+    assert "from 3 events would have been loaded" in capsys.readouterr().out
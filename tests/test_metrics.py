@@ -0,0 +1,40 @@
+import cProfile
+import threading
+
+from utils import metrics
+from utils.metrics import Profiler
+
+
+def handler(n):
+    return sum(i * i for i in range(n))
+
+
+def profile_workers(profiler):
+    profiler.start()
+    wrapped = profiler.wrap(handler)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(wrapped(10_000))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    profiler.stop()
+    assert results == [handler(10_000)] * 4
+
+
+def test_workers_are_profiled(tmp_path, capsys):
+    profile_workers(Profiler(str(tmp_path / "run.prof")))
+    assert "handler" in capsys.readouterr().out
+
+
+def test_workers_run_when_a_second_profiler_cannot_start(tmp_path, monkeypatch):
+    # As on Python 3.12+, where only one profiler can be active at a time
+    profiler = Profiler(str(tmp_path / "run.prof"))
+
+    class SecondProfile(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(metrics.cProfile, "Profile", SecondProfile)
+    profile_workers(profiler)
+    assert profiler._shared
@@ -0,0 +1,27 @@
+import os
+import threading
+
+from utils.page_store import PageStore
+
+
+def test_threads_can_store_the_same_page_at_once(tmp_path):
+    content = os.urandom(500_000)
+    errors = []
+
+    def put(store, start):
+        start.wait()
+        try:
+            assert store.get(store.put(content)) == content
+        except Exception as e:
+            errors.append(e)
+
+    # A fresh store each round, so every thread finds the page missing and writes it
+    for round in range(10):
+        store, start = PageStore(str(tmp_path / str(round))), threading.Barrier(8)
+        threads = [threading.Thread(target=put, args=(store, start)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
@@ -0,0 +1,30 @@
+import pytest
+
+from benchmarks.fixtures import make_results_page
+from utils.parser import PARSER_BACKENDS, parse_results
+
+PAGE = make_results_page("event1", 3, seed=1)
+DEGENERATE_PAGES = {
+    "whitespace": b"   \n\t ",
+    "comment": b"<!-- no results -->",
+    "doctype": b"<!DOCTYPE html>",
+    "processing instruction": b"<?php ?>",
+    "plain text": b"Service unavailable",
+    "nul bytes": b"\x00\x00",
+    "not utf-8": b"\xff\xfe<html>\x93</html>",
+    "no results table": b"<html><body><p>No results yet</p></body></html>",
+}
+
+
+@pytest.mark.parametrize("backend", PARSER_BACKENDS)
+@pytest.mark.parametrize("content", DEGENERATE_PAGES.values(), ids=DEGENERATE_PAGES.keys())
+def test_degenerate_pages_have_no_rows(backend, content):
+    assert parse_results(content, backend) == []
+
+
+@pytest.mark.parametrize("backend", PARSER_BACKENDS)
+def test_xml_declaration_does_not_hide_the_rows(backend):
+    for declared in [b'<?xml version="1.0" encoding="utf-8"?>\n' + PAGE,
+                     b'\xef\xbb\xbf<?xml version="1.0" encoding="utf-8"?>' + PAGE]:
+        assert parse_results(declared, backend) == parse_results(PAGE, "bs4")
+        assert len(parse_results(declared, backend)) == 3
@@ -0,0 +1,69 @@
+from utils import scraper
+from utils.scraper import TokenBucket
+
+
+class FakeClock:
+    """
+    Stands in for the time module in utils.scraper: sleeping just moves the clock on.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_pause_is_not_cut_short_by_a_slow_failing_request(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scraper, "time", clock)
+    bucket = TokenBucket(rate=1, capacity=1)
+
+    assert bucket.acquire() == 0
+    clock.sleep(5)  # The request takes 5s and fails
+    bucket.pause(4)
+    # The whole pause, plus the usual second between requests
+    assert bucket.acquire() == 5
+
+
+def test_set_rate_credits_earlier_time_at_the_old_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scraper, "time", clock)
+    bucket = TokenBucket(rate=0.1, capacity=1)
+
+    assert bucket.acquire() == 0
+    clock.sleep(5)  # Half a token at the old rate
+    bucket.set_rate(1)
+    assert bucket.acquire() == 0.5
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, url):
+        self.content = url.encode("utf-8")
+
+
+class FakeSession:
+    def get(self, url, headers=None, timeout=None):
+        return FakeResponse(url)
+
+
+def test_a_failing_handler_skips_only_its_own_job():
+    def handler(key, response):
+        if key == 2:
+            raise ValueError("odd page")
+        return response.content
+
+    engine = scraper.ScraperEngine(rate=1000, burst=10, session=FakeSession())
+    results = dict(engine.run(((key, f"http://standin/{key}") for key in range(5)), handler))
+
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert isinstance(results[2], scraper.HandlerFailed)
+    assert isinstance(results[2].error, ValueError)
+    assert results[2].response.content == b"http://standin/2"
+    assert results[4] == b"http://standin/4"
+    assert engine.handler_errors == 1
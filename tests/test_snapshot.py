@@ -0,0 +1,30 @@
+from utils.snapshot import LATEST_FILE, RESULTS_TABLE, discard_snapshot, latest_snapshot, prune_snapshots
+
+
+def make_snapshot(directory, name):
+    path = directory / name
+    path.mkdir()
+    (path / f"{RESULTS_TABLE}.arrow").write_bytes(b"")
+    return path
+
+
+def test_prune_keeps_the_newest_and_previous_snapshots(tmp_path):
+    for name in ["2024-09-30", "2024-10-07", "2024-10-14"]:
+        make_snapshot(tmp_path, name)
+    (tmp_path / "2024-10-21.tmp").mkdir()  # Left half built by a crashed run
+    (tmp_path / "notes").mkdir()  # Not a snapshot
+    (tmp_path / LATEST_FILE).write_text("2024-10-14")
+
+    assert prune_snapshots(str(tmp_path), keep=["2024-10-14", "2024-10-07"]) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["2024-10-07", "2024-10-14", LATEST_FILE, "notes"]
+    assert latest_snapshot(str(tmp_path)) == str(tmp_path / "2024-10-14")
+
+
+def test_discard_snapshot_removes_latest_only(tmp_path):
+    make_snapshot(tmp_path, "2024-10-14")
+    (tmp_path / LATEST_FILE).write_text("2024-10-14")
+
+    assert discard_snapshot(str(tmp_path))
+    assert latest_snapshot(str(tmp_path)) is None
+    assert (tmp_path / "2024-10-14").is_dir()
+    assert not discard_snapshot(str(tmp_path))
@@ -0,0 +1,53 @@
+from sqlalchemy import text
+
+from utils.events import past_results_url
+from utils.loader import HISTORY_TABLE, SCHEMA_NAME, table_kind
+
+BACKFILL_RUN_KEY = "backfill"  # Checkpoint of the backfill, kept apart from the weekly runs
+BACKFILL_KEY_SEPARATOR = "/"  # Checkpoint keys are "eventname/run number"; event names never contain "/"
+
+
+def stored_runs(engine, schema=SCHEMA_NAME):
+    """
+    Return {Event Name: set of Run Numbers} already in the history.
+    """
+    with engine.connect() as connection:
+        if table_kind(connection, schema, HISTORY_TABLE) != "p":
+            return {}
+        rows = connection.execute(text(
+            f"""SELECT DISTINCT "Event Name", "Run Number" FROM {schema}.{HISTORY_TABLE} WHERE "Run Number" IS NOT NULL"""
+        ))
+        runs = {}
+        for eventname, run_number in rows:
+            runs.setdefault(eventname, set()).add(run_number)
+    return runs
+
+
+def backfill_key(eventname, run_number):
+    return f"{eventname}{BACKFILL_KEY_SEPARATOR}{run_number}"
+
+
+def backfill_event_name(event_key):
+    return event_key.rsplit(BACKFILL_KEY_SEPARATOR, 1)[0]
+
+
+def backfill_jobs(parkruns, stored, runs, done=()):
+    """
+    Yield (parkrun_id, event key, results URL) for the past runs to fetch: the
+    runs runs before each event's latest stored run that are not stored (or
+    checkpointed in done) yet. Events with nothing stored are skipped, as
+    their latest run number is unknown. Jobs go a week at a time across every
+    event, so an interrupted backfill leaves whole recent weeks behind it.
+    """
+    latest = {eventname: max(numbers) for eventname, numbers in stored.items() if numbers}
+    for offset in range(1, runs + 1):
+        for parkrun_id, event in enumerate(parkruns):
+            eventname = event["eventname"]
+            if eventname not in latest:
+                continue
+            run_number = latest[eventname] - offset
+            if run_number < 1 or run_number in stored[eventname]:
+                continue
+            key = backfill_key(eventname, run_number)
+            if key not in done:
+                yield parkrun_id, key, past_results_url(event, run_number)
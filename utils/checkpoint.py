@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+
+from utils.page_store import CACHE_DIR, PageStore
+from utils.records import json_default, json_object_hook
+
+CHECKPOINT_FILE = os.path.join(CACHE_DIR, "checkpoint.sqlite")
+
+
+def current_run_key(today=None):
+    """
+    Key for this week's run: the date of the most recent Saturday, when the
+    latest results pages change.
+    """
+    today = today or date.today()
+    return (today - timedelta(days=(today.weekday() - 5) % 7)).isoformat()
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, default=json_default).encode("utf-8"))
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"), object_hook=json_object_hook)
+
+
+class Checkpoint:
+    """
+    SQLite record of an extraction run. The event list and every fetched
+    event (raw page digest plus what was parsed from it) are written as they
+    arrive, so a restarted run only fetches what is missing, and a finished
+    run can be re-parsed from the page store without touching the network.
+    """
+
+    def __init__(self, path=CHECKPOINT_FILE, run_key=None, page_store=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.run_key = run_key or current_run_key()
+        self.page_store = page_store or PageStore()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    run_key TEXT PRIMARY KEY,
+                    events BLOB NOT NULL,
+                    started_at TEXT NOT NULL
+                )"""
+            )
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS events (
+                    run_key TEXT NOT NULL,
+                    event_key TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    page_digest TEXT NOT NULL,
+                    parsed BLOB NOT NULL,
+                    fetched_at TEXT NOT NULL,
+                    PRIMARY KEY (run_key, event_key)
+                )"""
+            )
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS failures (
+                    run_key TEXT NOT NULL,
+                    event_key TEXT NOT NULL,
+                    url TEXT,
+                    page_digest TEXT,
+                    error TEXT NOT NULL,
+                    failed_at TEXT NOT NULL,
+                    PRIMARY KEY (run_key, event_key)
+                )"""
+            )
+
+    def save_events(self, events):
+        """
+        Store the list of events to fetch for this run.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                (self.run_key, _pack(events), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def load_events(self):
+        """
+        Return the event list stored for this run, or None.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT events FROM runs WHERE run_key = ?", (self.run_key,)).fetchone()
+        return _unpack(row[0]) if row else None
+
+    def save_event(self, event_key, url, content, parsed):
+        """
+        Record a fetched event: the raw page goes to the page store, the parsed
+        (JSON-serialisable) data to SQLite.
+        """
+        digest = self.page_store.put(content or b"")
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                (self.run_key, event_key, url, digest, _pack(parsed), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def save_failure(self, event_key, url, content, error):
+        """
+        Record an event whose page could not be handled, so a resumed run
+        skips it instead of failing on it again. The page, if there was one,
+        is kept in the page store for a look at what went wrong.
+        """
+        digest = self.page_store.put(content) if content else None
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?, ?)",
+                (self.run_key, event_key, url, digest, str(error), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def failed_keys(self):
+        """
+        Return the set of event keys whose pages could not be handled in this run.
+        """
+        with self._lock:
+            cursor = self._connection.execute("SELECT event_key FROM failures WHERE run_key = ?", (self.run_key,))
+            return {event_key for event_key, in cursor}
+
+    def completed_keys(self):
+        """
+        Return the set of event keys already fetched in this run.
+        """
+        with self._lock:
+            cursor = self._connection.execute("SELECT event_key FROM events WHERE run_key = ?", (self.run_key,))
+            return {event_key for event_key, in cursor}
+
+    def _stored(self, column):
+        # (event_key, column) for each fetched event, read one at a time so only one is in memory
+        for event_key in sorted(self.completed_keys()):
+            with self._lock:
+                row = self._connection.execute(
+                    f"SELECT {column} FROM events WHERE run_key = ? AND event_key = ?", (self.run_key, event_key)
+                ).fetchone()
+            if row:
+                yield event_key, row[0]
+
+    def completed_events(self):
+        """
+        Yield (event_key, parsed data) for every event already fetched in this run.
+        """
+        for event_key, parsed in self._stored("parsed"):
+            yield event_key, _unpack(parsed)
+
+    def stored_pages(self):
+        """
+        Yield (event_key, raw page) for every stored page of this run; pages
+        missing from the page store are skipped.
+        """
+        for event_key, digest in self._stored("page_digest"):
+            content = self.page_store.get(digest)
+            if content is None:
+                print(f"Cached page for {event_key} is missing, skipping")
+                continue
+            yield event_key, content
+
+    def clear(self):
+        """
+        Forget everything recorded for this run.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM events WHERE run_key = ?", (self.run_key,))
+            self._connection.execute("DELETE FROM failures WHERE run_key = ?", (self.run_key,))
+            self._connection.execute("DELETE FROM runs WHERE run_key = ?", (self.run_key,))
+
+    def close(self):
+        self._connection.close()
@@ -1,27 +1,179 @@
-from sqlalchemy import create_engine
 import os
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
 from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from utils.loader import SCHEMA_NAME
+from utils.snapshot import latest_snapshot, open_snapshot
+from utils.summaries import HEADLINE
+
+QUERY_TTL = 24 * 60 * 60  # Seconds a query result is kept; new loads invalidate it sooner (see load_timestamp)
+LOAD_CHECK_TTL = 60  # Seconds between checks for a new ETL load
+MAX_CACHED_QUERIES = 200
+POOL_SIZE = 5  # Connections kept open for all sessions of the app
+POOL_MAX_OVERFLOW = 5
+CREDENTIALS = ["DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD"]
+
+
+def _credentials():
+    # Streamlit secrets when the app has them, otherwise the .env file the ETL uses
+    try:
+        return {key: st.secrets[key] for key in CREDENTIALS}
+    except Exception:
+        load_dotenv()
+        return {key: os.getenv(key) for key in CREDENTIALS}
+
+
+@st.cache_resource
+def _pooled_engine():
+    credentials = _credentials()
+    engine = create_engine(
+        f"postgresql://{credentials['DB_USER']}:{credentials['DB_PASSWORD']}@{credentials['DB_HOST']}:"
+        f"{credentials['DB_PORT']}/{credentials['DB_NAME']}",
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_pre_ping=True,  # Replace connections the server has closed while the app sat idle
+    )
+    print("Database engine created.")
+    return engine
+
+
+def get_engine():
+    """
+    Return the app's pooled SQLAlchemy engine, created once per process and
+    shared by every page and session. Returns None if it cannot be created.
+    """
+    try:
+        return _pooled_engine()
+    except Exception as e:
+        print(f"Error connecting to the database: {e}")
+        return None
+
 
 def get_db_connection():
     """
-    Establish and return a connection to the PostgreSQL database.
+    Establish and return a connection to the PostgreSQL database, checked out
+    from the shared pool. Close it when done to hand it back.
     """
-    # Load environment variables from .env file
-    load_dotenv()
+    engine = get_engine()
+    return engine.connect() if engine else None
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _mapped_snapshot(path, modified):
+    # modified is only part of the cache key: a week that is exported again is mapped again
+    print(f"Snapshot {path} memory-mapped.")
+    return open_snapshot(path)
+
 
-    # Define the connection details
-    hostname = os.getenv("DB_HOST")
-    port = os.getenv("DB_PORT")
-    database = os.getenv("DB_NAME")
-    username = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    
+def current_snapshot():
+    """
+    Return the newest ETL snapshot as {table name: memory-mapped pyarrow Table},
+    shared by every session, or None if there is none and pages should query
+    the database.
+    """
+    path = latest_snapshot()
+    if path is None:
+        return None
     try:
-        # Create the connection string
-        engine = create_engine(f"postgresql://{username}:{password}@{hostname}:{port}/{database}")
-        connection = engine.connect()
-        print("Database connection successful.")
-        return connection
+        return _mapped_snapshot(path, os.path.getmtime(path))
     except Exception as e:
-        print(f"Error connecting to the database: {e}")
+        print(f"Error opening snapshot {path}: {e}")
         return None
+
+
+class QueryStats:
+    """
+    Process-wide counts of cached query calls, cache misses and time spent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.misses = 0
+        self.call_seconds = 0.0  # Everything read_query took, hits and misses
+        self.database_seconds = 0.0  # Time in the database on misses
+
+    def record_call(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.call_seconds += seconds
+
+    def record_miss(self, seconds):
+        with self._lock:
+            self.misses += 1
+            self.database_seconds += seconds
+
+    def summary(self):
+        with self._lock:
+            hits = self.calls - self.misses
+            return {
+                "calls": self.calls,
+                "hit rate": hits / self.calls if self.calls else 0.0,
+                "average call (ms)": 1000 * self.call_seconds / self.calls if self.calls else 0.0,
+                "average database query (ms)": 1000 * self.database_seconds / self.misses if self.misses else 0.0,
+            }
+
+
+STATS = QueryStats()
+
+
+@st.cache_data(ttl=LOAD_CHECK_TTL, show_spinner=False)
+def load_timestamp():
+    """
+    When the ETL last rebuilt the summary tables, or None if it never has.
+    Checked at most once a minute, in the snapshot when there is one.
+    """
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return snapshot[HEADLINE]["loaded_at"][0].as_py()
+    engine = get_engine()
+    if engine is None:
+        return None
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text(f"SELECT loaded_at FROM {SCHEMA_NAME}.{HEADLINE}")).scalar()
+    except Exception:
+        return None
+
+
+@st.cache_data(ttl=QUERY_TTL, max_entries=MAX_CACHED_QUERIES, show_spinner=False)
+def _cached_query(query, params, loaded_at):
+    # loaded_at is only part of the cache key: results cached before a new load are never returned after it
+    start = time.perf_counter()
+    with get_engine().connect() as connection:
+        df = pd.read_sql(query, connection, params=params)
+    elapsed = time.perf_counter() - start
+    STATS.record_miss(elapsed)
+    print(f"Query ran in {elapsed * 1000:.0f} ms ({len(df)} rows)")
+    return df
+
+
+def read_query(query, params=None):
+    """
+    Run a read-only query and return a DataFrame. Results are cached per
+    (query, params) for every session until the next ETL load.
+    """
+    start = time.perf_counter()
+    df = _cached_query(query, params, load_timestamp())
+    STATS.record_call(time.perf_counter() - start)
+    return df
+
+
+def show_cache_stats():
+    """
+    Show the cache hit rate and query latency in the sidebar.
+    """
+    summary = STATS.summary()
+    with st.sidebar.expander("Data cache"):
+        st.caption(f"Hit rate: {summary['hit rate']:.0%} of {summary['calls']:,} queries")
+        st.caption(f"Average query: {summary['average call (ms)']:.1f} ms, "
+                   f"{summary['average database query (ms)']:.1f} ms when read from the database")
+        loaded_at = load_timestamp()
+        st.caption(f"Data loaded: {loaded_at:%Y-%m-%d %H:%M}" if loaded_at else "Data loaded: unknown")
+        snapshot = latest_snapshot()
+        st.caption(f"Snapshot: {os.path.basename(snapshot)}" if snapshot else "Snapshot: none, reading the database")
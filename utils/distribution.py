@@ -0,0 +1,50 @@
+import numpy as np
+
+# Finish-time distributions are binned on a fixed grid, so the national curves
+# can be stored once per load and every chart shares the same x values.
+BIN_SECONDS = 10
+MAX_MINUTES = 80  # Finish times from 80 minutes on are left out, as on the charts
+BINS = MAX_MINUTES * 60 // BIN_SECONDS
+NATIONAL_BW_ADJUST = 0.2  # Smoothing of the national curve (the bw_adjust the page's kdeplot used)
+LOCAL_BW_ADJUST = 0.4  # Smoothing of a single event's curve
+
+
+def bin_minutes():
+    """
+    The left edge of every bin, in minutes.
+    """
+    return np.arange(BINS) * BIN_SECONDS / 60
+
+
+def bin_counts(seconds):
+    """
+    Count finish times (in seconds) into the BINS bins.
+    """
+    seconds = np.asarray(seconds, dtype="float64")
+    return np.histogram(seconds[~np.isnan(seconds)], bins=BINS, range=(0, MAX_MINUTES * 60))[0]
+
+
+def smooth_density(counts, bw_adjust=NATIONAL_BW_ADJUST):
+    """
+    Gaussian kernel density (per minute) of binned finish times.
+
+    The bandwidth follows Scott's rule, as seaborn's kdeplot does, scaled by
+    bw_adjust. The counts are smoothed rather than the individual times, so the
+    cost depends on the number of bins, not the number of finishers.
+    """
+    counts = np.asarray(counts, dtype="float64")
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(BINS)
+    centres = (np.arange(BINS) + 0.5) * BIN_SECONDS
+    mean = (counts * centres).sum() / total
+    std = np.sqrt((counts * (centres - mean) ** 2).sum() / total)
+    bandwidth = bw_adjust * std * total ** (-1 / 5)
+    # At least half a bin, so a single finisher still draws a bump
+    sigma = max(bandwidth / BIN_SECONDS, 0.5)
+    half_width = min(int(np.ceil(4 * sigma)), (BINS - 1) // 2)
+    offsets = np.arange(-half_width, half_width + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+    smoothed = np.convolve(counts, kernel, mode="same")
+    return smoothed / (total * BIN_SECONDS / 60)
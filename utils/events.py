@@ -0,0 +1,73 @@
+from itertools import chain, zip_longest
+
+UK_COUNTRY_CODE = 97
+UK_DOMAIN = "www.parkrun.org.uk"
+SERIES_5K = 1  # seriesid of the Saturday 5k events
+SERIES_JUNIOR = 2  # seriesid of the Sunday 2k junior events
+RESULTS_URL = "https://{domain}/{eventname}/results/latestresults/"
+PAST_RESULTS_URL = "https://{domain}/{eventname}/results/{run_number}/"
+
+
+def country_domains(data):
+    """
+    Return {countrycode: results domain} from events.json, e.g. {97: "www.parkrun.org.uk"}.
+    Countries without a results website are left out.
+    """
+    return {int(code): country["url"] for code, country in data["countries"].items() if country.get("url")}
+
+
+def country_name(domain):
+    # The Country column holds the results domain without "www.", e.g. parkrun.org.uk
+    return domain[4:] if domain.startswith("www.") else domain
+
+
+# Country column value of UK results
+UK_COUNTRY = country_name(UK_DOMAIN)
+
+
+def results_url(event):
+    # Event lists checkpointed before multi-country support have no domain; they were all UK
+    return RESULTS_URL.format(domain=event.get("domain", UK_DOMAIN), eventname=event["eventname"])
+
+
+def past_results_url(event, run_number):
+    # The results page of an earlier run of the event, by its run number
+    return PAST_RESULTS_URL.format(domain=event.get("domain", UK_DOMAIN), eventname=event["eventname"], run_number=run_number)
+
+
+def select_events(data, countries=(UK_COUNTRY_CODE,), series=(SERIES_5K,)):
+    """
+    Pick the events to fetch from events.json.
+
+    countries is a list of countrycodes, or None for every country with a
+    results website; series a list of seriesids. Returns one dict per event
+    (id, eventname, EventLongName, coordinates, countrycode, domain, Country),
+    interleaved across domains so each domain's fetches can run side by side.
+    """
+    domains = country_domains(data)
+    by_domain = {}
+    seen = set()
+    for feature in data["events"]["features"]:
+        properties = feature["properties"]
+        code = properties["countrycode"]
+        if code not in domains or (countries is not None and code not in countries):
+            continue
+        if properties["seriesid"] not in series:
+            continue
+        # Results are keyed by event name, so a name may only appear once
+        if properties["eventname"] in seen:
+            print(f"Skipping duplicate event name {properties['eventname']} ({domains[code]})")
+            continue
+        seen.add(properties["eventname"])
+        by_domain.setdefault(domains[code], []).append({
+            "id": feature["id"],  # Stable across weeks, unlike the event's position in the list
+            "eventname": properties["eventname"],
+            "EventLongName": properties["EventLongName"],
+            "coordinates": feature["geometry"]["coordinates"],
+            "countrycode": code,
+            "domain": domains[code],
+            "Country": country_name(domains[code]),
+        })
+    # Round-robin over the domains: the first event of each, then the second of each, ...
+    rounds = zip_longest(*by_domain.values())
+    return [event for event in chain.from_iterable(rounds) if event is not None]
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+from utils.page_store import CACHE_DIR
+
+FINGERPRINTS_FILE = os.path.join(CACHE_DIR, "fingerprints.sqlite")
+DEFER_RETRIES = 2  # Extra passes over events whose results are not up yet
+DEFER_WAIT = 600  # Seconds to wait before each of those passes
+
+# What to do with a fetched results page
+CHANGED = "changed"  # Parse, transform and load it
+UNCHANGED = "unchanged"  # The run already loaded, byte for byte: skip it
+DEFERRED = "deferred"  # This week's results are not up yet: try again later
+
+
+def _iso_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def change_status(fingerprint, previous, latest_run_date, run_key=None):
+    """
+    Classify a results page from its (run date, run number, digest) fingerprint.
+
+    previous is the fingerprint loaded last time (or None) and latest_run_date
+    the date of the event's run the dashboard shows now. A page repeating that
+    run unchanged is UNCHANGED, unless it is older than the run_key Saturday,
+    when this week's results may just not be up yet (DEFERRED). Pages without
+    results rows are DEFERRED too; anything else is CHANGED.
+    """
+    run_date, run_number, digest = fingerprint
+    if digest is None:
+        return DEFERRED
+    if previous is None or tuple(previous) != tuple(fingerprint) or str(latest_run_date) != run_date:
+        return CHANGED
+    week = _iso_date(run_key)
+    if week is not None and _iso_date(run_date) is not None and _iso_date(run_date) < week:
+        return DEFERRED
+    return UNCHANGED
+
+
+class ChangeStats:
+    """
+    Per-run counts of events processed, skipped as unchanged and deferred,
+    with the time spent parsing the processed pages.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.unchanged = 0
+        self.deferred = 0  # Events deferred at least once
+        self.waiting = 0  # Deferred events still without results at the end of the run
+        self.parse_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, status):
+        with self._lock:
+            if status == CHANGED:
+                self.processed += 1
+            elif status == UNCHANGED:
+                self.unchanged += 1
+
+    def record_parse(self, seconds):
+        with self._lock:
+            self.parse_seconds += seconds
+
+    def report(self):
+        summary = (f"Change detection: {self.processed} events processed, {self.unchanged} unchanged and skipped, "
+                   f"{self.deferred} deferred ({self.waiting} still without results)")
+        if self.processed:
+            # Skipped pages would have cost about as much to parse as the ones that were parsed
+            summary += f"; about {self.parse_seconds / self.processed * self.unchanged:.2f}s of parsing saved"
+        print(summary)
+
+
+class FingerprintStore:
+    """
+    SQLite record, kept from week to week, of the fingerprint of each event's
+    last loaded results page, and of what each run processed and skipped.
+    """
+
+    def __init__(self, path=FINGERPRINTS_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS fingerprints (
+                    event_key TEXT PRIMARY KEY,
+                    run_date TEXT,
+                    run_number INTEGER,
+                    digest TEXT NOT NULL,
+                    checked_at TEXT NOT NULL
+                )"""
+            )
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS change_runs (
+                    run_key TEXT NOT NULL,
+                    finished_at TEXT NOT NULL,
+                    processed INTEGER NOT NULL,
+                    unchanged INTEGER NOT NULL,
+                    deferred INTEGER NOT NULL,
+                    waiting INTEGER NOT NULL,
+                    parse_seconds REAL NOT NULL
+                )"""
+            )
+
+    def load(self):
+        """
+        Return {event key: (run date, run number, digest)}.
+        """
+        cursor = self._connection.execute("SELECT event_key, run_date, run_number, digest FROM fingerprints")
+        return {event_key: (run_date, run_number, digest) for event_key, run_date, run_number, digest in cursor}
+
+    def save(self, fingerprints):
+        """
+        Store {event key: fingerprint} for pages that are now in the database.
+        """
+        checked_at = datetime.now().isoformat(timespec="seconds")
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                [(event_key, *fingerprint, checked_at) for event_key, fingerprint in fingerprints.items()],
+            )
+
+    def record_run(self, run_key, stats):
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO change_runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_key, datetime.now().isoformat(timespec="seconds"), stats.processed, stats.unchanged,
+                 stats.deferred, stats.waiting, stats.parse_seconds),
+            )
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.page_store import CACHE_DIR, PageStore
+
+try:
+    import brotli  # noqa: F401  urllib3 only decodes br responses when this is installed
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+POOL_HOSTS = 32  # Hosts to keep connection pools for
+POOL_SIZE = 4  # Keep-alive connections kept per host
+VALIDATORS_FILE = os.path.join(CACHE_DIR, "http_validators.json")
+
+
+class SessionStats:
+    """
+    Per-run counters for the shared HTTP session.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes_transferred = 0  # Body bytes as sent over the wire (compressed)
+        self.bytes_decoded = 0  # Body bytes after decompression
+        self.not_modified = 0
+        self.handshakes = 0  # Connections from pools that have already been closed
+        self._lock = threading.Lock()
+
+    def record(self, wire_bytes, decoded_bytes, not_modified):
+        with self._lock:
+            self.requests += 1
+            self.bytes_transferred += wire_bytes
+            self.bytes_decoded += decoded_bytes
+            self.not_modified += int(not_modified)
+
+
+class CachingSession:
+    """
+    A requests.Session shared by the whole run. Connections are pooled and
+    kept alive, responses may be compressed, and the ETag/Last-Modified of
+    each URL is remembered between runs so unchanged pages come back as 304s.
+
+    A 304 is returned to the caller as a 200 carrying the cached body, with
+    `response.not_modified` set to True.
+    """
+
+    def __init__(self, headers=None, validators_file=VALIDATORS_FILE, page_store=None):
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update(headers or {})
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.validators_file = validators_file
+        self.page_store = page_store or PageStore()
+        self.validators = self._load_validators()
+        self.stats = SessionStats()
+        self._lock = threading.Lock()
+
+    def _load_validators(self):
+        try:
+            with open(self.validators_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.validators_file) or ".", exist_ok=True)
+        with self._lock:
+            validators = dict(self.validators)
+        tmp_path = f"{self.validators_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(validators, f)
+        os.replace(tmp_path, self.validators_file)
+
+    def _conditional_headers(self, url):
+        with self._lock:
+            cached = self.validators.get(url)
+        if not cached:
+            return {}
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def get(self, url, headers=None, **kwargs):
+        request_headers = dict(headers or {})
+        request_headers.update(self._conditional_headers(url))
+        response = self.session.get(url, headers=request_headers, **kwargs)
+        content = response.content
+        # raw.tell() counts the bytes read off the socket, before decompression
+        wire_bytes = response.raw.tell() if response.raw is not None else len(content)
+
+        if response.status_code == 304:
+            with self._lock:
+                digest = self.validators.get(url, {}).get("digest")
+            cached_content = self.page_store.get(digest) if digest else None
+            if cached_content is None:
+                # The validators outlived the cached body; ask again unconditionally
+                with self._lock:
+                    self.validators.pop(url, None)
+                return self.get(url, headers=headers, **kwargs)
+            self.stats.record(wire_bytes, 0, not_modified=True)
+            response.status_code = 200
+            response._content = cached_content
+            response.not_modified = True
+            return response
+
+        self.stats.record(wire_bytes, len(content), not_modified=False)
+        response.not_modified = False
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            digest = self.page_store.put(content)
+            with self._lock:
+                self.validators[url] = {"etag": etag, "last_modified": last_modified, "digest": digest}
+        return response
+
+    def handshakes(self):
+        """
+        Number of connections opened so far (each one a TCP, and for https a TLS, handshake).
+        """
+        pools = self.adapter.poolmanager.pools
+        return self.stats.handshakes + sum(pools[key].num_connections for key in pools.keys())
+
+    def report(self):
+        stats = self.stats
+        print(
+            f"HTTP: {stats.requests} requests, {self.handshakes()} handshakes, "
+            f"{stats.not_modified} not modified (304), "
+            f"{stats.bytes_transferred / 1_000_000:.1f} MB transferred "
+            f"({stats.bytes_decoded / 1_000_000:.1f} MB decoded)"
+        )
+
+    def close(self):
+        self.save()
+        # Closing clears the connection pools, so keep their count first
+        self.stats.handshakes = self.handshakes()
+        self.session.close()
@@ -0,0 +1,470 @@
+import io
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+from utils.events import UK_COUNTRY
+
+SCHEMA_NAME = "student"
+HISTORY_TABLE = "rw_parkrun_history"  # Every week's results, one partition per week
+LATEST_RUNS_TABLE = "rw_parkrun_latest_runs"  # The (event, run date) pairs of the latest load
+LATEST_VIEW = "rw_parkrun_2"  # What the dashboard reads: each event's latest results
+EVENTS_TABLE = "rw_parkrun_events"  # One row per event, keyed by its events.json id
+
+# Column order of the results in the database
+RESULT_COLUMNS = [
+    "Event ID", "Event Name", "EventLongName", "Country", "coordinates", "Run Date", "Run Number",
+    "Name", "Age Group", "Gender", "Position", "Runs", "Achievement", "Time",
+]
+KEY_COLUMNS = ["Event Name", "Run Date", "Position"]
+EVENT_COLUMNS = ["Event ID", "Event Name", "EventLongName", "Country", "coordinates", "Longitude", "Latitude"]
+# Indexes on the results, for the leaderboard's top-N queries with and without an age group filter.
+# Event Name and Position break ties in time, so a page is read straight off the index in order.
+# Event Insights reads a single event's results by its id.
+RESULT_INDEXES = {
+    "age_group_time": ["Age Group", "Time", "Event Name", "Position"],
+    "time": ["Time", "Event Name", "Position"],
+    "event_id": ["Event ID", "Time"],
+}
+COPY_CHUNK_ROWS = 50_000  # Rows sent per COPY statement
+
+# Enum types for the low-cardinality text columns. Values seen in the data
+# that are not listed here are added to the type before loading.
+ENUM_TYPES = {
+    "Gender": ("parkrun_gender", ["Male", "Female", "N/A"]),
+    "Achievement": ("parkrun_achievement", ["No Achievement", "New PB!", "First Timer!", "None"]),
+}
+
+RESULT_COLUMN_DDL = """
+    "Event ID" integer,
+    "Event Name" text NOT NULL,
+    "EventLongName" text,
+    "Country" text,
+    "coordinates" text,
+    "Run Date" date NOT NULL,
+    "Run Number" integer,
+    "Name" text,
+    "Age Group" text,
+    "Gender" {schema}.parkrun_gender,
+    "Position" smallint NOT NULL,
+    "Runs" smallint,
+    "Achievement" {schema}.parkrun_achievement,
+    "Time" interval
+"""
+
+HISTORY_DDL = """
+CREATE TABLE IF NOT EXISTS {schema}.{history} (
+""" + RESULT_COLUMN_DDL + """,
+    PRIMARY KEY ("Event Name", "Run Date", "Position")
+) PARTITION BY RANGE ("Run Date");
+
+CREATE TABLE IF NOT EXISTS {schema}.{latest_runs} (
+    "Event Name" text PRIMARY KEY,
+    "Run Date" date NOT NULL
+);
+"""
+
+EVENTS_DDL = """
+CREATE TABLE IF NOT EXISTS {schema}.{events} (
+    "Event ID" integer PRIMARY KEY,
+    "Event Name" text NOT NULL,
+    "EventLongName" text,
+    "Country" text,
+    "coordinates" text
+);
+ALTER TABLE {schema}.{events}
+    ADD COLUMN IF NOT EXISTS "Longitude" double precision,
+    ADD COLUMN IF NOT EXISTS "Latitude" double precision;
+CREATE INDEX IF NOT EXISTS {events}_event_name ON {schema}.{events} ("Event Name");
+"""
+
+LATEST_VIEW_SQL = """
+CREATE OR REPLACE VIEW {schema}.{view} AS
+SELECT {columns}
+FROM {schema}.{history} h
+JOIN {schema}.{latest_runs} l USING ("Event Name", "Run Date");
+"""
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def week_start(run_date):
+    """
+    Monday of the week containing run_date; partitions cover Monday to Sunday.
+    """
+    return run_date - timedelta(days=run_date.weekday())
+
+
+def partition_name(monday):
+    return f"{HISTORY_TABLE}_{monday:%Y%m%d}"
+
+
+def table_kind(connection, schema, name):
+    """
+    What schema.name is: "r" a table, "p" a partitioned table, "v" a view, or None if it does not exist.
+    """
+    return connection.execute(
+        text("""SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = :schema AND c.relname = :name"""),
+        {"schema": schema, "name": name},
+    ).scalar()
+
+
+def create_indexes(connection, schema, table):
+    """
+    Create the RESULT_INDEXES on schema.table if they are missing. On the
+    partitioned history they cascade to every partition, present and future.
+    """
+    for suffix, columns in RESULT_INDEXES.items():
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {table}_{suffix} ON {schema}.{table} ({', '.join(_quote(c) for c in columns)})"
+        ))
+
+
+def prepare_types(df, engine, schema=SCHEMA_NAME):
+    """
+    Create the enum types, adding any values in df they do not list yet.
+    """
+    with engine.begin() as connection:
+        for column, (type_name, labels) in ENUM_TYPES.items():
+            exists = connection.execute(
+                text("""SELECT 1 FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace
+                        WHERE n.nspname = :schema AND t.typname = :name"""),
+                {"schema": schema, "name": type_name},
+            ).scalar()
+            if not exists:
+                values = ", ".join(_literal(label) for label in labels)
+                connection.execute(text(f"CREATE TYPE {schema}.{type_name} AS ENUM ({values})"))
+    # New enum values cannot be used in the transaction that adds them, so commit them first
+    with engine.begin() as connection:
+        for column, (type_name, labels) in ENUM_TYPES.items():
+            if column not in df:
+                continue
+            for label in sorted(set(df[column].dropna().astype(str)) - set(labels)):
+                connection.execute(text(f"ALTER TYPE {schema}.{type_name} ADD VALUE IF NOT EXISTS {_literal(label)}"))
+
+
+def _upgrade_column_types(connection, schema):
+    # History tables created before the explicit column types stored these as integer/text, and had no Country
+    types = dict(connection.execute(
+        text("""SELECT column_name, udt_name FROM information_schema.columns
+                WHERE table_schema = :schema AND table_name = :name"""),
+        {"schema": schema, "name": HISTORY_TABLE},
+    ).fetchall())
+    changes = []
+    for column in ["Position", "Runs"]:
+        if types.get(column) != "int2":
+            changes.append(f"ALTER COLUMN {_quote(column)} TYPE smallint")
+    for column, (type_name, _) in ENUM_TYPES.items():
+        if types.get(column) != type_name:
+            changes.append(f"ALTER COLUMN {_quote(column)} TYPE {schema}.{type_name} USING {_quote(column)}::text::{schema}.{type_name}")
+    if changes or "Country" not in types:
+        print(f"Updating column types of {schema}.{HISTORY_TABLE}")
+        # The dashboard view depends on the columns; it is recreated straight after
+        connection.execute(text(f"DROP VIEW IF EXISTS {schema}.{LATEST_VIEW}"))
+    if "Country" not in types:
+        # Everything loaded before the Country column was UK results
+        connection.execute(text(f"ALTER TABLE {schema}.{HISTORY_TABLE} ADD COLUMN \"Country\" text DEFAULT {_literal(UK_COUNTRY)}"))
+        connection.execute(text(f"ALTER TABLE {schema}.{HISTORY_TABLE} ALTER COLUMN \"Country\" DROP DEFAULT"))
+    if changes:
+        connection.execute(text(f"ALTER TABLE {schema}.{HISTORY_TABLE} {', '.join(changes)}"))
+
+
+def prepare_history(engine, schema=SCHEMA_NAME):
+    """
+    Create the history table, the latest-runs table and the dashboard view if they are missing.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(HISTORY_DDL.format(schema=schema, history=HISTORY_TABLE, latest_runs=LATEST_RUNS_TABLE)))
+        # The dashboard table used to be replaced by the weekly load; it becomes a view over the history
+        if table_kind(connection, schema, LATEST_VIEW) == "r":
+            print(f"Replacing table {schema}.{LATEST_VIEW} with a view over {schema}.{HISTORY_TABLE}")
+            connection.execute(text(f"DROP TABLE {schema}.{LATEST_VIEW}"))
+        _upgrade_column_types(connection, schema)
+        create_indexes(connection, schema, HISTORY_TABLE)
+        connection.execute(text(LATEST_VIEW_SQL.format(
+            schema=schema, view=LATEST_VIEW, history=HISTORY_TABLE, latest_runs=LATEST_RUNS_TABLE,
+            columns=", ".join(_quote(column) for column in RESULT_COLUMNS),
+        )))
+
+
+def _copy_frame(df):
+    """
+    Format the result columns for COPY: times as whole seconds, which
+    Postgres reads straight into an interval.
+    """
+    rows = df[RESULT_COLUMNS].copy()
+    seconds = rows["Time"].dt.total_seconds().round().astype("Int64")
+    rows["Time"] = (seconds.astype(str) + " seconds").where(seconds.notna(), None)
+    rows["coordinates"] = rows["coordinates"].astype(str)
+    return rows
+
+
+def copy_dataframe(df, connection, schema, table, chunk_rows=COPY_CHUNK_ROWS):
+    """
+    Stream df into schema.table with COPY FROM STDIN (CSV), chunk_rows at a time.
+    Runs inside the caller's transaction.
+    """
+    columns = ", ".join(_quote(column) for column in RESULT_COLUMNS)
+    sql = f"COPY {schema}.{table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor = connection.connection.cursor()
+    for start in range(0, len(df), chunk_rows):
+        buffer = io.StringIO()
+        _copy_frame(df.iloc[start:start + chunk_rows]).to_csv(buffer, header=False, index=False, na_rep="\\N")
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+    cursor.close()
+
+
+def _staging_name(monday):
+    return f"{partition_name(monday)}_staging"
+
+
+def _create_staging(connection, schema, monday):
+    staging = _staging_name(monday)
+    connection.execute(text(f"DROP TABLE IF EXISTS {schema}.{staging}"))
+    connection.execute(text(
+        f"CREATE TABLE {schema}.{staging} (LIKE {schema}.{HISTORY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+
+
+def _merge_week(engine, schema, monday):
+    """
+    Move a week's staging table into the history: attached as a new partition,
+    or upserted into the existing one.
+    """
+    partition = partition_name(monday)
+    staging = _staging_name(monday)
+    bounds = f"FROM ('{monday}') TO ('{monday + timedelta(days=7)}')"
+    columns = ", ".join(_quote(column) for column in RESULT_COLUMNS)
+
+    with engine.begin() as connection:
+        existing = table_kind(connection, schema, partition)
+
+    if existing is None:
+        # A new week: index the staging table, prove it fits the partition bounds
+        # and attach it. ATTACH only takes a SHARE UPDATE EXCLUSIVE lock, so
+        # readers are never blocked and see the whole week appear at once.
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"ALTER TABLE {schema}.{staging} ADD PRIMARY KEY (\"Event Name\", \"Run Date\", \"Position\")"
+            ))
+            connection.execute(text(
+                f"ALTER TABLE {schema}.{staging} ADD CONSTRAINT {staging}_bounds "
+                f"CHECK (\"Run Date\" >= '{monday}' AND \"Run Date\" < '{monday + timedelta(days=7)}')"
+            ))
+            connection.execute(text(f"ALTER TABLE {schema}.{staging} RENAME TO {partition}"))
+            connection.execute(text(f"ALTER TABLE {schema}.{HISTORY_TABLE} ATTACH PARTITION {schema}.{partition} FOR VALUES {bounds}"))
+        return "attached"
+
+    # A week already in the history (a re-run, or an event whose latest results
+    # are from an earlier week): upsert in one transaction. Readers keep seeing
+    # the old rows until it commits.
+    updates = ", ".join(f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in RESULT_COLUMNS if column not in KEY_COLUMNS)
+    with engine.begin() as connection:
+        # Drop positions that are no longer on a reloaded results page (e.g. corrected results)
+        connection.execute(text(f"""
+            DELETE FROM {schema}.{HISTORY_TABLE} h
+            USING (SELECT DISTINCT "Event Name", "Run Date" FROM {schema}.{staging}) s
+            WHERE h."Event Name" = s."Event Name" AND h."Run Date" = s."Run Date"
+            AND NOT EXISTS (
+                SELECT 1 FROM {schema}.{staging} n
+                WHERE n."Event Name" = h."Event Name" AND n."Run Date" = h."Run Date" AND n."Position" = h."Position"
+            )
+        """))
+        connection.execute(text(f"""
+            INSERT INTO {schema}.{HISTORY_TABLE} ({columns})
+            SELECT {columns} FROM {schema}.{staging}
+            ON CONFLICT ("Event Name", "Run Date", "Position") DO UPDATE SET {updates}
+        """))
+        connection.execute(text(f"DROP TABLE {schema}.{staging}"))
+    return "upserted"
+
+
+class BatchLoader:
+    """
+    Load results one micro-batch (DataFrame) at a time, so the whole week
+    never has to be held in memory.
+
+    mode "incremental" stages each batch in a per-week table, then in finish()
+    merges the weeks into the weekly-partitioned history and points the
+    dashboard view at each event's latest run.
+    mode "replace" fills a new table batch by batch and swaps it in for
+    table_name in finish(). Either way the dashboard only changes in finish().
+    Rows without a run date are given fallback_run_date, in either mode.
+    With update_latest=False (incremental mode, e.g. a backfill of earlier
+    weeks) the history grows but the dashboard view is left as it is.
+    """
+
+    def __init__(self, engine, schema=SCHEMA_NAME, mode="incremental", table_name=LATEST_VIEW,
+                 fallback_run_date=None, update_latest=True):
+        if mode not in ("incremental", "replace"):
+            raise ValueError(f"Unknown load mode: {mode}")
+        self.engine = engine
+        self.schema = schema
+        self.mode = mode
+        self.table_name = table_name
+        self.fallback_run_date = fallback_run_date
+        self.update_latest = update_latest
+        self.rows_loaded = 0
+        self._latest_runs = {}  # Event Name -> latest Run Date seen, one entry per event
+        self._weeks = {}  # Monday -> rows staged for that week
+        self._started = False
+
+    @property
+    def weeks(self):
+        """
+        The Mondays of the weeks loaded so far (incremental mode).
+        """
+        return sorted(self._weeks)
+
+    def keep_latest(self, event_name, run_date):
+        """
+        Keep an event that was not reloaded (its results have not changed) in
+        the dashboard view at run_date, its latest run already in the history.
+        """
+        self._latest_runs[event_name] = max(run_date, self._latest_runs.get(event_name, run_date))
+
+    def _start(self):
+        if self.mode == "incremental":
+            prepare_history(self.engine, self.schema)
+        else:
+            with self.engine.begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {self.schema}.{self.table_name}_new"))
+                connection.execute(text(
+                    f"CREATE TABLE {self.schema}.{self.table_name}_new ({RESULT_COLUMN_DDL.format(schema=self.schema)})"
+                ))
+        self._started = True
+
+    def load(self, df):
+        """
+        Load one batch. Each event's results must arrive whole in a single batch.
+        """
+        prepare_types(df, self.engine, self.schema)
+        if not self._started:
+            self._start()
+        # "Run Date" is NOT NULL in both modes: pages whose run date could not be parsed take the fallback
+        df = df.copy()
+        if self.fallback_run_date is not None:
+            df["Run Date"] = df["Run Date"].fillna(self.fallback_run_date)
+        df["Run Date"] = pd.to_datetime(df["Run Date"]).dt.date
+        df = df.dropna(subset=["Run Date"])
+        if self.mode == "replace":
+            with self.engine.begin() as connection:
+                copy_dataframe(df, connection, self.schema, f"{self.table_name}_new")
+            self.rows_loaded += len(df)
+            return
+
+        # Only one row per key can be upserted; keep the last one seen
+        df = df.drop_duplicates(subset=KEY_COLUMNS, keep="last")
+        # Batches are staged per week in Postgres and merged into the history in finish()
+        for monday, week_df in df.groupby(df["Run Date"].map(week_start)):
+            with self.engine.begin() as connection:
+                if monday not in self._weeks:
+                    _create_staging(connection, self.schema, monday)
+                    self._weeks[monday] = 0
+                copy_dataframe(week_df, connection, self.schema, _staging_name(monday))
+            self._weeks[monday] += len(week_df)
+        for event_name, run_date in df.groupby("Event Name")["Run Date"].max().items():
+            self._latest_runs[event_name] = max(run_date, self._latest_runs.get(event_name, run_date))
+        self.rows_loaded += len(df)
+
+    def finish(self):
+        """
+        Make the loaded batches visible to the dashboard in one transaction.
+        """
+        if not self._started:
+            self._start()
+        if self.mode == "replace":
+            with self.engine.begin() as connection:
+                kind = table_kind(connection, self.schema, self.table_name)
+                if kind == "v":
+                    connection.execute(text(f"DROP VIEW {self.schema}.{self.table_name}"))
+                elif kind is not None:
+                    connection.execute(text(f"DROP TABLE {self.schema}.{self.table_name}"))
+                connection.execute(text(f"ALTER TABLE {self.schema}.{self.table_name}_new RENAME TO {self.table_name}"))
+                create_indexes(connection, self.schema, self.table_name)
+            return
+
+        for monday, rows in sorted(self._weeks.items()):
+            outcome = _merge_week(self.engine, self.schema, monday)
+            print(f"Week of {monday}: {rows} rows {outcome}")
+        if self.update_latest:
+            # Swap the latest runs in one transaction so the view changes atomically
+            latest_runs = pd.DataFrame(list(self._latest_runs.items()), columns=["Event Name", "Run Date"])
+            with self.engine.begin() as connection:
+                connection.execute(text(f"DELETE FROM {self.schema}.{LATEST_RUNS_TABLE}"))
+                latest_runs.to_sql(LATEST_RUNS_TABLE, connection, schema=self.schema, if_exists="append", index=False)
+        # Fresh statistics let the planner walk the leaderboard indexes through the view instead of joining everything
+        with self.engine.begin() as connection:
+            connection.execute(text(f"ANALYZE {self.schema}.{HISTORY_TABLE}"))
+            connection.execute(text(f"ANALYZE {self.schema}.{LATEST_RUNS_TABLE}"))
+
+
+def stored_latest_runs(engine, schema=SCHEMA_NAME):
+    """
+    Return {Event Name: Run Date} of the runs the dashboard view currently
+    shows, or {} if there is no history yet.
+    """
+    with engine.connect() as connection:
+        if table_kind(connection, schema, LATEST_RUNS_TABLE) is None:
+            return {}
+        rows = connection.execute(text(f"""SELECT "Event Name", "Run Date" FROM {schema}.{LATEST_RUNS_TABLE}"""))
+        return dict(rows.fetchall())
+
+
+def load_events(events, engine, schema=SCHEMA_NAME, weeks=()):
+    """
+    Upsert the event list (as returned by select_events) into the events table,
+    keyed by the stable events.json id. History rows loaded under another id
+    (results used to be numbered by their position in the list) are re-keyed:
+    the whole history once, when the events table is first created, and after
+    that only the weeks just loaded (Mondays, as BatchLoader.weeks gives them).
+    """
+    rows = pd.DataFrame(
+        [
+            (event["id"], event["eventname"], event["EventLongName"], event.get("Country", UK_COUNTRY), str(event["coordinates"]),
+             *event["coordinates"][:2])
+            for event in events
+            # Event lists checkpointed before the ids were kept have none to key on
+            if "id" in event
+        ],
+        columns=EVENT_COLUMNS,
+    )
+    if rows.empty:
+        print("No event ids to load into the events table")
+        return 0
+    columns = ", ".join(_quote(column) for column in EVENT_COLUMNS)
+    updates = ", ".join(f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in EVENT_COLUMNS[1:])
+    with engine.begin() as connection:
+        first_load = table_kind(connection, schema, EVENTS_TABLE) is None
+        connection.execute(text(EVENTS_DDL.format(schema=schema, events=EVENTS_TABLE)))
+        rows.to_sql(f"{EVENTS_TABLE}_staging", connection, schema=schema, if_exists="replace", index=False)
+        connection.execute(text(f"""
+            INSERT INTO {schema}.{EVENTS_TABLE} ({columns})
+            SELECT {columns} FROM {schema}.{EVENTS_TABLE}_staging
+            ON CONFLICT ("Event ID") DO UPDATE SET {updates}
+        """))
+        connection.execute(text(f"DROP TABLE {schema}.{EVENTS_TABLE}_staging"))
+        if table_kind(connection, schema, HISTORY_TABLE) == "p":
+            # After the first pass only rows loaded now can be out of step (e.g. from an old checkpoint),
+            # and the range on "Run Date" keeps each update to one week's partition
+            ranges = [(None, None)] if first_load else [(monday, monday + timedelta(days=7)) for monday in weeks]
+            rekeyed = 0
+            for start, end in ranges:
+                rekeyed += connection.execute(text(f"""
+                    UPDATE {schema}.{HISTORY_TABLE} h SET "Event ID" = e."Event ID"
+                    FROM {schema}.{EVENTS_TABLE} e
+                    WHERE h."Event Name" = e."Event Name" AND h."Event ID" IS DISTINCT FROM e."Event ID"
+                    {'AND h."Run Date" >= :start AND h."Run Date" < :end' if start else ''}
+                """), {"start": start, "end": end} if start else {}).rowcount
+            if rekeyed:
+                print(f"Re-keyed {rekeyed} history rows to their event ids")
+    return len(rows)
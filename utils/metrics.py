@@ -0,0 +1,230 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils.page_store import CACHE_DIR
+
+METRICS_DIR = os.path.join(CACHE_DIR, "metrics")
+PERCENTILES = [50, 90, 99]
+PROFILE_LINES = 25  # Functions listed from a --profile run
+TRACEMALLOC_LINES = 15  # Allocation sites listed from a --tracemalloc run
+# Per-record numbers that get percentiles in the run summary, by record type
+SUMMARY_FIELDS = {
+    "fetch": ["seconds", "wait_seconds", "bytes"],
+    "event": ["parse_seconds", "rows"],
+}
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class RunMetrics:
+    """
+    Structured timings for one ETL run, written as JSON lines: a "fetch"
+    record per request (latency, time spent waiting for the rate limiter,
+    bytes, attempt), an "event" record per event (parse time, rows), a "stage"
+    record per stage, and a closing "summary" with totals and percentiles.
+
+    Stage times are exclusive: time spent in a stage nested inside another
+    (e.g. fetching while the transform waits for its next event) is only
+    counted once, against the inner stage. Stages are timed on the main thread.
+    """
+
+    def __init__(self, path, run_key=None, trace_memory=False):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.run_key = run_key
+        self.trace_memory = trace_memory
+        self.started = time.perf_counter()
+        self._file = open(path, "w")
+        self._lock = threading.Lock()
+        self._values = {}  # (record type, field) -> list of values, for the summary
+        self._counts = {}  # record type -> number of records
+        self._stages = {}  # stage -> [seconds, times entered, peak traced MB]
+        self._stack = []  # Open stages: [name, start, seconds spent in nested stages]
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def record(self, kind, **fields):
+        """
+        Write one record and keep its numbers for the summary. Safe to call from any thread.
+        """
+        line = json.dumps({"type": kind, **fields}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._counts[kind] = self._counts.get(kind, 0) + 1
+            if fields.get("error"):
+                # Failed attempts, e.g. fetches that will be retried
+                self._counts[f"{kind}.error"] = self._counts.get(f"{kind}.error", 0) + 1
+            for field in SUMMARY_FIELDS.get(kind, []):
+                if fields.get(field) is not None:
+                    self._values.setdefault((kind, field), []).append(fields[field])
+
+    def _enter(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        name, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        totals = self._stages.setdefault(name, [0.0, 0, None])
+        totals[0] += elapsed - nested
+        totals[1] += 1
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / 1_000_000
+            totals[2] = max(totals[2] or 0, peak)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the body of a with block as part of stage `name`.
+        """
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def timed(self, name, iterable):
+        """
+        Yield from iterable, timing each step of it as part of stage `name`.
+        """
+        iterator = iter(iterable)
+        while True:
+            self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            yield item
+
+    def summary(self):
+        """
+        Return the run summary: wall time, time per stage, record counts and
+        count/total/percentiles of every per-fetch and per-event number.
+        """
+        with self._lock:
+            values = {key: sorted(items) for key, items in self._values.items()}
+            counts = dict(self._counts)
+        stages = {
+            name: {"seconds": round(seconds, 3), "calls": calls, **({"peak_mb": round(peak, 1)} if peak is not None else {})}
+            for name, (seconds, calls, peak) in self._stages.items()
+        }
+        fields = {}
+        for (kind, field), items in values.items():
+            fields[f"{kind}.{field}"] = {
+                "count": len(items),
+                "total": round(sum(items), 3),
+                **{f"p{p}": percentile(items, p) for p in PERCENTILES},
+                "max": items[-1],
+            }
+        return {
+            "run_key": self.run_key,
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "stages": stages,
+            "records": counts,
+            "fields": fields,
+        }
+
+    def close(self):
+        """
+        Write the stage records and the summary, print the summary and close the file.
+        """
+        summary = self.summary()
+        for name, stage in summary["stages"].items():
+            self.record("stage", stage=name, **stage)
+        self.record("summary", **summary)
+        self._file.close()
+        print(f"Run metrics written to {self.path}")
+        print(f"Wall time: {summary['wall_seconds']:.1f}s; records: "
+              + ", ".join(f"{count} {kind}" for kind, count in summary["records"].items()))
+        for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            peak = f", peak {stage['peak_mb']:.1f} MB traced" if "peak_mb" in stage else ""
+            print(f"  {name:<12} {stage['seconds']:9.2f}s{peak}")
+        for name, field in summary["fields"].items():
+            print(f"  {name:<22} p50 {field['p50']:>10.4g}  p90 {field['p90']:>10.4g}  p99 {field['p99']:>10.4g}  "
+                  f"max {field['max']:>10.4g}  total {field['total']:>12.6g}")
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            print("Largest allocation sites still held at the end of the run:")
+            for statistic in snapshot.statistics("lineno")[:TRACEMALLOC_LINES]:
+                print(f"  {statistic}")
+
+
+def default_metrics_path(run_key, directory=METRICS_DIR):
+    return os.path.join(directory, f"{run_key}-{datetime.now():%Y%m%dT%H%M%S}.jsonl")
+
+
+class Profiler:
+    """
+    cProfile across threads: the main thread is profiled from start() to
+    stop(), and functions wrapped with wrap() are profiled on whichever worker
+    thread runs them. stop() merges everything into one set of statistics.
+    From Python 3.12 the main profile already sees every thread, and wrap()
+    leaves the workers to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._main = cProfile.Profile()
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._shared = False  # The main profile covers every thread, so workers are not profiled separately
+
+    def start(self):
+        self._main.enable()
+
+    def wrap(self, function):
+        def profiled(*args, **kwargs):
+            if self._shared:
+                return function(*args, **kwargs)
+            profile = getattr(self._local, "profile", None) or cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ profiles through sys.monitoring, one profiler per process:
+                # a second one cannot start, and the main profile already sees every thread
+                self._shared = True
+                return function(*args, **kwargs)
+            if getattr(self._local, "profile", None) is None:
+                self._local.profile = profile
+                with self._lock:
+                    self._profiles.append(profile)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def stop(self):
+        self._main.disable()
+        stats = pstats.Stats(self._main, stream=io.StringIO())
+        with self._lock:
+            for profile in self._profiles:
+                stats.add(profile)
+        stats.dump_stats(self.path)
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+        print(output.getvalue())
+        print(f"Profile written to {self.path} (open with python -m pstats {self.path})")
@@ -0,0 +1,47 @@
+import gzip
+import hashlib
+import os
+import threading
+
+# Local cache for downloaded pages and run state. Override with PARKRUNNER_CACHE_DIR.
+CACHE_DIR = os.getenv("PARKRUNNER_CACHE_DIR", ".cache")
+
+
+class PageStore:
+    """
+    Content-addressed store of gzip-compressed page bodies on disk.
+    Pages are keyed by the sha256 of their uncompressed bytes, so identical
+    pages are only ever stored once.
+    """
+
+    def __init__(self, root=os.path.join(CACHE_DIR, "pages")):
+        self.root = root
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.gz")
+
+    def put(self, content):
+        """
+        Store content and return its digest.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so a crash never leaves half a page behind. The
+            # name is per thread: two fetch workers can be storing the same page at once
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        """
+        Return the stored bytes for digest, or None if they are not in the store.
+        """
+        try:
+            with gzip.open(self._path(digest), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, EOFError, gzip.BadGzipFile):
+            return None
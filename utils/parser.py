@@ -0,0 +1,327 @@
+import hashlib
+import os
+import re
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+from utils.records import FinisherRecords
+
+
+def extract_table_body(response):
+    try:
+        html_content = response.content
+        soup = BeautifulSoup(html_content, "html.parser") if html_content else None
+        if not soup:
+            return {}
+        table_body = soup.find('tbody')
+        if not table_body:
+            return {}
+        return table_body
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        return {}
+
+
+def extract_data_from_table_body(table_body):
+    result_data = []
+    # Failed requests and pages without a results table have no rows
+    if not table_body:
+        return result_data
+    for row in table_body.find_all('tr', class_='Results-table-row'):
+        # Extract data-* attributes
+        name = row.get('data-name', None)
+        age_group = row.get('data-agegroup', None)
+        gender = row.get('data-gender', None)
+        position = row.get('data-position', None)
+        runs = row.get('data-runs', None)
+        achievement = row.get('data-achievement', None)
+
+        time_div = row.find('td', class_='Results-table-td Results-table-td--time')
+        if not time_div:
+            time_div = row.find('td', class_='Results-table-td Results-table-td--time Results-table-td--ft')
+        if not time_div:
+            time_div = row.find('td', class_='Results-table-td Results-table-td--time Results-table-td--pb')
+        if time_div:
+            compact_time = time_div.find('div', class_='compact')
+            time = compact_time.text.strip() if compact_time else None
+        else:
+            time = None
+        # Append extracted data to the list
+        row_data = {
+            "Name": name or "N/A",
+            "Age Group": age_group or "N/A",
+            "Gender": gender or "N/A",
+            "Position": position or "N/A",
+            "Runs": runs or "N/A",
+            "Achievement": achievement or "N/A",
+            "Time": time or "N/A"
+        }
+        result_data.append(row_data)
+    return result_data
+
+
+# Fast parser backends
+# ----------------------------------------------------#
+# Both backends below read only what extract_data_from_table_body reads (the
+# data-* attributes of each results row and the compact div of the time cell)
+# and produce exactly the same values, without building a BeautifulSoup tree.
+# Each row is handed to a sink, which either builds the original list of dicts
+# or fills FinisherRecords.
+
+ROW_FIELDS = {
+    "Name": "data-name",
+    "Age Group": "data-agegroup",
+    "Gender": "data-gender",
+    "Position": "data-position",
+    "Runs": "data-runs",
+    "Achievement": "data-achievement",
+}
+# Time cell classes in the order extract_data_from_table_body tries them
+TIME_CELL_CLASSES = (
+    "Results-table-td Results-table-td--time",
+    "Results-table-td Results-table-td--time Results-table-td--ft",
+    "Results-table-td Results-table-td--time Results-table-td--pb",
+)
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+PARSER_BACKEND = os.getenv("PARKRUNNER_PARSER", "lxml" if lxml else "stream")
+XML_DECLARATION = re.compile(r"^\ufeff?\s*<\?xml[^>]*\?>")
+
+
+def _decode(content):
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("cp1252", errors="replace")
+
+
+RESULT_FIELDS = list(ROW_FIELDS) + ["Time"]
+
+
+class _RowList(list):
+    def add(self, attrs, time):
+        row_data = {column: attrs.get(attribute) or "N/A" for column, attribute in ROW_FIELDS.items()}
+        row_data["Time"] = time or "N/A"
+        self.append(row_data)
+
+
+def _lxml_document(html):
+    # lxml refuses text that still declares an encoding, and raises on pages with no
+    # elements at all (only whitespace or comments), where the other backends find no rows
+    try:
+        return lxml.html.fromstring(XML_DECLARATION.sub("", html, count=1))
+    except (lxml.etree.ParserError, ValueError):
+        return None
+
+
+def _parse_lxml(content, sink):
+    document = _lxml_document(_decode(content))
+    if document is None:
+        return sink
+    table_body = next(document.iter("tbody"), None)
+    if table_body is None:
+        return sink
+    for row in table_body.iter("tr"):
+        if "Results-table-row" not in row.get("class", "").split():
+            continue
+        time_cells = {}
+        for cell in row.iter("td"):
+            cell_class = " ".join(cell.get("class", "").split())
+            if cell_class in TIME_CELL_CLASSES and cell_class not in time_cells:
+                time_cells[cell_class] = cell
+        time = None
+        for cell_class in TIME_CELL_CLASSES:
+            if cell_class in time_cells:
+                compact_time = next(
+                    (div for div in time_cells[cell_class].iter("div") if "compact" in div.get("class", "").split()),
+                    None,
+                )
+                time = compact_time.text_content().strip() if compact_time is not None else None
+                break
+        sink.add(row.attrib, time)
+    return sink
+
+
+class _ResultsRowParser(HTMLParser):
+    """
+    Streaming parser fed only the first <tbody> of a results page.
+    """
+
+    def __init__(self, sink):
+        super().__init__(convert_charrefs=True)
+        self.sink = sink
+        self._row = None  # data-* attributes of the current results row
+        self._time_cells = {}  # time cell class -> compact text (None if no compact div)
+        self._cell_class = None  # class of the time cell we are inside, if any
+        self._div_depth = 0  # divs open inside the current compact div
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._end_row()
+            attrs = dict(attrs)
+            if "Results-table-row" in (attrs.get("class") or "").split():
+                self._row = attrs
+        elif self._row is None:
+            return
+        elif tag == "td":
+            cell_class = " ".join((dict(attrs).get("class") or "").split())
+            if cell_class in TIME_CELL_CLASSES and cell_class not in self._time_cells:
+                self._cell_class = cell_class
+                self._time_cells[cell_class] = None
+            else:
+                self._cell_class = None
+        elif tag == "div" and self._cell_class:
+            if self._text is not None:
+                self._div_depth += 1
+            elif self._time_cells[self._cell_class] is None and "compact" in (dict(attrs).get("class") or "").split():
+                self._text = []
+                self._div_depth = 1
+
+    def handle_endtag(self, tag):
+        if tag == "tr":
+            self._end_row()
+        elif tag == "td":
+            self._cell_class = None
+        elif tag == "div" and self._text is not None:
+            self._div_depth -= 1
+            if self._div_depth == 0:
+                self._time_cells[self._cell_class] = "".join(self._text).strip()
+                self._text = None
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def _end_row(self):
+        if self._row is None:
+            return
+        time = None
+        for cell_class in TIME_CELL_CLASSES:
+            if cell_class in self._time_cells:
+                time = self._time_cells[cell_class]
+                break
+        self.sink.add(self._row, time)
+        self._row = None
+        self._time_cells = {}
+        self._cell_class = None
+        self._text = None
+
+    def close(self):
+        super().close()
+        self._end_row()
+
+
+TBODY_START = re.compile(r"<tbody[\s>]", re.IGNORECASE)
+TBODY_END = re.compile(r"</tbody\s*>", re.IGNORECASE)
+
+
+def _parse_stream(content, sink):
+    html = _decode(content)
+    start = TBODY_START.search(html)
+    if not start:
+        return sink
+    end = TBODY_END.search(html, start.end())
+    parser = _ResultsRowParser(sink)
+    parser.feed(html[start.start():end.start() if end else len(html)])
+    parser.close()
+    return sink
+
+
+def _parse_bs4(content, sink):
+    soup = BeautifulSoup(content, "html.parser")
+    result_data = extract_data_from_table_body(soup.find('tbody'))
+    if isinstance(sink, list):
+        sink.extend(result_data)
+        return sink
+    for row in result_data:
+        sink.add({attribute: row[column] for column, attribute in ROW_FIELDS.items()}, row["Time"])
+    return sink
+
+
+PARSER_BACKENDS = {
+    "bs4": _parse_bs4,
+    "lxml": _parse_lxml,
+    "stream": _parse_stream,
+}
+
+
+def _parse(content, backend, sink):
+    if not content:
+        return sink
+    backend = backend or PARSER_BACKEND
+    if backend == "lxml" and lxml is None:
+        raise ImportError("The lxml parser backend needs lxml installed (pip install lxml)")
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    return PARSER_BACKENDS[backend](content, sink)
+
+
+def parse_results(content, backend=None):
+    """
+    Parse the results rows out of a latestresults page.
+
+    Returns the same list of dicts as extract_data_from_table_body(extract_table_body(response)),
+    using the named backend ("bs4", "lxml" or "stream"; defaults to PARSER_BACKEND).
+    """
+    return list(_parse(content, backend, _RowList()))
+
+
+def parse_results_records(content, backend=None):
+    """
+    Parse the results rows out of a latestresults page into FinisherRecords:
+    the same finishers as parse_results, with the numbers and times already
+    read as integers and the repeated values held as codes.
+    """
+    return _parse(content, backend, FinisherRecords())
+
+
+RUN_DATE = re.compile(rb'class="format-date"[^>]*>\s*(\d{1,2})/(\d{1,2})/(\d{4})\s*<')
+RUN_NUMBER = re.compile(rb'<span[^>]*>\s*#(\d+)\s*</span>')
+
+
+def parse_run_header(content):
+    """
+    Return (run date as "YYYY-MM-DD", run number) from the header of a results
+    page, with None for anything that cannot be found.
+    """
+    if not content:
+        return None, None
+    # The header sits above the results table, so there is no need to search the rows
+    table_start = content.find(b"<tbody")
+    header = content[:table_start] if table_start != -1 else content
+    date_match = RUN_DATE.search(header)
+    number_match = RUN_NUMBER.search(header)
+    run_date = None
+    if date_match:
+        day, month, year = (int(part) for part in date_match.groups())
+        run_date = f"{year:04d}-{month:02d}-{day:02d}"
+    run_number = int(number_match.group(1)) if number_match else None
+    return run_date, run_number
+
+
+RESULTS_ROW = b"Results-table-row"
+
+
+def page_fingerprint(content):
+    """
+    Return (run date, run number, digest of the results table) of a results
+    page without parsing its rows. The digest is None when the page has no
+    results rows, e.g. before this week's results are published.
+    """
+    run_date, run_number = parse_run_header(content)
+    if not content:
+        return run_date, run_number, None
+    start = content.find(b"<tbody")
+    if start == -1:
+        return run_date, run_number, None
+    end = content.find(b"</tbody", start)
+    table_body = content[start:end if end != -1 else len(content)]
+    if RESULTS_ROW not in table_body:
+        return run_date, run_number, None
+    return run_date, run_number, hashlib.blake2b(table_body, digest_size=16).hexdigest()
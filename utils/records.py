@@ -0,0 +1,167 @@
+"""
+Compact finisher records: each event's results held column by column in typed
+arrays, with interned codes for the few distinct values of Age Group, Gender
+and Achievement, instead of a string per field per finisher.
+"""
+from array import array
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+MISSING = "N/A"  # What the parser has always given for an empty field
+NO_TIME = -1  # Seconds recorded for a finisher without a time
+NAME_ATTRIBUTE = "data-name"
+# Fields held as a code per finisher into the event's own list of values, with the row attributes they come from
+CODED_FIELDS = {"Age Group": "data-agegroup", "Gender": "data-gender", "Achievement": "data-achievement"}
+NUMBER_FIELDS = {"Position": "data-position", "Runs": "data-runs"}
+CODE_TYPE = "H"  # Unsigned 16-bit codes
+NUMBER_TYPE = "i"  # 32-bit integers, for positions, run counts and seconds
+RECORDS_KEY = "__finisher_records__"  # Marks FinisherRecords in JSON
+
+
+def time_seconds(time):
+    """
+    Whole seconds of a finish time ("MM:SS" or "H:MM:SS"), or NO_TIME for anything else (e.g. "N/A").
+    """
+    parts = time.split(":") if time else ()
+    if len(parts) not in (2, 3):
+        return NO_TIME
+    try:
+        numbers = [int(part) for part in parts]
+    except ValueError:
+        return NO_TIME
+    if len(numbers) == 2:
+        return numbers[0] * 60 + numbers[1]
+    return numbers[0] * 3600 + numbers[1] * 60 + numbers[2]
+
+
+def _number(value):
+    # Blanks and anything else that is not a whole number count as 0, as the transform always has
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class FinisherRecords:
+    """
+    One event's finishers, as a parser sink: add() takes each results row's
+    data-* attributes and time as the parser reads them. Names are kept as
+    strings; everything else goes into arrays of a few bytes per finisher.
+    """
+
+    __slots__ = ("names", "categories", "codes", "numbers", "seconds", "_index")
+
+    def __init__(self):
+        self.names = []
+        self.categories = {field: [] for field in CODED_FIELDS}  # Each field's distinct values, in code order
+        self.codes = {field: array(CODE_TYPE) for field in CODED_FIELDS}
+        self.numbers = {field: array(NUMBER_TYPE) for field in NUMBER_FIELDS}
+        self.seconds = array(NUMBER_TYPE)
+        self._index = {field: {} for field in CODED_FIELDS}  # value -> code
+
+    def add(self, attrs, time):
+        self.names.append(attrs.get(NAME_ATTRIBUTE) or MISSING)
+        for field, attribute in CODED_FIELDS.items():
+            value = attrs.get(attribute) or MISSING
+            code = self._index[field].get(value)
+            if code is None:
+                code = self._index[field][value] = len(self.categories[field])
+                self.categories[field].append(value)
+            self.codes[field].append(code)
+        for field, attribute in NUMBER_FIELDS.items():
+            self.numbers[field].append(_number(attrs.get(attribute)))
+        self.seconds.append(time_seconds(time))
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def __eq__(self, other):
+        return isinstance(other, FinisherRecords) and self.to_json() == other.to_json()
+
+    def to_json(self):
+        return {
+            RECORDS_KEY: 1,
+            "names": self.names,
+            "categories": self.categories,
+            "codes": {field: codes.tolist() for field, codes in self.codes.items()},
+            "numbers": {field: numbers.tolist() for field, numbers in self.numbers.items()},
+            "seconds": self.seconds.tolist(),
+        }
+
+
+def records_from_json(data):
+    records = FinisherRecords()
+    records.names = data["names"]
+    records.categories = data["categories"]
+    records.codes = {field: array(CODE_TYPE, codes) for field, codes in data["codes"].items()}
+    records.numbers = {field: array(NUMBER_TYPE, numbers) for field, numbers in data["numbers"].items()}
+    records.seconds = array(NUMBER_TYPE, data["seconds"])
+    records._index = {field: {value: code for code, value in enumerate(values)}
+                      for field, values in records.categories.items()}
+    return records
+
+
+def json_default(value):
+    # For json.dumps(default=...): FinisherRecords are written as plain lists
+    if isinstance(value, FinisherRecords):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_object_hook(data):
+    # For json.loads(object_hook=...): turns what json_default wrote back into FinisherRecords
+    return records_from_json(data) if RECORDS_KEY in data else data
+
+
+def as_records(results):
+    """
+    Return an event's results as FinisherRecords. Pages parsed before records
+    existed, as {column: list of values} or a list of row dicts, are converted.
+    """
+    if isinstance(results, FinisherRecords):
+        return results
+    if not isinstance(results, dict):
+        results = {field: [row[field] for row in results] for field in ["Name", *CODED_FIELDS, *NUMBER_FIELDS, "Time"]}
+    records = FinisherRecords()
+    attributes = {"Name": NAME_ATTRIBUTE, **CODED_FIELDS, **NUMBER_FIELDS}
+    for values in zip(*(results.get(field, ()) for field in attributes), results.get("Time", ())):
+        records.add(dict(zip(attributes.values(), values[:-1])), values[-1])
+    return records
+
+
+def finisher_count(results):
+    """
+    Number of finishers in an event's results, whatever form they are in.
+    """
+    return len(results.get("Name", ())) if isinstance(results, dict) else len(results)
+
+
+def _concatenate(arrays, typecode):
+    # Typed arrays straight into one numpy array, with no per-item Python
+    return np.concatenate([np.frombuffer(values, dtype=typecode) for values in arrays] or [np.empty(0, typecode)])
+
+
+def records_frame(records):
+    """
+    Return one DataFrame of every finisher in a list of FinisherRecords:
+    Name, the coded fields as categoricals over every event's values, Position
+    and Runs, and Time in whole seconds (NO_TIME if missing). Codes are mapped
+    onto the combined categories a whole event at a time.
+    """
+    total = sum(len(event) for event in records)
+    frame = {"Name": np.fromiter(chain.from_iterable(event.names for event in records), dtype=object, count=total)}
+    for field in CODED_FIELDS:
+        categories = sorted(set(chain.from_iterable(event.categories[field] for event in records)))
+        positions = {value: code for code, value in enumerate(categories)}
+        codes = [
+            np.array([positions[value] for value in event.categories[field]], dtype=np.int32)[
+                np.frombuffer(event.codes[field], dtype=CODE_TYPE)]
+            for event in records if len(event)
+        ]
+        frame[field] = pd.Categorical.from_codes(np.concatenate(codes or [np.empty(0, np.int32)]), categories)
+    for field in NUMBER_FIELDS:
+        frame[field] = _concatenate([event.numbers[field] for event in records], NUMBER_TYPE)
+    frame["Time"] = _concatenate([event.seconds for event in records], NUMBER_TYPE)
+    return pd.DataFrame(frame)
@@ -0,0 +1,365 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+DELAY_MIN = 5  # Minimum delay time between requests
+DELAY_MAX = 10  # Max delay time between requests
+# Average request rate of the original serial loop (one request per 5-10s), applied to each host.
+# The engine never goes faster than this unless told to.
+REQUESTS_PER_SECOND = 2 / (DELAY_MIN + DELAY_MAX)
+MAX_WORKERS = 4  # Threads available for fetching and parsing
+MAX_PER_HOST = 2  # Requests allowed in flight against a single host
+PENDING_PER_WORKER = 2  # Jobs submitted but not yet handed back, per worker, so finished pages cannot pile up
+REQUEST_TIMEOUT = (10, 30)  # Seconds to connect, and to wait for each read of the response
+RETRY_STATUSES = {202, 429, 500, 502, 503, 504}  # Worth asking again later; anything else but 200 is final
+MAX_RETRIES = 5  # Attempts per URL before it is given up
+MAX_BACKOFF = 300  # Longest wait before a retry, in seconds, including a server's Retry-After
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+class RetryLater(Exception):
+    """
+    A request failed in a way worth trying again (a timeout, a dropped
+    connection or a status in RETRY_STATUSES), after `delay` seconds.
+    """
+
+    def __init__(self, reason, delay):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class HandlerFailed:
+    """
+    What ScraperEngine.run yields for a job whose handler raised: the error,
+    and the response the handler was given.
+    """
+
+    __slots__ = ("error", "response")
+
+    def __init__(self, error, response):
+        self.error = error
+        self.response = response
+
+
+def retry_after(response):
+    """
+    Seconds the server asked us to wait in a Retry-After header, or None.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        # An HTTP date rather than a number of seconds
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, wait_time=4, max_backoff=MAX_BACKOFF):
+    """
+    Exponential backoff with full jitter: anywhere up to wait_time * 2**attempt,
+    so retries from many workers spread out instead of arriving together.
+    """
+    return random.uniform(0, min(max_backoff, wait_time * 2 ** attempt))
+
+
+def request_once(link, headers, session=None, timeout=REQUEST_TIMEOUT, attempt=0, wait_time=4):
+    """
+    Make one attempt at a URL. Returns the response if it is a 200, None if
+    the status is not worth retrying, and raises RetryLater otherwise.
+    """
+    # Use the shared session when given so connections are reused between calls
+    http = session or requests
+    try:
+        response = http.get(link, headers=headers, timeout=timeout)
+    except requests.exceptions.Timeout:
+        raise RetryLater(f"timed out after {timeout}s", backoff_delay(attempt, wait_time))
+    except requests.exceptions.ConnectionError as e:
+        raise RetryLater(f"connection failed: {e}", backoff_delay(attempt, wait_time))
+    except requests.exceptions.RequestException as e:
+        print(f"Request failed: {e}")
+        return None
+    if response.status_code == 200:
+        return response
+    if response.status_code in RETRY_STATUSES:
+        # Honour the server's Retry-After, but never wait less than our own backoff
+        delay = max(retry_after(response) or 0, backoff_delay(attempt, wait_time))
+        raise RetryLater(f"status {response.status_code}", min(delay, MAX_BACKOFF))
+    print(f"Error: Received status code {response.status_code} for {link}")
+    return None
+
+
+# Function to make request to URL and return response
+
+def make_a_request(link, headers, max_retries=MAX_RETRIES, wait_time=4, limiter=None, session=None,
+                   timeout=REQUEST_TIMEOUT):
+    """
+    Fetch a URL, waiting and retrying in place when it fails in a way worth
+    retrying. Returns the response, or None if it could not be fetched.
+    ScraperEngine retries without blocking; this is for one-off requests.
+    """
+    for attempt in range(max_retries):
+        # Every attempt, including retries, has to wait for a token
+        if limiter:
+            limiter.acquire()
+        try:
+            return request_once(link, headers, session=session, timeout=timeout, attempt=attempt, wait_time=wait_time)
+        except RetryLater as e:
+            if attempt + 1 == max_retries:
+                break
+            print(f"{link}: {e}. Retrying in {e.delay:.1f} seconds...")
+            time.sleep(e.delay)
+    # If max retries are reached and still no successful request, return None
+    print("Max retries reached. Request failed.")
+    return None
+
+
+def wait_function(delay_min=DELAY_MIN, delay_max=DELAY_MAX):
+    delay = random.uniform(delay_min, delay_max)  # Random delay between 5 and 10s
+    print(f"Sleeping for {delay:.2f} seconds...")
+    time.sleep(delay)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Each request takes one token; tokens refill at
+    `rate` per second up to `capacity`.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # Credit the time since the last refill at the current rate; call with the lock held
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            # Time before the change refills at the old rate
+            self._refill()
+            self.rate = rate
+
+    def pause(self, seconds):
+        """
+        Hold back every request through this bucket for about `seconds` more.
+        """
+        with self._lock:
+            # Refill first, or the time the failed request took would be credited afterwards and cut the pause short
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+    def acquire(self):
+        """
+        Block until a token is available and return the time spent waiting.
+        """
+        with self._lock:
+            self._refill()
+            # Going negative reserves a future slot, so waiting threads queue up
+            # behind each other instead of all waking at once
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """
+    Slows every host down while requests are failing. Outcomes are counted in
+    windows of `window` requests: a window with at least `threshold` errors
+    halves the rate (down to min_factor of normal), a window with almost none
+    doubles it back up.
+    """
+
+    def __init__(self, window=20, threshold=0.5, min_factor=1 / 8):
+        self.window = window
+        self.threshold = threshold
+        self.min_factor = min_factor
+        self.factor = 1.0
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ok):
+        """
+        Count one request. Returns the new rate factor when it changes, else None.
+        """
+        with self._lock:
+            self._outcomes.append(ok)
+            if len(self._outcomes) < self.window:
+                return None
+            error_rate = self._outcomes.count(False) / len(self._outcomes)
+            if error_rate >= self.threshold and self.factor > self.min_factor:
+                self.factor = max(self.min_factor, self.factor / 2)
+            elif error_rate <= self.threshold / 4 and self.factor < 1:
+                self.factor = min(1.0, self.factor * 2)
+            else:
+                return None
+            # Each change needs a fresh window of evidence
+            self._outcomes.clear()
+            print(f"Error rate {error_rate:.0%}: requests now at {self.factor:.0%} of the normal rate")
+            return self.factor
+
+
+class ScraperEngine:
+    """
+    Fetch many URLs on a thread pool while keeping to a request rate and a cap
+    on concurrent requests for each host. Hosts are paced independently, so
+    several hosts (e.g. country websites) are fetched side by side.
+
+    A request that fails in a way worth retrying backs its host off (jittered
+    exponential backoff, or the server's Retry-After) and goes to the back of
+    the queue rather than holding up a worker; after max_retries attempts the
+    handler gets None. While many requests fail, a circuit breaker lowers
+    every host's rate.
+
+    With a utils.metrics.RunMetrics as `metrics`, every attempt is recorded
+    as a "fetch" record.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=1, max_workers=MAX_WORKERS,
+                 max_per_host=MAX_PER_HOST, headers=HEADERS, retry_wait=4, session=None,
+                 max_pending=None, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT, breaker=None,
+                 metrics=None):
+        self.session = session
+        self.max_pending = max_pending or PENDING_PER_WORKER * max_workers
+        self.rate = rate
+        self.burst = burst
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.headers = headers
+        self.retry_wait = retry_wait
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics
+        self.retries = 0
+        self.failures = 0  # URLs given up on after max_retries attempts
+        self.handler_errors = 0  # Responses the handler raised on
+        self._hosts = {}  # host -> (concurrency semaphore, rate limiter)
+        self._host_lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._hosts:
+                limiter = TokenBucket(self.rate * self.breaker.factor, self.burst)
+                self._hosts[host] = (threading.Semaphore(self.max_per_host), limiter)
+            return self._hosts[host]
+
+    def _record(self, ok):
+        factor = self.breaker.record(ok)
+        if factor is not None:
+            with self._host_lock:
+                limiters = [limiter for _, limiter in self._hosts.values()]
+            for limiter in limiters:
+                limiter.set_rate(self.rate * factor)
+
+    def fetch(self, url, attempt=0):
+        """
+        Make one attempt at url. Returns the response (None if the status is
+        not worth retrying), or backs the host off and raises RetryLater.
+        """
+        slots, limiter = self._host(url)
+        with slots:
+            waited = limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = request_once(url, self.headers, session=self.session, timeout=self.timeout,
+                                        attempt=attempt, wait_time=self.retry_wait)
+            except RetryLater as e:
+                self._record(False)
+                self._measure(url, attempt, start, waited, error=str(e), retry_delay=round(e.delay, 3))
+                # The whole host waits, not just this URL
+                limiter.pause(e.delay)
+                raise
+        self._record(True)
+        self._measure(url, attempt, start, waited, response=response)
+        return response
+
+    def _measure(self, url, attempt, start, waited, response=None, **fields):
+        if self.metrics is None:
+            return
+        if response is not None:
+            fields.update(status=response.status_code, bytes=len(response.content),
+                          not_modified=getattr(response, "not_modified", False))
+        self.metrics.record("fetch", url=url, attempt=attempt, seconds=round(time.perf_counter() - start, 4),
+                            wait_seconds=round(waited, 4), **fields)
+
+    def _work(self, key, url, handler, attempt):
+        # Returns (key, handler result, None), or (key, None, job to retry)
+        try:
+            response = self.fetch(url, attempt)
+        except RetryLater as e:
+            if attempt + 1 < self.max_retries:
+                print(f"{url}: {e}. Retrying in {e.delay:.1f}s, after the rest of the queue")
+                return key, None, (key, url, attempt + 1)
+            print(f"Giving up on {url} after {self.max_retries} attempts: {e}")
+            response = None
+            with self._host_lock:
+                self.failures += 1
+        # Parsing happens on the worker thread, overlapping with other fetches
+        try:
+            return key, handler(key, response), None
+        except Exception as e:
+            # One page the handler cannot cope with must not stop every other job
+            print(f"Error handling {url}: {e!r}")
+            with self._host_lock:
+                self.handler_errors += 1
+            return key, HandlerFailed(e, response), None
+
+    def run(self, jobs, handler):
+        """
+        Fetch each (key, url) job and pass the response to handler(key, response).
+        Yields (key, result) pairs in completion order. Jobs are read lazily and
+        at most max_pending are in flight or waiting to be collected at once.
+        Jobs to retry are queued behind all the others. If the handler raises,
+        the job's result is a HandlerFailed and the other jobs carry on.
+        """
+        jobs = iter(jobs)
+        retries = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+            while True:
+                while len(pending) < self.max_pending:
+                    job = next(jobs, None)
+                    if job is not None:
+                        (key, url), attempt = job, 0
+                    elif retries:
+                        key, url, attempt = retries.popleft()
+                    else:
+                        break
+                    pending.add(executor.submit(self._work, key, url, handler, attempt))
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, result, retry = future.result()
+                    if retry:
+                        self.retries += 1
+                        retries.append(retry)
+                    else:
+                        yield key, result
+
+    def report(self):
+        if self.retries or self.failures or self.handler_errors or self.breaker.factor < 1:
+            print(f"Scraper: {self.retries} retries, {self.failures} URLs given up, "
+                  f"{self.handler_errors} responses that could not be handled, "
+                  f"finished at {self.breaker.factor:.0%} of the normal rate")
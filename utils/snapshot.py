@@ -0,0 +1,174 @@
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import text
+
+from utils.loader import LATEST_VIEW, SCHEMA_NAME
+from utils.summaries import AGE_SUMMARY, EVENT_SUMMARY, GENDER_SUMMARY, HEADLINE
+
+# A copy of the latest load in uncompressed Arrow IPC files, which the dashboard
+# memory-maps instead of querying Postgres. Postgres stays the system of record.
+SNAPSHOT_DIR_ENV = "PARKRUN_SNAPSHOT_DIR"
+DEFAULT_SNAPSHOT_DIR = "snapshots"
+LATEST_FILE = "LATEST"  # Holds the name of the newest snapshot's directory
+RESULTS_TABLE = "results"
+SNAPSHOT_TABLES = [HEADLINE, GENDER_SUMMARY, AGE_SUMMARY, EVENT_SUMMARY]
+EXPORT_CHUNK_ROWS = 50_000
+
+# Compact column types: low-cardinality text is dictionary encoded, times are whole seconds
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+RESULTS_SCHEMA = pa.schema([
+    ("Event ID", pa.int32()),
+    ("Event Name", _CATEGORY),
+    ("EventLongName", _CATEGORY),
+    ("Country", _CATEGORY),
+    ("Run Date", pa.date32()),
+    ("Run Number", pa.int32()),
+    ("Name", pa.string()),
+    ("Age Group", _CATEGORY),
+    ("Gender", _CATEGORY),
+    ("Position", pa.int16()),
+    ("Runs", pa.int16()),
+    ("Achievement", _CATEGORY),
+    ("time_seconds", pa.int32()),
+])
+
+RESULTS_QUERY = """
+SELECT
+"Event ID", "Event Name", "EventLongName", "Country", "Run Date", "Run Number", "Name", "Age Group",
+"Gender"::text AS "Gender", "Position", "Runs", "Achievement"::text AS "Achievement",
+EXTRACT(EPOCH FROM "Time")::integer AS time_seconds
+FROM {source}
+ORDER BY "Event ID", "Position"
+"""
+
+
+def _results_batch(df):
+    df["Run Date"] = pd.to_datetime(df["Run Date"]).dt.date
+    for column in ["Event ID", "Run Number", "Position", "Runs", "time_seconds"]:
+        df[column] = df[column].astype("Int64")
+    return pa.Table.from_pandas(df, schema=RESULTS_SCHEMA, preserve_index=False)
+
+
+def snapshot_dir():
+    return os.getenv(SNAPSHOT_DIR_ENV, DEFAULT_SNAPSHOT_DIR)
+
+
+def _write_table(table, path):
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def write_snapshot(engine, schema=SCHEMA_NAME, source=LATEST_VIEW, directory=None):
+    """
+    Export schema.source and the summary tables to a new snapshot directory,
+    named after the week of the latest run, and point LATEST at it. Older
+    snapshots are then deleted, except the one LATEST pointed at before.
+    Returns the snapshot's path.
+    """
+    directory = directory or snapshot_dir()
+    with engine.connect() as connection:
+        headline = pd.read_sql(text(f"SELECT * FROM {schema}.{HEADLINE}"), connection)
+        week = connection.execute(text(
+            f"""SELECT date_trunc('week', max("Run Date"))::date FROM {schema}.{source}"""
+        )).scalar()
+    name = f"{week:%Y-%m-%d}" if week else "undated"
+    path = os.path.join(directory, name)
+    building = path + ".tmp"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    # The results are read in chunks on a server-side cursor and only held in their compact form
+    chunks = []
+    with engine.connect().execution_options(stream_results=True) as connection:
+        for chunk in pd.read_sql(text(RESULTS_QUERY.format(source=f"{schema}.{source}")), connection,
+                                 chunksize=EXPORT_CHUNK_ROWS):
+            chunks.append(_results_batch(chunk))
+    results = pa.concat_tables(chunks) if chunks else RESULTS_SCHEMA.empty_table()
+    # An IPC file allows one dictionary per column, so the chunks' dictionaries are merged
+    _write_table(results.unify_dictionaries().combine_chunks(), os.path.join(building, f"{RESULTS_TABLE}.arrow"))
+
+    with engine.connect() as connection:
+        for table in SNAPSHOT_TABLES:
+            df = headline if table == HEADLINE else pd.read_sql(text(f"SELECT * FROM {schema}.{table}"), connection)
+            _write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(building, f"{table}.arrow"))
+
+    # Swap the new snapshot in, then repoint LATEST in one rename. Readers that
+    # have the old files mapped keep reading them until they reopen.
+    previous = latest_snapshot(directory)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(building, path)
+    with open(os.path.join(directory, LATEST_FILE + ".tmp"), "w") as f:
+        f.write(name)
+    os.replace(os.path.join(directory, LATEST_FILE + ".tmp"), os.path.join(directory, LATEST_FILE))
+    pruned = prune_snapshots(directory, keep=[name, os.path.basename(previous) if previous else None])
+    if pruned:
+        print(f"Deleted {pruned} old snapshots from {directory}.")
+    return path
+
+
+def prune_snapshots(directory, keep):
+    """
+    Delete the snapshot directories (and any left half built) in directory
+    whose names are not in keep. Returns the number deleted.
+    """
+    pruned = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        is_snapshot = os.path.isfile(os.path.join(path, f"{RESULTS_TABLE}.arrow")) or name.endswith(".tmp")
+        if name in keep or not os.path.isdir(path) or not is_snapshot:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        pruned += 1
+    return pruned
+
+
+def discard_snapshot(directory=None):
+    """
+    Stop the dashboard reading the newest snapshot, after a load that did not
+    write one: without LATEST it queries the database instead. Returns True
+    if there was a snapshot to discard.
+    """
+    directory = directory or snapshot_dir()
+    try:
+        os.remove(os.path.join(directory, LATEST_FILE))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def latest_snapshot(directory=None):
+    """
+    Path of the newest snapshot, or None if there is none.
+    """
+    directory = directory or snapshot_dir()
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as f:
+            path = os.path.join(directory, f.read().strip())
+    except OSError:
+        return None
+    return path if os.path.isdir(path) else None
+
+
+def open_snapshot(path):
+    """
+    Memory-map every table of a snapshot. Returns {table name: pyarrow Table},
+    with the results under "results". Nothing is copied into memory until a
+    column is converted or filtered.
+    """
+    tables = {}
+    for table in [RESULTS_TABLE] + SNAPSHOT_TABLES:
+        tables[table] = pa.ipc.open_file(pa.memory_map(os.path.join(path, f"{table}.arrow"), "r")).read_all()
+    return tables
+
+
+def event_results(tables, event_id):
+    """
+    One event's results from an open snapshot, as a DataFrame sorted by finish time.
+    """
+    results = tables[RESULTS_TABLE]
+    df = results.filter(pc.equal(results["Event ID"], event_id)).to_pandas()
+    return df.sort_values("time_seconds", ignore_index=True)
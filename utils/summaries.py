@@ -0,0 +1,334 @@
+import io
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from utils.distribution import BIN_SECONDS, BINS, MAX_MINUTES, bin_minutes, smooth_density
+from utils.loader import HISTORY_TABLE, LATEST_RUNS_TABLE, LATEST_VIEW, SCHEMA_NAME, table_kind
+
+# Pre-aggregated tables the dashboard reads instead of grouping the raw results
+# on every page load. They are rebuilt from rw_parkrun_2 after each load.
+EVENT_SUMMARY = "rw_parkrun_event_summary"  # One row per event
+AGE_SUMMARY = "rw_parkrun_age_summary"  # One row per age group
+GENDER_SUMMARY = "rw_parkrun_gender_summary"  # One row per gender
+HEADLINE = "rw_parkrun_headline"  # One row: the headline numbers and when they were loaded
+# The national finish-time distribution of the same runs: one row per breakdown, category and bin
+LATEST_DISTRIBUTION = "rw_parkrun_latest_distribution"
+# Kept from week to week, unlike the tables above: one row per week, breakdown, category and bin
+TIME_DISTRIBUTION = "rw_parkrun_time_distribution"
+# Weekly rollups of the whole history, for the trends page. Only the weeks a load touches are rebuilt.
+EVENT_WEEKLY = "rw_parkrun_event_weekly"  # One row per event run
+WEEKLY = "rw_parkrun_weekly"  # One row per week: the national totals
+
+# The map's numeric position of each event, read once per load from the "[longitude, latitude]" text
+COORDINATE_PATTERN = "'^[[] *-?[0-9.]+ *, *-?[0-9.]+ *[]]$'"
+COORDINATE_SQL = f"""CASE WHEN "coordinates" ~ {COORDINATE_PATTERN}
+        THEN split_part(btrim("coordinates", '[] '), ',', {{part}})::double precision END"""
+COORDINATES = {"longitude": COORDINATE_SQL.format(part=1), "latitude": COORDINATE_SQL.format(part=2)}
+
+SUMMARY_QUERIES = {
+    EVENT_SUMMARY: """
+        SELECT
+        "Event ID",
+        "Event Name",
+        "EventLongName",
+        "Country",
+        "coordinates",
+        {longitude} AS "Longitude",
+        {latitude} AS "Latitude",
+        COUNT("Position") AS participant_count,
+        AVG("Time") AS avg_finish_time,
+        ROUND(AVG("Runs"),1) AS avg_num_of_runs,
+        COUNT(CASE WHEN "Achievement" = 'New PB!' THEN 1 END) AS pb_count,
+        ROUND((COUNT(CASE WHEN "Achievement" = 'New PB!' THEN 1 END) * 100.0 / COUNT("Position")),1) AS percent_pb,
+        COUNT(CASE WHEN "Achievement" = 'First Timer!' THEN 1 END) AS first_time_count,
+        ROUND((COUNT(CASE WHEN "Achievement" = 'First Timer!' THEN 1 END) * 100.0 / COUNT(*)),1) AS first_time_percent
+        FROM {source}
+        GROUP BY "Event ID", "Event Name", "EventLongName", "Country", "coordinates"
+    """,
+    AGE_SUMMARY: """
+        SELECT
+        "Age Group",
+        COUNT("Age Group") AS count,
+        COUNT("Time") AS timed_count,
+        AVG("Time") AS avg_finish_time
+        FROM {source}
+        GROUP BY "Age Group"
+    """,
+    GENDER_SUMMARY: """
+        SELECT "Gender", COUNT("Gender") AS count
+        FROM {source}
+        GROUP BY "Gender"
+    """,
+    HEADLINE: """
+        SELECT
+        COUNT(*) AS total_participants,
+        COUNT(DISTINCT "EventLongName") AS total_events,
+        COUNT(CASE WHEN "Achievement" = 'New PB!' THEN 1 END) AS total_pbs,
+        AVG("Time") AS avg_finish_time,
+        now() AS loaded_at
+        FROM {source}
+    """,
+}
+
+
+# Finishers per week and time bin: overall, per age group and per gender
+DISTRIBUTION_QUERY = """
+    SELECT
+    date_trunc('week', "Run Date")::date AS week,
+    CASE WHEN GROUPING("Age Group") = 0 THEN 'age_group' WHEN GROUPING("Gender") = 0 THEN 'gender' ELSE 'all' END AS breakdown,
+    COALESCE("Age Group", "Gender"::text) AS category,
+    floor(EXTRACT(EPOCH FROM "Time") / {bin_seconds})::int AS bin,
+    COUNT(*) AS finishers
+    FROM {source}
+    WHERE "Time" IS NOT NULL AND "Time" < interval '{max_minutes} minutes' AND "Run Date" IS NOT NULL {weeks}
+    GROUP BY GROUPING SETS ((1, 4), (1, "Age Group", 4), (1, "Gender", 4))
+"""
+
+TIME_DISTRIBUTION_DDL = """
+CREATE TABLE IF NOT EXISTS {schema}.{table} (
+    week date NOT NULL,
+    breakdown text NOT NULL,
+    category text,
+    minute double precision NOT NULL,
+    finishers integer NOT NULL,
+    density double precision NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {table}_lookup ON {schema}.{table} (week, breakdown, category);
+"""
+
+
+# Everything the Home page shows in one round trip: the headline numbers, with
+# the gender and age group breakdowns and the map's events as JSON, one array per column
+HOME_METRICS_QUERY = """
+    SELECT
+    h.total_participants,
+    h.total_events,
+    h.total_pbs,
+    (SELECT json_build_object('Gender', array_agg("Gender"), 'count', array_agg(count))
+     FROM {schema}.{gender}) AS genders,
+    (SELECT json_build_object('Age Group', array_agg("Age Group"), 'count', array_agg(count),
+                              'avg_finish_time', array_agg(EXTRACT(EPOCH FROM avg_finish_time)))
+     FROM {schema}.{age}) AS age_groups,
+    (SELECT json_build_object('EventLongName', array_agg("EventLongName"), 'participant_count', array_agg(participant_count),
+                              'Longitude', array_agg("Longitude"), 'Latitude', array_agg("Latitude"))
+     FROM {schema}.{events}) AS events
+    FROM {schema}.{headline} h
+"""
+HOME_HEADLINE_COLUMNS = ["total_participants", "total_events", "total_pbs"]
+HOME_GENDER_COLUMNS = ["Gender", "count"]
+HOME_AGE_COLUMNS = ["Age Group", "count", "avg_finish_time"]
+HOME_EVENT_COLUMNS = ["EventLongName", "participant_count", "Longitude", "Latitude"]
+
+
+def home_metrics_query(schema=SCHEMA_NAME):
+    return HOME_METRICS_QUERY.format(schema=schema, headline=HEADLINE, gender=GENDER_SUMMARY, age=AGE_SUMMARY,
+                                     events=EVENT_SUMMARY)
+
+
+def _json_frame(columns, names):
+    # An empty summary aggregates to null arrays
+    return pd.DataFrame({name: columns[name] or [] for name in names}, columns=names)
+
+
+def split_home_metrics(metrics_df):
+    """
+    Split the one-row result of the Home metrics query into the headline
+    numbers and the gender, age group and event DataFrames.
+    """
+    row = metrics_df.iloc[0]
+    headline = metrics_df[HOME_HEADLINE_COLUMNS]
+    genders = _json_frame(row["genders"], HOME_GENDER_COLUMNS)
+    age_groups = _json_frame(row["age_groups"], HOME_AGE_COLUMNS)
+    # Average times are sent as seconds
+    age_groups["avg_finish_time"] = pd.to_timedelta(age_groups["avg_finish_time"].astype("float64"), unit="s")
+    events = _json_frame(row["events"], HOME_EVENT_COLUMNS)
+    return headline, genders, age_groups, events
+
+
+WEEKLY_DDL = """
+CREATE TABLE IF NOT EXISTS {schema}.{event_weekly} (
+    week date NOT NULL,
+    "Event ID" integer,
+    "Event Name" text NOT NULL,
+    "Run Date" date NOT NULL,
+    "Run Number" integer,
+    finishers integer NOT NULL,
+    timed_finishers integer NOT NULL,
+    total_seconds double precision,
+    pb_count integer NOT NULL,
+    first_timer_count integer NOT NULL,
+    PRIMARY KEY ("Event Name", "Run Date")
+);
+CREATE INDEX IF NOT EXISTS {event_weekly}_event_week ON {schema}.{event_weekly} ("Event ID", week);
+
+CREATE TABLE IF NOT EXISTS {schema}.{weekly} (
+    week date PRIMARY KEY,
+    events integer NOT NULL,
+    finishers integer NOT NULL,
+    timed_finishers integer NOT NULL,
+    total_seconds double precision,
+    pb_count integer NOT NULL,
+    first_timer_count integer NOT NULL
+);
+"""
+
+EVENT_WEEKLY_QUERY = """
+    SELECT
+    date_trunc('week', "Run Date")::date AS week,
+    max("Event ID") AS "Event ID",
+    "Event Name",
+    "Run Date",
+    max("Run Number") AS "Run Number",
+    COUNT(*) AS finishers,
+    COUNT("Time") AS timed_finishers,
+    SUM(EXTRACT(EPOCH FROM "Time")) AS total_seconds,
+    COUNT(*) FILTER (WHERE "Achievement" = 'New PB!') AS pb_count,
+    COUNT(*) FILTER (WHERE "Achievement" = 'First Timer!') AS first_timer_count
+    FROM {schema}.{history}
+    {weeks}
+    GROUP BY "Event Name", "Run Date"
+"""
+
+WEEKLY_QUERY = """
+    SELECT
+    week,
+    COUNT(DISTINCT "Event Name") AS events,
+    SUM(finishers) AS finishers,
+    SUM(timed_finishers) AS timed_finishers,
+    SUM(total_seconds) AS total_seconds,
+    SUM(pb_count) AS pb_count,
+    SUM(first_timer_count) AS first_timer_count
+    FROM {schema}.{event_weekly}
+    {weeks}
+    GROUP BY week
+"""
+
+
+def refresh_weekly_rollups(engine, schema=SCHEMA_NAME, weeks=None):
+    """
+    Rebuild the weekly rollups of the given weeks (Mondays) from the history.
+    The first time, or with weeks=None, every week in the history is rolled up.
+    Does nothing without a history (replace mode). Returns the weeks rebuilt.
+    """
+    with engine.begin() as connection:
+        if table_kind(connection, schema, HISTORY_TABLE) != "p":
+            return []
+        if weeks is None or table_kind(connection, schema, EVENT_WEEKLY) is None:
+            weeks = [row[0] for row in connection.execute(text(
+                f"""SELECT DISTINCT date_trunc('week', "Run Date")::date FROM {schema}.{HISTORY_TABLE}"""
+            ))]
+        weeks = sorted(weeks)
+        connection.execute(text(WEEKLY_DDL.format(schema=schema, event_weekly=EVENT_WEEKLY, weekly=WEEKLY)))
+        if not weeks:
+            return []
+        # The date range lets Postgres skip every other week's partition
+        history_weeks = """WHERE "Run Date" >= :start AND "Run Date" < :end
+            AND date_trunc('week', "Run Date")::date = ANY(:weeks)"""
+        params = {"weeks": weeks, "start": weeks[0], "end": weeks[-1] + timedelta(days=7)}
+        for table, query, condition in [
+            (EVENT_WEEKLY, EVENT_WEEKLY_QUERY, history_weeks),
+            (WEEKLY, WEEKLY_QUERY, "WHERE week = ANY(:weeks)"),
+        ]:
+            connection.execute(text(f"DELETE FROM {schema}.{table} WHERE week = ANY(:weeks)"), params)
+            connection.execute(text(f"INSERT INTO {schema}.{table} " + query.format(
+                schema=schema, history=HISTORY_TABLE, event_weekly=EVENT_WEEKLY, weeks=condition,
+            )), params)
+    return weeks
+
+
+def _distribution_source(connection, schema, source):
+    # Weeks are rebuilt whole from the history, so an event whose latest run is
+    # from an earlier week does not replace that week with just its own results
+    if source == LATEST_VIEW and table_kind(connection, schema, HISTORY_TABLE) == "p":
+        weeks = f"""AND "Run Date" >= (SELECT date_trunc('week', min("Run Date")) FROM {schema}.{LATEST_RUNS_TABLE})"""
+        return f"{schema}.{HISTORY_TABLE}", weeks
+    return f"{schema}.{source}", ""
+
+
+def _distribution_frame(binned):
+    # Every bin of each week, breakdown and category, with its smoothed density
+    rows = []
+    for (week, breakdown, category), group in binned.groupby(["week", "breakdown", "category"], dropna=False):
+        counts = np.zeros(BINS, dtype="int64")
+        counts[group["bin"].to_numpy()] = group["finishers"].to_numpy()
+        rows.append(pd.DataFrame({
+            "week": week,
+            "breakdown": breakdown,
+            "category": category,
+            "minute": bin_minutes(),
+            "finishers": counts,
+            "density": smooth_density(counts),
+        }))
+    return pd.concat(rows, ignore_index=True)
+
+
+def _copy_distribution(connection, schema, table, distribution):
+    buffer = io.StringIO()
+    distribution.to_csv(buffer, header=False, index=False, na_rep="\\N")
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(
+        f"COPY {schema}.{table} ({', '.join(distribution.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer,
+    )
+    cursor.close()
+
+
+def refresh_time_distribution(connection, schema=SCHEMA_NAME, source=LATEST_VIEW):
+    """
+    Store the national finish-time distribution of each week in schema.source:
+    finishers per BIN_SECONDS bin and a smoothed density, overall, per age group
+    and per gender. Weeks already stored are replaced; other weeks are kept.
+    """
+    source_table, weeks = _distribution_source(connection, schema, source)
+    binned = pd.read_sql(text(DISTRIBUTION_QUERY.format(
+        source=source_table, weeks=weeks, bin_seconds=BIN_SECONDS, max_minutes=MAX_MINUTES,
+    )), connection)
+    connection.execute(text(TIME_DISTRIBUTION_DDL.format(schema=schema, table=TIME_DISTRIBUTION)))
+    if binned.empty:
+        return 0
+    distribution = _distribution_frame(binned)
+    connection.execute(
+        text(f"DELETE FROM {schema}.{TIME_DISTRIBUTION} WHERE week = ANY(:weeks)"),
+        {"weeks": sorted(set(binned["week"]))},
+    )
+    _copy_distribution(connection, schema, TIME_DISTRIBUTION, distribution)
+    return len(distribution)
+
+
+def refresh_latest_distribution(connection, schema=SCHEMA_NAME, source=LATEST_VIEW):
+    """
+    Rebuild the national finish-time distribution of every run in schema.source,
+    the runs the other summaries count, including events whose latest run was in
+    an earlier week. Its week is the week of the newest run.
+    """
+    binned = pd.read_sql(text(DISTRIBUTION_QUERY.format(
+        source=f"{schema}.{source}", weeks="", bin_seconds=BIN_SECONDS, max_minutes=MAX_MINUTES,
+    )), connection)
+    connection.execute(text(f"DROP TABLE IF EXISTS {schema}.{LATEST_DISTRIBUTION}"))
+    connection.execute(text(TIME_DISTRIBUTION_DDL.format(schema=schema, table=LATEST_DISTRIBUTION)))
+    if binned.empty:
+        return 0
+    binned["week"] = binned["week"].max()
+    binned = binned.groupby(["week", "breakdown", "category", "bin"], dropna=False, as_index=False)["finishers"].sum()
+    distribution = _distribution_frame(binned)
+    _copy_distribution(connection, schema, LATEST_DISTRIBUTION, distribution)
+    return len(distribution)
+
+
+def refresh_summaries(engine, schema=SCHEMA_NAME, source=LATEST_VIEW):
+    """
+    Rebuild every summary table from schema.source in one transaction, so the
+    dashboard sees either last week's summaries or this week's, never a mix.
+    """
+    with engine.begin() as connection:
+        for table, query in SUMMARY_QUERIES.items():
+            connection.execute(text(f"DROP TABLE IF EXISTS {schema}.{table}"))
+            connection.execute(text(
+                f"CREATE TABLE {schema}.{table} AS {query.format(source=f'{schema}.{source}', **COORDINATES)}"
+            ))
+        refresh_time_distribution(connection, schema, source)
+        refresh_latest_distribution(connection, schema, source)
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from utils.events import UK_COUNTRY
+from utils.parser import RESULT_FIELDS
+from utils.records import MISSING, NO_TIME, as_records, finisher_count, records_frame
+
+EVENT_FIELDS = ["Event ID", "Event Name", "EventLongName", "Country", "coordinates", "Run Date", "Run Number"]
+CATEGORY_COLUMNS = ["Age Group", "Gender", "Achievement"]
+BATCH_ROWS = 20_000  # Finishers per micro-batch handed to the load
+
+
+def _categorical(values, rename=None):
+    """
+    Re-code a categorical as astype("category") would have: only the values
+    in use, sorted, after renaming any in rename. Only the categories are
+    looked at; the rows' codes are mapped in one step.
+    """
+    names = [rename.get(value, value) if rename else value for value in values.categories]
+    used = np.unique(values.codes)
+    categories = sorted({names[code] for code in used})
+    positions = {value: code for code, value in enumerate(categories)}
+    lookup = np.array([positions.get(name, -1) for name in names], dtype=np.int32)
+    return pd.Categorical.from_codes(lookup[values.codes] if len(names) else values.codes, categories)
+
+
+def _repeat(values, counts):
+    # Build an object array by hand so list values (coordinates) are not turned into a 2-D array
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return np.repeat(array, counts)
+
+
+def transform_results(events_results, event_info):
+    """
+    Turn the extracted events into one typed row per finisher.
+
+    events_results holds one dict per event (Event ID, Event Name, Run Date,
+    Run Number and Results as FinisherRecords, or the {column: list of values}
+    of older checkpoints); event_info is the matching list of events from
+    events.json, in the same order.
+    """
+    records = [as_records(event["Results"]) for event in events_results]
+    counts = np.array([len(event) for event in records], dtype=np.int64)
+
+    # Event columns are repeated once per finisher rather than exploded row by row
+    event_values = {
+        "Event ID": [event["Event ID"] for event in events_results],
+        "Event Name": [str(event["Event Name"]) for event in events_results],
+        "EventLongName": [info["EventLongName"] for info in event_info],
+        # Event lists checkpointed before multi-country support have no Country
+        "Country": [info.get("Country", UK_COUNTRY) for info in event_info],
+        "coordinates": [info["coordinates"] for info in event_info],
+        "Run Date": [event.get("Run Date") for event in events_results],
+        "Run Number": [event.get("Run Number") for event in events_results],
+    }
+    df = pd.DataFrame({field: _repeat(event_values[field], counts) for field in EVENT_FIELDS})
+    # The finishers' arrays and codes become columns without touching each row
+    finishers = records_frame(records)
+    for field in RESULT_FIELDS:
+        df[field] = finishers[field]
+
+    # Deal with na values: drop unknown runners, label rows with no achievement
+    df = df[(df["Age Group"] != MISSING).to_numpy()].reset_index(drop=True)
+    for column in CATEGORY_COLUMNS:
+        df[column] = _categorical(df[column].array, rename={MISSING: "No Achievement"} if column == "Achievement" else None)
+
+    # Change data types
+    df["Event ID"] = df["Event ID"].astype(np.int32)
+    df["Run Number"] = pd.to_numeric(df["Run Number"], errors="coerce").astype("Int32")
+    df["Position"] = df["Position"].to_numpy().astype(np.int16)
+    df["Runs"] = df["Runs"].to_numpy().astype(np.int16)
+    df["Country"] = df["Country"].astype("category")
+
+    # Times come as whole seconds, held as durations for the load
+    seconds = df["Time"].to_numpy()
+    df["Time"] = pd.to_timedelta(np.where(seconds == NO_TIME, np.nan, seconds), unit="s")
+    return df
+
+
+def event_batches(events, batch_rows=BATCH_ROWS):
+    """
+    Group (event, event info) pairs as they arrive into lists of batch_rows or
+    so finishers. Events are never split between batches, and only one batch
+    is held at a time.
+    """
+    batch, rows = [], 0
+    for event, info in events:
+        batch.append((event, info))
+        rows += finisher_count(event["Results"])
+        if rows >= batch_rows:
+            yield batch
+            batch, rows = [], 0
+    if batch:
+        yield batch
+
+
+def transform_batch(batch):
+    """
+    Transform one batch of (event, event info) pairs. Batches are plain lists
+    and dicts and so are the DataFrames returned: both pickle, so batches can
+    be transformed in other processes.
+    """
+    return transform_results([event for event, _ in batch], [info for _, info in batch])
+
+
+def transform_batches(events, batch_rows=BATCH_ROWS):
+    """
+    Transform (event, event info) pairs as they arrive, yielding a DataFrame
+    for every batch_rows or so finishers.
+    """
+    for batch in event_batches(events, batch_rows):
+        yield transform_batch(batch)